@@ -0,0 +1,153 @@
+"""
+Performance benchmarks for Plix.
+
+Benchmarks are functions decorated with :func:`benchmark` in the
+``benchmarks.bench_*`` modules. Run them with ``python -m benchmarks``.
+"""
+
+from __future__ import unicode_literals
+
+import importlib
+import pkgutil
+
+from timeit import default_timer
+
+# All the registered benchmarks, in registration order.
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    """
+    A parametrized benchmark.
+    """
+
+    def __init__(self, function, name, unit, params, memory=False):
+        """
+        Initialize the :class:`Benchmark`.
+
+        :param function: A function that takes a parameter and returns the
+            callable to measure. That callable must return the number of
+            processed items.
+        :param name: The name of the benchmark.
+        :param unit: The name of the processed items.
+        :param params: The list of parameters to run the benchmark with.
+        :param memory: Whether the peak memory of a run is measured too.
+        """
+        self.function = function
+        self.name = name
+        self.unit = unit
+        self.params = params
+        self.memory = memory
+
+    def cases(self):
+        """
+        Get the cases of the benchmark.
+
+        :yields: `(name, param)` tuples.
+        """
+        for param in self.params:
+            if param is None:
+                yield self.name, param
+            else:
+                yield '{}[{}]'.format(self.name, param), param
+
+    def measure(self, param, min_time=0.2, min_repeat=3):
+        """
+        Measure a case of the benchmark.
+
+        :param param: The parameter of the case.
+        :param min_time: The minimum total time to spend measuring, in
+            seconds.
+        :param min_repeat: The minimum number of measures.
+        :returns: A dictionary of results.
+        """
+        run = self.function(param) if param is not None else self.function()
+        run()  # Warm up.
+        timings = []
+        items = 0
+        total = 0.0
+
+        while len(timings) < min_repeat or total < min_time:
+            start = default_timer()
+            items = run()
+            timings.append(default_timer() - start)
+            total += timings[-1]
+
+        timings.sort()
+        median = timings[len(timings) // 2]
+        result = {
+            'unit': self.unit,
+            'items': items,
+            'repeat': len(timings),
+            'min': timings[0],
+            'median': median,
+            'mean': total / len(timings),
+            'throughput': items / median if median else None,
+        }
+
+        if self.memory:
+            result['memory'] = measure_memory(run)
+
+        return result
+
+
+def measure_memory(run):
+    """
+    Measure the peak memory allocated by a run.
+
+    :param run: The callable to measure.
+    :returns: The peak size of the allocated memory, in bytes, or ``None``
+        if :mod:`tracemalloc` is not available.
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+
+    tracemalloc.start()
+
+    try:
+        run()
+
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(name=None, unit='item', params=(None,), memory=False):
+    """
+    Register a benchmark.
+
+    :param name: The name of the benchmark. Defaults to the name of the
+        decorated function.
+    :param unit: The name of the processed items.
+    :param params: The list of parameters to run the benchmark with. The
+        decorated function is called with each of them, or without argument
+        if the parameter is ``None``.
+    :param memory: Whether the peak memory of a run is measured too.
+    """
+    def decorator(function):
+        BENCHMARKS.append(Benchmark(
+            function=function,
+            name=name or function.__name__,
+            unit=unit,
+            params=list(params),
+            memory=memory,
+        ))
+
+        return function
+
+    return decorator
+
+
+def load_benchmarks():
+    """
+    Import all the benchmark modules.
+
+    :returns: The list of registered benchmarks.
+    """
+    for _, module, _ in pkgutil.iter_modules(__path__):
+        if module.startswith('bench_'):
+            importlib.import_module('{}.{}'.format(__name__, module))
+
+    return BENCHMARKS
@@ -0,0 +1,208 @@
+"""
+Run the benchmarks.
+
+Results are written as JSON, by default to ``benchmarks/results/``, in a
+file named after the current commit. Pass a previous result file to
+``--compare`` to see how the timings evolved.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from . import load_benchmarks
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def get_revision():
+    """
+    Get the current git revision.
+
+    :returns: The abbreviated hash of the current commit, or ``None`` if it
+        can't be determined.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.STDOUT,
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_duration(duration):
+    """
+    Format a duration with an appropriate unit.
+
+    :param duration: The duration, in seconds.
+    :returns: A string.
+    """
+    for unit, factor in [('s', 1), ('ms', 1e3), ('us', 1e6)]:
+        if duration * factor >= 1:
+            return '{:.3f} {}'.format(duration * factor, unit)
+
+    return '{:.3f} ns'.format(duration * 1e9)
+
+
+def format_throughput(result):
+    """
+    Format the throughput of a result.
+
+    :param result: The result.
+    :returns: A string.
+    """
+    if result['throughput'] is None:
+        return '-'
+
+    if result['unit'] == 'byte':
+        return '{:.1f} MB/s'.format(result['throughput'] / 1e6)
+
+    return '{:.1f} {}/s'.format(result['throughput'], result['unit'])
+
+
+def format_memory(result):
+    """
+    Format the memory used by each item of a result.
+
+    :param result: The result.
+    :returns: A string, or ``None`` if the memory wasn't measured.
+    """
+    if result.get('memory') is None or not result['items']:
+        return None
+
+    return '{:.1f} B/{}'.format(
+        result['memory'] / result['items'],
+        result['unit'],
+    )
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Run the Plix benchmarks.")
+    parser.add_argument(
+        '--filter',
+        '-k',
+        default='*',
+        help="Only run the cases whose name matches that glob pattern.",
+    )
+    parser.add_argument(
+        '--min-time',
+        type=float,
+        default=0.2,
+        help="The minimum time to spend measuring each case, in seconds.",
+    )
+    parser.add_argument(
+        '--output',
+        '-o',
+        default=None,
+        help=(
+            "The file to write the results to. Defaults to a file named "
+            "after the current commit, in benchmarks/results/."
+        ),
+    )
+    parser.add_argument(
+        '--compare',
+        default=None,
+        help="A previous result file to compare the results with.",
+    )
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        default=None,
+        help=(
+            "Exit with a non-zero status if the median time of any case grew "
+            "by more than that percentage, compared to --compare."
+        ),
+    )
+
+    return parser.parse_args(args)
+
+
+def main(args=sys.argv[1:]):
+    params = parse_args(args)
+    previous = {}
+
+    if params.compare:
+        with open(params.compare) as stream:
+            previous = json.load(stream)['results']
+
+    results = {}
+    regressions = []
+
+    for benchmark in load_benchmarks():
+        for name, param in benchmark.cases():
+            if not fnmatch.fnmatch(name, params.filter):
+                continue
+
+            result = results[name] = benchmark.measure(
+                param,
+                min_time=params.min_time,
+            )
+            line = '{:<50} {:>12} {:>20}'.format(
+                name,
+                format_duration(result['median']),
+                format_throughput(result),
+            )
+            memory = format_memory(result)
+
+            if memory is not None:
+                line += ' {:>20}'.format(memory)
+
+            if name in previous:
+                change = (
+                    result['median'] / previous[name]['median'] - 1
+                ) * 100
+                line += ' {:>+8.1f}%'.format(change)
+
+                if (
+                    params.max_regression is not None and
+                    change > params.max_regression
+                ):
+                    regressions.append(name)
+
+            print(line)
+            sys.stdout.flush()
+
+    revision = get_revision()
+    output = params.output or os.path.join(
+        RESULTS_DIRECTORY,
+        '{}.json'.format(revision or 'unknown'),
+    )
+
+    if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+
+    with open(output, 'w') as stream:
+        json.dump(
+            {
+                'metadata': {
+                    'revision': revision,
+                    'timestamp': time.time(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                },
+                'results': results,
+            },
+            stream,
+            indent=2,
+            sort_keys=True,
+        )
+
+    print("Results written to {}.".format(output))
+
+    if regressions:
+        print("Regressions: {}.".format(', '.join(regressions)))
+
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
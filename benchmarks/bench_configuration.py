@@ -0,0 +1,105 @@
+"""
+Configuration loading benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+import atexit
+import os
+import shutil
+import tempfile
+import yaml
+
+from io import StringIO
+
+from plix.configuration import (
+    ConfigurationCache,
+    load_from_file,
+    load_from_stream,
+    normalize,
+    normalize_all,
+)
+
+from . import benchmark
+
+
+def make_configuration(size):
+    """
+    Generate a synthetic configuration.
+
+    :param size: The number of matrix dimensions, global variables and script
+        commands.
+    :returns: The configuration, as a dictionary.
+    """
+    return {
+        'global': {
+            'GLOBAL{}'.format(index): 'value{}'.format(index)
+            for index in range(size)
+        },
+        'matrix': {
+            'key{}'.format(index): ['a', 'b', 'c', 'd']
+            for index in range(size)
+        },
+        'exclusion_matrix': [
+            {'key{}'.format(index): 'a'}
+            for index in range(size)
+        ],
+        'script': [
+            'echo {{{{ key{} }}}}'.format(index)
+            for index in range(size)
+        ],
+    }
+
+
+@benchmark(unit='configuration', params=[10, 100, 1000])
+def load_configuration_from_stream(size):
+    source = yaml.safe_dump(make_configuration(size))
+
+    def run():
+        load_from_stream(StringIO(source))
+
+        return 1
+
+    return run
+
+
+@benchmark(unit='configuration', params=[10, 100, 1000])
+def load_cached_configuration_from_file(size):
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory)
+    filename = os.path.join(directory, 'plix.yml')
+    cache = ConfigurationCache(directory=os.path.join(directory, 'cache'))
+
+    with open(filename, 'w') as stream:
+        yaml.safe_dump(make_configuration(size), stream)
+
+    def run():
+        load_from_file(filename, cache=cache)
+
+        return 1
+
+    return run
+
+
+@benchmark(unit='configuration', params=[10, 100, 1000])
+def normalize_configuration(size):
+    configuration = make_configuration(size)
+
+    def run():
+        normalize(configuration)
+
+        return 1
+
+    return run
+
+
+@benchmark(unit='configuration', params=[10, 1000])
+def normalize_many_configurations(count):
+    configurations = [make_configuration(10) for _ in range(count)]
+
+    def run():
+        normalize_all(configurations)
+
+        return count
+
+    return run
@@ -0,0 +1,122 @@
+"""
+Executor overhead benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import sys
+
+from plix.displays import BaseDisplay
+from plix.executors import (
+    PythonExecutor,
+    SessionShellExecutor,
+    ShellExecutor,
+)
+from plix.runner import execute_phases
+
+from . import benchmark
+
+# The number of commands of each job.
+COMMAND_COUNT = 100
+
+
+class NullDisplay(BaseDisplay):
+    """
+    A display that discards everything.
+    """
+
+    def set_context(self, commands):
+        pass
+
+    def start_command(self, index, command):
+        pass
+
+    def stop_command(self, index, command, returncode, statistics=None):
+        pass
+
+    def command_output(self, index, data):
+        pass
+
+
+@benchmark(unit='command', params=['ShellExecutor', 'SessionShellExecutor'])
+def tiny_commands(executor_name):
+    executor = {
+        'ShellExecutor': ShellExecutor,
+        'SessionShellExecutor': SessionShellExecutor,
+    }[executor_name]()
+    environment = dict(os.environ)
+    phases = [('script', ['true'] * COMMAND_COUNT)]
+    display = NullDisplay()
+
+    def run():
+        execute_phases(
+            executor=executor,
+            environment=environment,
+            phases=phases,
+            display=display,
+        )
+
+        return COMMAND_COUNT
+
+    return run
+
+
+@benchmark(
+    unit='command',
+    params=['popen/0', 'popen/512', 'posix_spawn/0', 'posix_spawn/512'],
+)
+def spawn_latency(param):
+    # The parameter is the launcher and the size, in MiB, of the memory the
+    # benchmark process holds while it spawns the commands.
+    launcher, size = param.split('/')
+    executor = ShellExecutor(options={'launcher': launcher})
+    environment = dict(os.environ)
+    ballast = bytearray(int(size) * 1024 * 1024)
+
+    for offset in range(0, len(ballast), 4096):
+        ballast[offset] = 1
+
+    def run():
+        for _ in range(COMMAND_COUNT):
+            executor.execute_one(
+                environment=environment,
+                command='true',
+                output=lambda data: None,
+            )
+
+        return COMMAND_COUNT
+
+    # Keep the memory alive for as long as the benchmark runs.
+    run.ballast = ballast
+
+    return run
+
+
+@benchmark(unit='command', params=['ShellExecutor', 'PythonExecutor'])
+def python_commands(executor_name):
+    # Each job executes a few Python commands, through a new interpreter each
+    # or through the workers of the Python executor.
+    if executor_name == 'ShellExecutor':
+        executor = ShellExecutor()
+        command = '{} -c "import json"'.format(sys.executable)
+    else:
+        executor = PythonExecutor()
+        command = 'import json'
+
+    environment = dict(os.environ)
+    phases = [('script', [command] * 10)]
+    display = NullDisplay()
+
+    def run():
+        for _ in range(COMMAND_COUNT // 10):
+            execute_phases(
+                executor=executor,
+                environment=environment,
+                phases=phases,
+                display=display,
+            )
+
+        return COMMAND_COUNT
+
+    return run
@@ -0,0 +1,146 @@
+"""
+Matrix expansion benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+import fnmatch
+
+from itertools import product
+
+from plix.coverage import generate_covering_variants
+from plix.matrix import generate_variants
+
+from . import benchmark
+
+
+def make_matrix(dimensions, values=4):
+    """
+    Generate a synthetic matrix.
+
+    :param dimensions: The number of dimensions.
+    :param values: The number of values of each dimension.
+    :returns: The matrix, as a dictionary.
+    """
+    return {
+        'key{}'.format(index): [
+            'value{}'.format(value) for value in range(values)
+        ]
+        for index in range(dimensions)
+    }
+
+
+@benchmark(unit='variant', params=[4, 6, 8])
+def generate_all_variants(dimensions):
+    matrix = make_matrix(dimensions)
+
+    def run():
+        return sum(1 for _ in generate_variants(matrix))
+
+    return run
+
+
+@benchmark(unit='variant', params=[6, 8, 10])
+def generate_variants_with_subset_pairs(dimensions):
+    matrix = make_matrix(dimensions)
+    subset_pairs = {('key0', 'value0'), ('key1', 'value1'), ('key2', 'value2')}
+
+    def run():
+        return sum(
+            1 for _ in generate_variants(matrix, subset_pairs=subset_pairs)
+        )
+
+    return run
+
+
+@benchmark(unit='variant', params=[4, 6, 8])
+def generate_variants_with_exclusions(dimensions):
+    matrix = make_matrix(dimensions)
+    exclusions = [
+        {'key0': ['value0'], 'key1': ['value1', 'value2']},
+        {'key{}'.format(dimensions - 1): ['value3']},
+        {'key1': ['value0'], 'key{}'.format(dimensions - 2): ['value1']},
+    ]
+
+    def run():
+        return sum(
+            1 for _ in generate_variants(matrix, exclusions=exclusions)
+        )
+
+    return run
+
+
+@benchmark(unit='variant', params=['10x6/2', '15x6/2', '10x4/3'])
+def generate_covering_arrays(param):
+    # The parameter is the number of dimensions, of values per dimension, and
+    # the strength of the coverage.
+    size, strength = param.split('/')
+    dimensions, values = size.split('x')
+    matrix = make_matrix(int(dimensions), values=int(values))
+
+    def run():
+        return sum(
+            1 for _ in generate_covering_variants(
+                matrix,
+                strength=int(strength),
+            )
+        )
+
+    return run
+
+
+@benchmark(unit='variant', params=['index', 'scan'])
+def query_variants(method):
+    # A query with alternatives, a negation and a glob, over the 65536
+    # variants of an 8-dimension matrix. Building the index, or generating the
+    # variants to scan, is part of the query, as `plix list` does both.
+    from plix.index import (
+        VariantIndex,
+        parse_filter,
+    )
+
+    matrix = make_matrix(8)
+    filters = [
+        parse_filter(value)
+        for value in ['key0:value0,value1', 'key3:!value2', 'key5:*[12]']
+    ]
+
+    if method == 'index':
+        def run():
+            return sum(1 for _ in VariantIndex(matrix).find(filters))
+    else:
+        def run():
+            return sum(
+                1 for variant in generate_variants(matrix)
+                if all(
+                    any(
+                        fnmatch.fnmatchcase(value, pattern)
+                        for pattern in filter.patterns
+                    ) != filter.negated
+                    for key, value in variant
+                    for filter in filters
+                    if key == filter.key
+                )
+            )
+
+    return run
+
+
+@benchmark(unit='variant', params=['frozenset', 'Variant'], memory=True)
+def hold_variants(representation):
+    # All the 1M variants of a 6-dimension matrix are held at once, as
+    # frozensets of pairs or as the variants that the matrix generates.
+    matrix = make_matrix(6, values=10)
+    keys = sorted(matrix)
+
+    if representation == 'frozenset':
+        def run():
+            return len([
+                frozenset(zip(keys, values))
+                for values in product(*(matrix[key] for key in keys))
+            ])
+    else:
+        def run():
+            return len(list(generate_variants(matrix)))
+
+    return run
@@ -0,0 +1,107 @@
+"""
+Command output benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import time
+
+from plix.displays import StreamDisplay
+from plix.executors import ShellExecutor
+from plix.writers import DEFAULT_QUEUE_SIZE
+
+from . import benchmark
+
+MEGABYTE = 1024 * 1024
+
+
+class NullStream(object):
+    """
+    A text stream, with a binary buffer, that discards everything.
+    """
+
+    def __init__(self):
+        self.buffer = open(os.devnull, 'wb')
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class SlowStream(NullStream):
+    """
+    A stream that takes a millisecond to write anything, like a busy
+    terminal.
+    """
+
+    def write(self, data):
+        time.sleep(0.001)
+
+
+@benchmark(unit='byte', params=[1, 16, 64])
+def shell_executor_output(megabytes):
+    size = megabytes * MEGABYTE
+    executor = ShellExecutor()
+    display = StreamDisplay(stream=NullStream())
+
+    def run():
+        # Failing commands get their whole output written to the display.
+        executor.execute(
+            environment=dict(os.environ),
+            commands=['head -c {} /dev/zero; false'.format(size)],
+            display=display,
+        )
+
+        return size
+
+    return run
+
+
+@benchmark(unit='byte', params=[4096, 65536])
+def stream_display_command_output(chunk_size):
+    chunk = memoryview(b'\0' * chunk_size)
+    count = 16 * MEGABYTE // chunk_size
+    display = StreamDisplay(stream=NullStream())
+
+    def run():
+        display.set_context(commands=['command'])
+        display.start_command(index=0, command='command')
+
+        for _ in range(count):
+            display.command_output(index=0, data=chunk)
+
+        display.stop_command(index=0, command='command', returncode=1)
+
+        return count * chunk_size
+
+    return run
+
+
+@benchmark(unit='command', params=['sync', 'queued'])
+def slow_stream_display(mode):
+    count = 200
+
+    def run():
+        display = StreamDisplay(
+            stream=SlowStream(),
+            queue_size=DEFAULT_QUEUE_SIZE if mode == 'queued' else None,
+        )
+        display.set_context(commands=['command'])
+
+        try:
+            for index in range(count):
+                display.start_command(index=index, command='command')
+                display.stop_command(
+                    index=index,
+                    command='command',
+                    returncode=0,
+                )
+        finally:
+            display.close()
+
+        return count
+
+    return run
@@ -0,0 +1,28 @@
+"""
+Command-line startup benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+
+from . import benchmark
+
+# The root of the repository, so that the measured Plix is the checked-out
+# one.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@benchmark(unit='run', params=['--help', 'worker --help'])
+def startup(args):
+    command = [sys.executable, '-m', 'plix'] + args.split()
+
+    def run():
+        with open(os.devnull, 'wb') as devnull:
+            subprocess.check_call(command, cwd=ROOT, stdout=devnull)
+
+        return 1
+
+    return run
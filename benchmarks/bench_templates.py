@@ -0,0 +1,75 @@
+"""
+Command template benchmarks.
+"""
+
+from __future__ import unicode_literals
+
+from plix import templates
+from plix.matrix import find_required_keys
+
+from . import benchmark
+
+
+def make_commands(count):
+    """
+    Generate a list of distinct templated commands.
+
+    :param count: The number of commands.
+    :returns: The list of commands.
+    """
+    return [
+        'echo {index} {{{{ key{key} }}}} {{{{ key{other} | upper }}}}'.format(
+            index=index,
+            key=index % 10,
+            other=(index + 1) % 10,
+        )
+        for index in range(count)
+    ]
+
+
+@benchmark(unit='command', params=[100, 1000])
+def find_required_keys_cold(count):
+    commands = make_commands(count)
+
+    def run():
+        templates._templates.clear()
+        find_required_keys(*commands)
+
+        return count
+
+    return run
+
+
+@benchmark(unit='command', params=[100, 1000])
+def find_required_keys_warm(count):
+    commands = make_commands(count)
+    find_required_keys(*commands)
+
+    def run():
+        find_required_keys(*commands)
+
+        return count
+
+    return run
+
+
+@benchmark(unit='variant', params=[1000])
+def render_commands(count):
+    commands = make_commands(10)
+    variants = [
+        frozenset(
+            ('key{}'.format(key), 'value{}'.format(index % (key + 2)))
+            for key in range(10)
+        )
+        for index in range(count)
+    ]
+
+    def run():
+        templates._templates.clear()
+
+        for variant in variants:
+            templates.render_commands(commands=commands, variant=variant)
+
+        return count
+
+    return run
@@ -13,6 +13,7 @@
 # serve to show the default.
 
 import os
+import re
 import sphinx_rtd_theme
 
 # If extensions (or modules to document with autodoc) are in another directory,
@@ -58,9 +59,14 @@ copyright = u'2015, Julien Kauffmann'
 # built documents.
 #
 # The short X.Y version.
-version = open(
-    os.path.join(os.path.dirname(__file__), '..', '..', 'VERSION'),
-).read().strip()
+version = re.search(
+    r"^__version__ = '([^']+)'$",
+    open(
+        os.path.join(os.path.dirname(__file__), '..', '..', 'plix',
+                     '__init__.py'),
+    ).read(),
+    re.MULTILINE,
+).group(1)
 
 # The full version, including alpha/beta/rc tags.
 release = version
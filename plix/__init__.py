@@ -7,8 +7,7 @@ from __future__ import unicode_literals
 
 import logging
 
-from . import compat  # noqa
-
+__version__ = '0.0.1'
 
 # Add a new 'success' log level.
 logging.SUCCESS = logging.INFO + 5
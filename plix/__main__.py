@@ -0,0 +1,7 @@
+"""
+Allow running Plix with ``python -m plix``.
+"""
+
+from .main import main
+
+main()
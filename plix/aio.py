@@ -0,0 +1,355 @@
+"""
+Asyncio-based executors.
+
+This module requires Python 3.7 or later.
+"""
+
+import asyncio
+import sys
+import threading
+
+from functools import partial
+from itertools import repeat
+from timeit import default_timer
+
+from .displays import RecordingDisplay
+from .executors import (
+    BaseExecutor,
+    ProcessGroupTerminator,
+    counted_output,
+)
+from .runner import (
+    CONDITIONAL_PHASES,
+    should_run_phase,
+)
+from .statistics import Statistics
+
+# The maximum size of the chunks read from the output of commands.
+READ_SIZE = 64 * 1024
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine to completion on a dedicated event loop.
+
+    :param coroutine: The coroutine to run.
+    :returns: The result of the coroutine.
+    """
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncShellExecutor(BaseExecutor):
+    """
+    An executor that execute commands through the system shell, from an
+    asyncio event loop.
+
+    When it runs variants in parallel, the runner drives all the commands
+    from a single event loop instead of a thread per variant.
+
+    It requires Python 3.7 or later.
+    """
+    cancellable = True
+
+    def __init__(self, options=None):
+        if sys.version_info < (3, 7):
+            raise RuntimeError(
+                "The {} executor requires Python 3.7 or later".format(
+                    self.full_name,
+                ),
+            )
+
+        super(AsyncShellExecutor, self).__init__(options=options)
+
+    async def execute_async(
+        self,
+        environment,
+        commands,
+        display,
+        statistics=None,
+        cancellation=None,
+    ):
+        """
+        Execute the specified commands.
+
+        This is the coroutine counterpart of
+        :meth:`plix.executors.BaseExecutor.execute`. The CPU times and memory
+        usage of the commands are not measured, as the event loop reaps the
+        processes itself.
+
+        :param environment: The environment variables dictionary.
+        :param commands: A list of commands to execute.
+        :param display: The display to use for command output and report.
+        :param statistics: If not ``None``, a
+            :class:`plix.statistics.Statistics` instance to add the resources
+            used by the commands to.
+        :param cancellation: If not ``None``, a
+            :class:`plix.cancellation.CancellationToken` instance. Running
+            commands are stopped when it gets cancelled, and no command
+            starts afterwards.
+        :returns: True if the execution went fine, False otherwise.
+        """
+        display.set_context(commands=commands)
+
+        for index, command in enumerate(commands):
+            if cancellation is not None and cancellation.cancelled:
+                return False
+
+            with display.command(
+                    index,
+                    command,
+            ) as result:
+                result.statistics = Statistics()
+                start = default_timer()
+                result.returncode = await self.execute_one_async(
+                    environment=environment,
+                    command=command,
+                    output=partial(
+                        counted_output,
+                        result.statistics,
+                        partial(display.command_output, index),
+                    ),
+                    cancellation=cancellation,
+                )
+                result.statistics.wall_time = default_timer() - start
+                result.statistics.command_times[command] = (
+                    result.statistics.wall_time
+                )
+
+                if statistics is not None:
+                    statistics.add(result.statistics)
+
+                if result.returncode != 0:
+                    return False
+
+        return True
+
+    async def execute_one_async(
+        self,
+        environment,
+        command,
+        output,
+        cancellation=None,
+    ):
+        """
+        Execute a command.
+
+        :param environment: The environment variables dictionary.
+        :param command: The command to execute.
+        :param output: A callable that gets called with the output chunks of
+            the command, as they arrive.
+        :param cancellation: If not ``None``, a
+            :class:`plix.cancellation.CancellationToken` instance. The command
+            is stopped with its process group when it gets cancelled.
+        :returns: The exit status of the command.
+        """
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=environment,
+            start_new_session=cancellation is not None,
+        )
+
+        if cancellation is None:
+            return await self.wait_async(process, output)
+
+        terminator = ProcessGroupTerminator(
+            process,
+            grace_period=cancellation.grace_period,
+        )
+
+        try:
+            with cancellation.register(terminator):
+                return await self.wait_async(process, output)
+        finally:
+            terminator.close()
+
+    async def wait_async(self, process, output):
+        """
+        Pump the output of a process, and wait for it to terminate.
+
+        :param process: The :class:`asyncio.subprocess.Process` instance.
+        :param output: A callable that gets called with the output chunks of
+            the process.
+        :returns: The exit status of the process.
+        """
+        while True:
+            data = await process.stdout.read(READ_SIZE)
+
+            if data:
+                output(data)
+            else:
+                break
+
+        return await process.wait()
+
+    def execute_one(self, environment, command, output, cancellation=None):
+        return run_coroutine(self.execute_one_async(
+            environment=environment,
+            command=command,
+            output=output,
+            cancellation=cancellation,
+        ))
+
+
+async def execute_phases_async(
+    executor,
+    environment,
+    phases,
+    display,
+    statistics=None,
+    cancellation=None,
+):
+    """
+    Execute the phases of a job.
+
+    This is the coroutine counterpart of :func:`plix.runner.execute_phases`.
+
+    :param executor: An executor that has an ``execute_async`` coroutine
+        method.
+    :param environment: The environment variables dictionary.
+    :param phases: A list of `(phase, commands)` tuples.
+    :param display: The display to use for command output and report.
+    :param statistics: If not ``None``, a
+        :class:`plix.statistics.Statistics` instance to add the resources
+        used by the phases to.
+    :param cancellation: If not ``None``, a
+        :class:`plix.cancellation.CancellationToken` instance. No phase
+        starts once it is cancelled.
+    :returns: True if the execution went fine, False otherwise.
+    """
+    success = True
+
+    for phase, commands in phases:
+        if not commands or not should_run_phase(phase, success):
+            continue
+
+        if cancellation is not None and cancellation.cancelled:
+            return False
+
+        with display.phase(phase) as result:
+            result.statistics = Statistics()
+            result.success = await executor.execute_async(
+                environment=environment,
+                commands=commands,
+                display=display,
+                statistics=result.statistics,
+                cancellation=cancellation,
+            )
+
+        if statistics is not None:
+            statistics.add(result.statistics)
+
+        if phase not in CONDITIONAL_PHASES:
+            success = result.success
+
+    return success
+
+
+def execute_recorded(
+    executor,
+    calls,
+    concurrency,
+    cancellation=None,
+    parents=None,
+):
+    """
+    Execute several command lists concurrently, on a single event loop.
+
+    The event loop runs in a dedicated thread, so that results can be
+    consumed while the remaining executions progress.
+
+    :param executor: An executor that has an ``execute_async`` coroutine
+        method, like :class:`AsyncShellExecutor`.
+    :param calls: An iterable of dictionaries that hold the `environment`
+        and `phases` arguments of each execution. See
+        :func:`execute_phases_async`.
+    :param concurrency: The maximum number of concurrent executions.
+    :param cancellation: If not ``None``, a
+        :class:`plix.cancellation.CancellationToken` instance that the first
+        failed execution cancels. See :func:`execute_phases_async`.
+    :param parents: If not ``None``, a list that holds, for each call, the
+        position in ``calls`` of the call it depends on, or ``None``. A call
+        waits for the one it depends on without holding a slot, and doesn't
+        execute at all if it failed.
+    :yields: A `(recording, success)` tuple for each execution, in the order
+        of ``calls``, where ``recording`` is a
+        :class:`plix.displays.RecordingDisplay`, or ``None`` if the execution
+        didn't start because of a cancellation or because the call it depends
+        on failed.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+
+    async def create_semaphore():
+        return asyncio.Semaphore(concurrency)
+
+    async def execute(semaphore, kwargs, parent):
+        if parent is not None:
+            _, success = await asyncio.wrap_future(parent)
+
+            if not success:
+                return None, False
+
+        async with semaphore:
+            if cancellation is not None and cancellation.cancelled:
+                return None, False
+
+            recording = RecordingDisplay()
+            success = await execute_phases_async(
+                executor=executor,
+                display=recording,
+                statistics=recording.statistics,
+                cancellation=cancellation,
+                **kwargs
+            )
+
+            if not success and cancellation is not None:
+                cancellation.cancel()
+
+            return recording, success
+
+    futures = []
+
+    try:
+        semaphore = asyncio.run_coroutine_threadsafe(
+            create_semaphore(),
+            loop,
+        ).result()
+
+        for kwargs, parent in zip(calls, parents or repeat(None)):
+            futures.append(asyncio.run_coroutine_threadsafe(
+                execute(
+                    semaphore,
+                    kwargs,
+                    futures[parent] if parent is not None else None,
+                ),
+                loop,
+            ))
+
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+        async def drain():
+            await asyncio.gather(
+                *[
+                    task for task in asyncio.all_tasks()
+                    if task is not asyncio.current_task()
+                ],
+                return_exceptions=True
+            )
+
+        asyncio.run_coroutine_threadsafe(drain(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
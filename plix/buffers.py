@@ -0,0 +1,185 @@
+"""
+Bounded-memory output buffers.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+
+from collections import deque
+from io import BytesIO
+from tempfile import TemporaryFile
+
+# The size past which buffered output gets spilled to disk.
+DEFAULT_SPILL_THRESHOLD = 1024 * 1024
+
+# The size of the chunks read back from buffers.
+CHUNK_SIZE = 64 * 1024
+
+
+def copy_file(source, destination):
+    """
+    Copy the whole content of a file to a binary stream.
+
+    The copy is done with :func:`os.sendfile` whenever both ends are real
+    file descriptors that support it, and falls back to
+    :func:`shutil.copyfileobj` otherwise.
+
+    :param source: The file to copy. It must have a file descriptor.
+    :param destination: The binary stream to copy to.
+    """
+    source.flush()
+    offset = 0
+
+    try:
+        destination_fd = destination.fileno()
+    except (AttributeError, ValueError, IOError, OSError):
+        destination_fd = None
+
+    if destination_fd is not None and hasattr(os, 'sendfile'):
+        destination.flush()
+
+        try:
+            while True:
+                sent = os.sendfile(
+                    destination_fd,
+                    source.fileno(),
+                    offset,
+                    CHUNK_SIZE,
+                )
+
+                if not sent:
+                    return
+
+                offset += sent
+        except OSError:
+            pass
+
+    source.seek(offset)
+    shutil.copyfileobj(source, destination, CHUNK_SIZE)
+
+
+class OutputBuffer(object):
+    """
+    Stores the output of a command with a bounded memory footprint.
+
+    In its default mode, the buffer keeps the whole output: in memory while it
+    is small, and in a temporary file once it grows past a threshold.
+
+    In tail mode, the buffer only keeps the last bytes of the output in
+    memory and discards the rest.
+    """
+
+    def __init__(
+        self,
+        spill_threshold=DEFAULT_SPILL_THRESHOLD,
+        tail_size=None,
+    ):
+        """
+        Initialize the :class:`OutputBuffer`.
+
+        :param spill_threshold: The size, in bytes, past which the output is
+            moved to a temporary file. If ``None``, the output always stays in
+            memory.
+        :param tail_size: If not ``None``, the number of bytes to keep from
+            the end of the output. ``spill_threshold`` is ignored then.
+        """
+        self.spill_threshold = spill_threshold
+        self.tail_size = tail_size
+        self.size = 0
+        self.memory = BytesIO()
+        self.file = None
+        self.tail = deque()
+        self.tail_length = 0
+
+    @property
+    def omitted(self):
+        """
+        Get the number of bytes that were discarded.
+
+        :returns: The number of bytes that were discarded, which can only be
+            non-zero in tail mode.
+        """
+        if self.tail_size is None:
+            return 0
+
+        return max(0, self.size - self.tail_size)
+
+    def write(self, data):
+        """
+        Add some output.
+
+        :param data: The output data (as bytes or as a buffer).
+        """
+        self.size += len(data)
+
+        if self.tail_size is not None:
+            self.tail.append(bytes(data))
+            self.tail_length += len(data)
+
+            while (
+                self.tail and
+                self.tail_length - len(self.tail[0]) >= self.tail_size
+            ):
+                self.tail_length -= len(self.tail.popleft())
+        else:
+            if (
+                self.file is None and
+                self.spill_threshold is not None and
+                self.size > self.spill_threshold
+            ):
+                self.file = TemporaryFile()
+                self.file.write(self.memory.getvalue())
+                self.memory = None
+
+            (self.memory if self.file is None else self.file).write(data)
+
+    def getvalue(self):
+        """
+        Get the buffered output, when it is held in memory.
+
+        :returns: The buffered output, or ``None`` if it was spilled to disk.
+        """
+        if self.tail_size is not None:
+            return b''.join(self.tail)[-self.tail_size:]
+        elif self.file is None:
+            return self.memory.getvalue()
+
+    def chunks(self):
+        """
+        Iterate over the buffered output.
+
+        :yields: Chunks of the buffered output, as bytes.
+        """
+        value = self.getvalue()
+
+        if value is not None:
+            if value:
+                yield value
+        else:
+            self.file.flush()
+            self.file.seek(0)
+
+            for chunk in iter(lambda: self.file.read(CHUNK_SIZE), b''):
+                yield chunk
+
+    def copy_to(self, stream):
+        """
+        Copy the buffered output to a binary stream.
+
+        :param stream: The binary stream to copy the output to.
+        """
+        value = self.getvalue()
+
+        if value is not None:
+            stream.write(value)
+        else:
+            copy_file(source=self.file, destination=stream)
+
+    def close(self):
+        """
+        Release the resources held by the buffer.
+        """
+        if self.file is not None:
+            self.file.close()
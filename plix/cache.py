@@ -0,0 +1,280 @@
+"""
+Content-addressed result cache.
+
+The cache remembers the jobs that succeeded, by a key that is a hash of
+everything their outcome is assumed to depend on: the rendered commands, the
+executor and its options, the environment variables and the content of the
+declared input files. A job whose key is in the cache doesn't need to be
+executed again.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import glob
+import hashlib
+import json
+import os
+import time
+
+from six import text_type
+from tempfile import NamedTemporaryFile
+
+# The default directory of the cache.
+DEFAULT_CACHE_DIRECTORY = '.plix-cache'
+
+# The default maximum number of entries in the cache.
+DEFAULT_MAX_ENTRIES = 1000
+
+# The default maximum age of the entries of the cache, in seconds.
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+# The size of the chunks in which input files are read.
+CHUNK_SIZE = 64 * 1024
+
+
+def find_inputs(patterns, root='.'):
+    """
+    Find the input files that match a list of glob patterns.
+
+    :param patterns: A list of glob patterns, relative to ``root``. On Python
+        3, ``**`` matches any number of directories.
+    :param root: The directory the patterns are relative to.
+    :returns: The sorted list of the paths of the matching files, relative to
+        ``root``.
+    """
+    paths = set()
+
+    for pattern in patterns:
+        pattern = os.path.join(root, pattern)
+
+        try:
+            matches = glob.glob(pattern, recursive=True)
+        except TypeError:
+            matches = glob.glob(pattern)
+
+        paths.update(
+            os.path.relpath(path, root)
+            for path in matches
+            if os.path.isfile(path)
+        )
+
+    return sorted(paths)
+
+
+def hash_inputs(patterns, root='.'):
+    """
+    Hash the content of the input files that match a list of glob patterns.
+
+    :param patterns: A list of glob patterns. See :func:`find_inputs`.
+    :param root: The directory the patterns are relative to.
+    :returns: The hexadecimal digest of the paths and contents of the
+        matching files.
+    """
+    digest = hashlib.sha256()
+
+    for path in find_inputs(patterns, root=root):
+        digest.update(path.encode('utf-8'))
+        digest.update(b'\0')
+
+        with open(os.path.join(root, path), 'rb') as stream:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+def compute_key(commands, executor, environment, inputs=None):
+    """
+    Compute the cache key of a job.
+
+    :param commands: The list of rendered commands of the job.
+    :param executor: The executor the job is executed with.
+    :param environment: A dictionary of the environment variables the
+        outcome of the job depends on.
+    :param inputs: The digest of the input files, as returned by
+        :func:`hash_inputs`, if any.
+    :returns: The key, as an hexadecimal string.
+    """
+    document = json.dumps(
+        {
+            'commands': list(commands),
+            'executor': executor.full_name,
+            'options': executor.options,
+            'environment': {
+                key: text_type(value) for key, value in environment.items()
+            },
+            'inputs': inputs,
+        },
+        sort_keys=True,
+        default=text_type,
+    )
+
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Stores the keys of the jobs that succeeded in a directory, along with
+    their results.
+
+    Each entry is a file, whose modification time is updated whenever the
+    entry is read. The least recently used entries get evicted first.
+    """
+
+    def __init__(
+        self,
+        directory=DEFAULT_CACHE_DIRECTORY,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_age=DEFAULT_MAX_AGE,
+    ):
+        """
+        Initialize the :class:`ResultCache`.
+
+        :param directory: The directory of the cache. It is created if
+            needed.
+        :param max_entries: The maximum number of entries to keep on
+            eviction. If ``None``, the number of entries is not limited.
+        :param max_age: The maximum time, in seconds, since an entry was last
+            used. If ``None``, entries don't expire.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def get_path(self, key):
+        """
+        Get the path of an entry.
+
+        :param key: The key of the entry.
+        :returns: The path of the entry file.
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Get an entry, and mark it as used.
+
+        :param key: The key of the entry.
+        :returns: The result that was stored with the entry, or ``None`` if
+            there is no such entry.
+        """
+        path = self.get_path(key)
+
+        try:
+            with open(path, 'rb') as stream:
+                result = self.deserialize(stream.read())
+
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return result
+
+    def put(self, key, result):
+        """
+        Store an entry.
+
+        :param key: The key of the entry.
+        :param result: The result to store with the entry. It must be
+            serializable by :meth:`serialize`.
+        """
+        path = self.get_path(key)
+        data = self.serialize(result)
+
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+
+        # Entries are written to a temporary file first, so that readers
+        # never see partial entries.
+        with NamedTemporaryFile(
+            dir=os.path.dirname(path),
+            delete=False,
+        ) as stream:
+            stream.write(data)
+
+        try:
+            os.rename(stream.name, path)
+        except OSError:
+            os.remove(path)
+            os.rename(stream.name, path)
+
+    def serialize(self, result):
+        """
+        Serialize the result of an entry.
+
+        :param result: The result.
+        :returns: The serialized result, as bytes.
+        """
+        return json.dumps(result).encode('utf-8')
+
+    def deserialize(self, data):
+        """
+        Deserialize the result of an entry.
+
+        :param data: The serialized result, as bytes.
+        :returns: The result.
+        :raises ValueError: If ``data`` is not a valid serialized result.
+        """
+        return json.loads(data.decode('utf-8'))
+
+    def entries(self):
+        """
+        List the entries of the cache.
+
+        :returns: A list of `(last_used, path)` tuples, most recently used
+            first.
+        """
+        result = []
+
+        if not os.path.isdir(self.directory):
+            return result
+
+        for prefix in os.listdir(self.directory):
+            directory = os.path.join(self.directory, prefix)
+
+            # The directory may hold other files, like the duration history.
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+
+                try:
+                    result.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+
+        result.sort(reverse=True)
+
+        return result
+
+    def evict(self, now=None):
+        """
+        Remove the entries that expired, and the least recently used entries
+        past the maximum number of entries.
+
+        :param now: The current time. Defaults to :func:`time.time`.
+        :returns: The number of removed entries.
+        """
+        now = time.time() if now is None else now
+        count = 0
+
+        for position, (last_used, path) in enumerate(self.entries()):
+            if (
+                (self.max_entries is not None and
+                 position >= self.max_entries) or
+                (self.max_age is not None and now - last_used > self.max_age)
+            ):
+                try:
+                    os.remove(path)
+                    count += 1
+                except OSError:
+                    pass
+
+        return count
@@ -0,0 +1,88 @@
+"""
+Cooperative cancellation.
+
+A cancellation token is shared by the jobs of a run. Executors check it
+before starting a command, and register a callback that stops the commands
+they are running when it gets cancelled.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+
+from contextlib import contextmanager
+
+# The time, in seconds, that cancelled commands are given to terminate before
+# they get killed.
+DEFAULT_GRACE_PERIOD = 5.0
+
+
+class CancellationToken(object):
+    """
+    Signals that the running jobs must stop as soon as possible.
+
+    Tokens can be cancelled and checked from any thread.
+    """
+
+    def __init__(self, grace_period=DEFAULT_GRACE_PERIOD):
+        """
+        Initialize the :class:`CancellationToken`.
+
+        :param grace_period: The time, in seconds, that cancelled commands are
+            given to terminate before they get killed.
+        """
+        self.grace_period = grace_period
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        """
+        Whether the token was cancelled.
+        """
+        return self._cancelled
+
+    def cancel(self):
+        """
+        Cancel the token, and call the registered callbacks.
+
+        Cancelling a token more than once has no effect.
+        """
+        with self.lock:
+            if self._cancelled:
+                return
+
+            self._cancelled = True
+            callbacks = list(self.callbacks.values())
+            self.callbacks.clear()
+
+        for callback in callbacks:
+            callback()
+
+    @contextmanager
+    def register(self, callback):
+        """
+        Register a callback to call if the token gets cancelled while the
+        context is active.
+
+        If the token is already cancelled, the callback is called right away.
+
+        :param callback: A callable that takes no argument. It may be called
+            from another thread.
+        """
+        key = object()
+
+        with self.lock:
+            if not self._cancelled:
+                self.callbacks[key] = callback
+                callback = None
+
+        if callback is not None:
+            callback()
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.callbacks.pop(key, None)
@@ -19,9 +19,23 @@ def construct_yaml_str(self, node):
     return self.construct_scalar(node)
 
 
+#: The fastest safe YAML loader: the LibYAML-based one when PyYAML was built
+#: with it.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 # Make yaml loading function always return unicode strings.
-yaml.Loader.add_constructor('tag:yaml.org,2002:str', construct_yaml_str)
-yaml.SafeLoader.add_constructor('tag:yaml.org,2002:str', construct_yaml_str)
+for loader in {yaml.Loader, yaml.SafeLoader, SafeLoader}:
+    loader.add_constructor('tag:yaml.org,2002:str', construct_yaml_str)
+
+
+def safe_load(stream):
+    """
+    Load a YAML document with the fastest safe loader.
+
+    :param stream: The stream or string to load the document from.
+    :returns: The loaded document.
+    """
+    return yaml.load(stream, Loader=SafeLoader)
 
 
 def unicode_representer(self, value):
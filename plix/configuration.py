@@ -4,18 +4,115 @@ Configuration parser.
 
 from __future__ import unicode_literals
 
-import yaml
+import hashlib
+import json
+import sys
 
+from jinja2 import TemplateSyntaxError
 from six import string_types
 from voluptuous import (
     Schema,
     Required,
     Coerce,
     Extra,
+    All,
+    Invalid,
+    Range,
 )
 from io import open
 
+from . import __version__
+from .cache import (
+    DEFAULT_MAX_AGE,
+    DEFAULT_MAX_ENTRIES,
+    ResultCache,
+)
+from .compat import safe_load
 from .executors import ShellExecutor
+from .templates import get_template
+
+# The default maximum number of normalized configurations to keep cached.
+DEFAULT_CONFIGURATION_CACHE_SIZE = 16
+
+
+class ConfigurationCache(ResultCache):
+    """
+    Stores normalized configurations, as JSON, by the hash of their source.
+
+    The cache lives in the working directory, which anyone who ships the
+    project controls: its entries hold only data, and the executor is stored
+    as the same name and options that the configuration file could have
+    given. Loading an entry is thus never more powerful than loading the
+    configuration file itself.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_entries=DEFAULT_CONFIGURATION_CACHE_SIZE,
+        max_age=DEFAULT_MAX_AGE,
+    ):
+        """
+        Initialize the :class:`ConfigurationCache`.
+
+        :param directory: The directory of the cache. It is created if
+            needed.
+        :param max_entries: The maximum number of configurations to keep on
+            eviction.
+        :param max_age: The maximum time, in seconds, since a configuration
+            was last used.
+        """
+        super(ConfigurationCache, self).__init__(
+            directory=directory,
+            max_entries=max_entries,
+            max_age=max_age,
+        )
+
+    @staticmethod
+    def get_key(source):
+        """
+        Get the key of a configuration.
+
+        :param source: The content of the configuration file, as bytes.
+        :returns: An hexadecimal string that depends on the content, on the
+            version of Plix and on the version of Python.
+        """
+        digest = hashlib.sha256()
+        digest.update('{}\0{}.{}\0'.format(
+            __version__,
+            *sys.version_info[:2]
+        ).encode('utf-8'))
+        digest.update(source)
+
+        return digest.hexdigest()
+
+    def serialize(self, result):
+        document = dict(result)
+        document['executor'] = {
+            'name': result['executor'].full_name,
+            'options': result['executor'].options,
+        }
+        data = json.dumps(document, sort_keys=True)
+
+        # JSON silently turns tuples into lists and keys into strings: only
+        # cache the configurations that it represents faithfully.
+        if json.loads(data) != document:
+            raise TypeError(
+                "The configuration can't be represented exactly in JSON",
+            )
+
+        return data.encode('utf-8')
+
+    def deserialize(self, data):
+        try:
+            configuration = json.loads(data.decode('utf-8'))
+            configuration['executor'] = parse_executor(
+                configuration['executor'],
+            )
+        except Exception as ex:
+            raise ValueError("Invalid cached configuration: {}".format(ex))
+
+        return configuration
 
 
 def load_from_stream(stream):
@@ -25,18 +122,44 @@ def load_from_stream(stream):
     :param stream: The stream to load the configuration from.
     :returns: The normalized configuration.
     """
-    return normalize(yaml.safe_load(stream))
+    return normalize(safe_load(stream))
 
 
-def load_from_file(filename, encoding='utf-8'):
+def load_from_file(filename, encoding='utf-8', cache=None):
     """
     Load a configuration from a file.
 
     :param filename: The name of the file to load the configuration from.
+    :param cache: If not ``None``, a :class:`ConfigurationCache` instance.
+        A file whose content was already loaded is neither parsed nor
+        validated again.
     :returns: The normalized configuration.
     """
-    with open(filename, encoding=encoding) as stream:
-        return load_from_stream(stream=stream)
+    if cache is None:
+        with open(filename, encoding=encoding) as stream:
+            return load_from_stream(stream=stream)
+
+    with open(filename, 'rb') as stream:
+        source = stream.read()
+
+    key = cache.get_key(source)
+    configuration = cache.get(key)
+
+    if configuration is None:
+        configuration = load_from_stream(source.decode(encoding))
+
+        try:
+            cache.put(key, configuration)
+            cache.evict()
+        except (TypeError, ValueError, AttributeError):
+            # Configurations that JSON can't represent are not cached.
+            pass
+        except (IOError, OSError):
+            # Neither is anything in a cache that can't be written to, like
+            # the one of a read-only checkout.
+            pass
+
+    return configuration
 
 
 def command_or_command_list(value):
@@ -54,6 +177,133 @@ def command_or_command_list(value):
         raise ValueError("Value must be either a string or a list")
 
 
+def command_templates(value):
+    """
+    Validate a command list as a list of command templates.
+
+    The templates are compiled, so that the variants only need to render
+    them.
+
+    :param value: The command list to validate.
+    :returns: The command list.
+    :raises voluptuous.Invalid: If a command is not a valid template.
+    """
+    for command in value:
+        if not isinstance(command, string_types):
+            continue
+
+        try:
+            get_template(command)
+        except TemplateSyntaxError as ex:
+            raise Invalid(
+                "Invalid command template {!r}: {}. Literal braces can be "
+                "written between {{% raw %}} and {{% endraw %}}".format(
+                    command,
+                    ex,
+                ),
+            )
+
+    return value
+
+
+def exclusion_list(value):
+    """
+    Validate a value as an exclusion or a list of exclusions.
+
+    An exclusion is a dictionary that maps matrix dimensions to a value or to
+    a list of values.
+
+    :param value: The value to validate.
+    :returns: A list of exclusions, where all values are lists.
+    """
+    if isinstance(value, dict):
+        value = [value]
+    elif not isinstance(value, (list, tuple)):
+        raise ValueError("Value must be either a dictionary or a list")
+
+    result = []
+
+    for exclusion in value:
+        if not isinstance(exclusion, dict):
+            raise ValueError("Exclusions must be dictionaries")
+
+        result.append({
+            key: list(values)
+            if isinstance(values, (list, tuple))
+            else [values]
+            for key, values in exclusion.items()
+        })
+
+    return result
+
+
+def cache_settings(value):
+    """
+    Validate the settings of the result cache.
+
+    The supported settings are:
+
+    - `inputs`: a glob pattern or a list of glob patterns that match the
+      files the outcome of the commands depends on.
+    - `environment`: a variable name or a list of variable names, from the
+      environment Plix runs in, that the outcome of the commands depends on.
+    - `max_entries`: the maximum number of entries to keep in the cache.
+    - `max_age`: the time, in seconds, after which unused entries expire.
+
+    :param value: The value to validate.
+    :returns: The settings dictionary, with defaults for the missing ones.
+    """
+    return CACHE_SETTINGS_SCHEMA(value or {})
+
+
+# The schema of the settings of the result cache. See
+# :func:`cache_settings`.
+CACHE_SETTINGS_SCHEMA = Schema({
+    Required('inputs', default=list): Coerce(command_or_command_list),
+    Required('environment', default=list): Coerce(command_or_command_list),
+    Required(
+        'max_entries',
+        default=DEFAULT_MAX_ENTRIES,
+    ): All(int, Range(min=1)),
+    Required(
+        'max_age',
+        default=DEFAULT_MAX_AGE,
+    ): All(Coerce(float), Range(min=0)),
+})
+
+# The schema of executor descriptions.
+EXECUTOR_SCHEMA = Schema({
+    Required('name'): str,
+    Required('options', default=dict): {Extra: object},
+})
+
+# The executor classes that were already imported, by dotted name, along with
+# their module.
+EXECUTOR_CLASSES = {}
+
+
+def get_executor_class(name):
+    """
+    Get an executor class by its dotted name.
+
+    Classes are imported once, and then looked up in a cache. A cached class
+    is only used while its module is still the one in :data:`sys.modules`,
+    so that reloaded or replaced modules are honored.
+
+    :param name: The dotted name of the class.
+    :returns: The class.
+    """
+    module_name, class_name = name.rsplit('.', 1)
+    module, klass = EXECUTOR_CLASSES.get(name, (None, None))
+
+    if module is None or sys.modules.get(module_name) is not module:
+        module = __import__(module_name, fromlist=[class_name])
+        klass = getattr(module, class_name)
+        EXECUTOR_CLASSES[name] = (module, klass)
+
+    return klass
+
+
 def parse_executor(value):
     """
     Parse an executor string or dict and turns it into an executor instance.
@@ -64,18 +314,39 @@ def parse_executor(value):
     if isinstance(value, string_types):
         value = {'name': value}
 
-    executor_schema = Schema({
-        Required('name'): str,
-        Required('options', default={}): {Extra: object},
-    })
-    value = executor_schema(value)
-
-    module, klass = value['name'].rsplit('.', 1)
-    executor_klass = getattr(__import__(module, fromlist=[klass]), klass)
+    value = EXECUTOR_SCHEMA(value)
+    executor_klass = get_executor_class(value['name'])
 
     return executor_klass(options=value['options'])
 
 
+# The validator of the command lists of the phases.
+COMMAND_TEMPLATES = All(Coerce(command_or_command_list), command_templates)
+
+# The schema of configurations. Defaults are factories, so that normalized
+# configurations don't share mutable values.
+CONFIGURATION_SCHEMA = Schema({
+    Required('executor', default=ShellExecutor): Coerce(parse_executor),
+    Required('global', default=dict): {Extra: object},
+    Required(
+        'cache',
+        default=lambda: cache_settings({}),
+    ): Coerce(cache_settings),
+    Required('matrix', default=dict): {Extra: object},
+    Required('exclusion_matrix', default=list): Coerce(exclusion_list),
+    Required('before_install', default=list): COMMAND_TEMPLATES,
+    Required('install', default=list): COMMAND_TEMPLATES,
+    Required('before_script', default=list): COMMAND_TEMPLATES,
+    Required('script', default=list): COMMAND_TEMPLATES,
+    Required('after_success', default=list): COMMAND_TEMPLATES,
+    Required('after_failure', default=list): COMMAND_TEMPLATES,
+    Required('after_script', default=list): COMMAND_TEMPLATES,
+})
+
+# The schema of lists of configurations. See :func:`normalize_all`.
+CONFIGURATIONS_SCHEMA = Schema([CONFIGURATION_SCHEMA])
+
+
 def normalize(configuration):
     """
     Normalize and validate a configuration.
@@ -83,24 +354,16 @@ def normalize(configuration):
     :param configuration: The configuration to normalize.
     :returns: The normalized configuration.
     """
-    schema = Schema({
-        Required(
-            'executor',
-            default=ShellExecutor(),
-        ): Coerce(parse_executor),
-        Required('global', default={}): {Extra: object},
-        Required('matrix', default={}): {Extra: object},
-        Required('exclusion_matrix', default=[]): {Extra: object},
-        Required(
-            'before_install',
-            default=[],
-        ): Coerce(command_or_command_list),
-        Required('install', default=[]): Coerce(command_or_command_list),
-        Required('before_script', default=[]): Coerce(command_or_command_list),
-        Required('script', default=[]): Coerce(command_or_command_list),
-        Required('after_success', default=[]): Coerce(command_or_command_list),
-        Required('after_failure', default=[]): Coerce(command_or_command_list),
-        Required('after_script', default=[]): Coerce(command_or_command_list),
-    })
-
-    return schema(configuration)
+    return CONFIGURATION_SCHEMA(configuration)
+
+
+def normalize_all(configurations):
+    """
+    Normalize and validate several configurations at once.
+
+    :param configurations: An iterable of configurations.
+    :returns: The list of the normalized configurations, in the same order.
+    :raises voluptuous.MultipleInvalid: If a configuration is invalid. The
+        path of the error starts with the position of that configuration.
+    """
+    return CONFIGURATIONS_SCHEMA(list(configurations))
@@ -0,0 +1,282 @@
+"""
+Covering arrays.
+
+A covering array of strength `t` is a set of variants in which the values of
+any `t` dimensions appear in all their combinations. It is much smaller than
+the whole matrix, yet it exercises every interaction between up to `t`
+dimensions.
+"""
+
+from __future__ import unicode_literals
+
+from itertools import (
+    combinations,
+    product,
+)
+
+from .matrix import (
+    Dimensions,
+    Variant,
+    generate_variants,
+    get_domains,
+)
+
+# The strength of pairwise coverage.
+PAIRWISE = 2
+
+
+def get_constraints(keys, domains, exclusions):
+    """
+    Get the constraints that exclusions put on the indexes of values.
+
+    :param keys: The sorted dimensions of the matrix.
+    :param domains: The values of each dimension, in the same order.
+    :param exclusions: A list of exclusions. See
+        :func:`plix.matrix.generate_variants`.
+    :returns: A list of exclusions, each made of `(depth, indexes)` tuples,
+        where `depth` is the index of a dimension and `indexes` the set of
+        the indexes of its excluded values. Exclusions that reference unknown
+        dimensions are left out, as they never match.
+    """
+    depths = {key: depth for depth, key in enumerate(keys)}
+
+    return [
+        [
+            (
+                depths[key],
+                frozenset(
+                    index
+                    for index, value in enumerate(domains[depths[key]])
+                    if value in values
+                ),
+            )
+            for key, values in exclusion.items()
+        ]
+        for exclusion in exclusions
+        if exclusion and all(key in depths for key in exclusion)
+    ]
+
+
+def generate_covering_variants(
+    matrix,
+    strength=PAIRWISE,
+    subset_pairs=set(),
+    exclusions=(),
+):
+    """
+    Generate variants of ``matrix`` that cover all the combinations of values
+    of any ``strength`` dimensions, eventually limiting to those that contain
+    ``subset_pairs`` and that are not excluded by ``exclusions``.
+
+    Variants are built greedily, one at a time: each starts with one of the
+    combinations that are not covered yet, and its other dimensions get the
+    values that cover the most uncovered combinations. The combinations that
+    no variant can contain because of ``exclusions`` are not covered.
+
+    :param matrix: The matrix to generate the variants from.
+    :param strength: The number of dimensions whose combinations of values
+        get covered. When the matrix doesn't have more dimensions, all its
+        variants are generated.
+    :param subset_pairs: A set of pairs that limits the generated matrices.
+    :param exclusions: A list of exclusions. See
+        :func:`plix.matrix.generate_variants`.
+    :yields: A :class:`plix.matrix.Variant` instance for each of the
+        generated variants.
+    """
+    if strength < 1:
+        raise ValueError(
+            "The strength must be strictly positive, not {}".format(strength),
+        )
+
+    domains = get_domains(matrix, subset_pairs)
+
+    if domains is None:
+        return
+
+    keys = [key for key, _ in domains]
+    domains = [values for _, values in domains]
+
+    if strength >= len(keys):
+        for variant in generate_variants(matrix, subset_pairs, exclusions):
+            yield variant
+
+        return
+
+    constraints = get_constraints(keys, domains, exclusions)
+    variant_dimensions = Dimensions(list(zip(keys, domains)))
+
+    # Each exclusion gets checked when any of its dimensions gets assigned.
+    # Unassigned dimensions have a value index of -1, that never matches.
+    checks = [
+        [
+            exclusion for exclusion in constraints
+            if any(depth == other for other, _ in exclusion)
+        ]
+        for depth in range(len(keys))
+    ]
+
+    def is_excluded(assignment, depth):
+        return any(
+            all(assignment[other] in indexes for other, indexes in exclusion)
+            for exclusion in checks[depth]
+        )
+
+    # The combinations of value indexes that are not covered yet, for each
+    # combination of dimensions. Those that are excluded by themselves can't
+    # be covered.
+    uncovered = {}
+    assignment = [-1] * len(keys)
+
+    for dimensions in combinations(range(len(keys)), strength):
+        uncovered[dimensions] = set(
+            product(*(range(len(domains[d])) for d in dimensions)),
+        )
+
+        if any(checks[d] for d in dimensions):
+            for indexes in list(uncovered[dimensions]):
+                for depth, index in zip(dimensions, indexes):
+                    assignment[depth] = index
+
+                if any(is_excluded(assignment, d) for d in dimensions):
+                    uncovered[dimensions].discard(indexes)
+
+            for depth in dimensions:
+                assignment[depth] = -1
+
+    count = sum(len(indexes) for indexes in uncovered.values())
+    order = sorted(uncovered)
+    related = [
+        [dimensions for dimensions in uncovered if depth in dimensions]
+        for depth in range(len(keys))
+    ]
+
+    # The number of uncovered combinations that each value is part of, that
+    # breaks the ties between values.
+    weights = [[0] * len(values) for values in domains]
+
+    for dimensions, combinations_ in uncovered.items():
+        for indexes in combinations_:
+            for depth, index in zip(dimensions, indexes):
+                weights[depth][index] += 1
+
+    def get_allowed(assignment, depth):
+        if not checks[depth]:
+            return range(len(domains[depth]))
+
+        allowed = []
+
+        for index in range(len(domains[depth])):
+            assignment[depth] = index
+
+            if not is_excluded(assignment, depth):
+                allowed.append(index)
+
+        assignment[depth] = -1
+
+        return allowed
+
+    def complete(seed):
+        assignment = [-1] * len(keys)
+
+        # The number of uncovered combinations that assigning each value
+        # would cover: those whose other dimensions are assigned already.
+        scores = [[0] * len(values) for values in domains]
+
+        def assign(depth, index):
+            assignment[depth] = index
+
+            for dimensions in related[depth]:
+                others = [d for d in dimensions if assignment[d] < 0]
+
+                if len(others) == 1:
+                    other = others[0]
+                    position = dimensions.index(other)
+                    indexes = [assignment[d] for d in dimensions]
+
+                    for value in range(len(domains[other])):
+                        indexes[position] = value
+
+                        if tuple(indexes) in uncovered[dimensions]:
+                            scores[other][value] += 1
+
+        for depth, index in seed:
+            assign(depth, index)
+
+        unassigned = [
+            depth for depth, index in enumerate(assignment) if index < 0
+        ]
+
+        # The value that covers the most gets assigned first, whatever its
+        # dimension.
+        while unassigned:
+            choices = [
+                (depth, get_allowed(assignment, depth))
+                for depth in unassigned
+            ]
+
+            if not all(indexes for _, indexes in choices):
+                break
+
+            depth, index = max(
+                (
+                    (depth, index)
+                    for depth, indexes in choices
+                    for index in indexes
+                ),
+                key=lambda choice: (
+                    scores[choice[0]][choice[1]],
+                    weights[choice[0]][choice[1]],
+                ),
+            )
+            assign(depth, index)
+            unassigned.remove(depth)
+        else:
+            return assignment
+
+        # The greedy choices led to a dead end: any variant that contains the
+        # seed will do.
+        variant = next(generate_variants(
+            matrix,
+            subset_pairs=set(subset_pairs) | {
+                (keys[depth], domains[depth][index]) for depth, index in seed
+            },
+            exclusions=exclusions,
+        ), None)
+
+        if variant is None:
+            return None
+
+        variant = dict(variant)
+
+        return [
+            values.index(variant[key]) for key, values in zip(keys, domains)
+        ]
+
+    while count:
+        dimensions = max(
+            order,
+            key=lambda dimensions: len(uncovered[dimensions]),
+        )
+        indexes = min(uncovered[dimensions])
+        assignment = complete(list(zip(dimensions, indexes)))
+
+        if assignment is None:
+            uncovered[dimensions].discard(indexes)
+            count -= 1
+
+            for depth, index in zip(dimensions, indexes):
+                weights[depth][index] -= 1
+
+            continue
+
+        for dimensions, combinations_ in uncovered.items():
+            indexes = tuple(assignment[d] for d in dimensions)
+
+            if indexes in combinations_:
+                combinations_.discard(indexes)
+                count -= 1
+
+                for depth, index in zip(dimensions, indexes):
+                    weights[depth][index] -= 1
+
+        yield Variant(variant_dimensions, tuple(assignment))
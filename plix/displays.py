@@ -6,7 +6,6 @@ from __future__ import unicode_literals
 
 from contextlib import contextmanager
 from argparse import Namespace
-from io import BytesIO
 
 from colorama import AnsiToWin32
 
@@ -19,12 +18,183 @@ from chromalog.mark.helpers.simple import (
     error,
 )
 
+from .buffers import (
+    DEFAULT_SPILL_THRESHOLD,
+    OutputBuffer,
+)
+from .matrix import format_variant
+from .statistics import Statistics
+from .writers import (
+    BLOCK,
+    QueuedWriter,
+)
+
+
+def format_status(succeeded):
+    """
+    Get the status mark of an execution.
+
+    :param succeeded: Whether the execution succeeded.
+    :returns: A marked-up unicode string.
+    """
+    return success("success") if succeeded else error("failed")
+
 
 class BaseDisplay(object):
     """
     Provides general display logic to its subclasses.
     """
 
+    #: Whether :func:`command_output` can be called with :class:`memoryview`
+    #: instances. Those are only valid during the call, so displays that
+    #: accept them must copy the data they keep.
+    accepts_memoryview = False
+
+    @contextmanager
+    def setup(self, pairs):
+        """
+        Contextmanager that wraps calls to :func:`start_setup` and
+        :func:`stop_setup`.
+
+        :param pairs: The pairs that all the variants that share the setup
+            have in common.
+        """
+        self.start_setup(pairs=pairs)
+
+        result = Namespace(success=None, statistics=None)
+
+        try:
+            yield result
+        finally:
+            self.stop_setup(
+                pairs=pairs,
+                success=result.success,
+                statistics=result.statistics,
+            )
+
+    def start_setup(self, pairs):
+        """
+        Indicate that the setup phases shared by several variants started.
+
+        :param pairs: The pairs that all the variants that share the setup
+            have in common.
+        """
+
+    def stop_setup(self, pairs, success, statistics=None):
+        """
+        Indicate that the setup phases shared by several variants stopped.
+
+        :param pairs: The pairs that all the variants that share the setup
+            have in common.
+        :param success: Whether all the setup commands succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            setup commands, if available.
+        """
+
+    @contextmanager
+    def variant(self, variant):
+        """
+        Contextmanager that wraps calls to :func:`start_variant` and
+        :func:`stop_variant`.
+
+        :param variant: The variant that is about to be executed.
+        """
+        self.start_variant(variant=variant)
+
+        result = Namespace(success=None, statistics=None)
+
+        try:
+            yield result
+        finally:
+            self.stop_variant(
+                variant=variant,
+                success=result.success,
+                statistics=result.statistics,
+            )
+
+    def start_variant(self, variant):
+        """
+        Indicate that a variant started.
+
+        :param variant: The variant that is about to be executed.
+        """
+
+    def stop_variant(self, variant, success, statistics=None):
+        """
+        Indicate that a variant stopped.
+
+        :param variant: The variant that was executed.
+        :param success: Whether all the commands of the variant succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            commands of the variant, if available.
+        """
+
+    def shared_variant(self, variant, reference, success):
+        """
+        Indicate that a variant was not executed on its own because it is
+        equivalent to another one.
+
+        :param variant: The variant that was not executed.
+        :param reference: The variant that was executed in its stead.
+        :param success: Whether all the commands of ``reference`` succeeded.
+        """
+
+    def cached_variant(self, variant, statistics=None):
+        """
+        Indicate that a variant was not executed because a previous execution
+        of the same commands, in the same conditions, succeeded.
+
+        :param variant: The variant that was not executed.
+        :param statistics: The :class:`plix.statistics.Statistics` of the
+            previous execution, if available.
+        """
+
+    def skipped_variant(self, variant):
+        """
+        Indicate that a variant was not executed because the run was
+        cancelled.
+
+        :param variant: The variant that was not executed.
+        """
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Contextmanager that wraps calls to :func:`start_phase` and
+        :func:`stop_phase`.
+
+        :param phase: The name of the phase, like `install` or `script`.
+        """
+        self.start_phase(phase=phase)
+
+        result = Namespace(success=None, statistics=None)
+
+        try:
+            yield result
+        finally:
+            self.stop_phase(
+                phase=phase,
+                success=result.success,
+                statistics=result.statistics,
+            )
+
+    def start_phase(self, phase):
+        """
+        Indicate that a phase started.
+
+        :param phase: The name of the phase.
+        """
+
+    def stop_phase(self, phase, success, statistics=None):
+        """
+        Indicate that a phase stopped.
+
+        :param phase: The name of the phase.
+        :param success: Whether all the commands of the phase succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            commands of the phase, if available.
+        """
+
     @contextmanager
     def command(self, index, command):
         """
@@ -41,7 +211,7 @@ class BaseDisplay(object):
             command=command,
         )
 
-        result = Namespace(returncode=None)
+        result = Namespace(returncode=None, statistics=None)
 
         try:
             yield result
@@ -50,22 +220,59 @@ class BaseDisplay(object):
                 index=index,
                 command=command,
                 returncode=result.returncode,
+                statistics=result.statistics,
             )
 
+    def flush(self):
+        """
+        Wait until everything displayed so far is written.
+
+        The default implementation does nothing.
+        """
+
 
 class StreamDisplay(BaseDisplay):
     """
     Displays commands output to an output stream.
     """
+    accepts_memoryview = True
 
-    def __init__(self, stream, colorizer=Colorizer()):
+    def __init__(
+        self,
+        stream,
+        colorizer=Colorizer(),
+        spill_threshold=DEFAULT_SPILL_THRESHOLD,
+        tail_size=None,
+        queue_size=None,
+        overflow_policy=BLOCK,
+    ):
         """
         Initialize the :class:`StreamDisplay`.
 
+        The output of the commands is only shown when they fail. Until then,
+        it is held in :class:`plix.buffers.OutputBuffer` instances.
+
+        By default, the display writes to the stream from the calling thread.
+        With a ``queue_size``, the writes are done by a
+        :class:`plix.writers.QueuedWriter` instead, so that a slow stream
+        doesn't hold up the execution of the commands. :func:`close` must be
+        called then.
+
         :param stream: The stream to be attached too.
+        :param colorizer: The colorizer to use for colored output.
+        :param spill_threshold: The size, in bytes, past which the output of
+            a command is moved to a temporary file.
+        :param tail_size: If not ``None``, only that many bytes from the end
+            of the output of a command are kept and shown.
+        :param queue_size: If not ``None``, the maximum size, in characters,
+            of the text queued for the writer thread.
+        :param overflow_policy: What to do with the text that doesn't fit in
+            the queue. See :data:`plix.writers.OVERFLOW_POLICIES`.
         """
         super(StreamDisplay, self).__init__()
         self.colorizer = colorizer
+        self.spill_threshold = spill_threshold
+        self.tail_size = tail_size
         self.output_map = {}
 
         if stream_has_color_support(stream):
@@ -79,6 +286,68 @@ class StreamDisplay(BaseDisplay):
         else:
             self.binary_stream = stream
 
+        if queue_size is not None:
+            self.writer = QueuedWriter(
+                stream=self.stream,
+                binary_stream=self.binary_stream,
+                queue_size=queue_size,
+                overflow_policy=overflow_policy,
+                format_dropped=self.format_dropped,
+            )
+        else:
+            self.writer = None
+
+    def write(self, text):
+        """
+        Write some text to the stream, and flush it.
+
+        :param text: The text, as an unicode string.
+        """
+        if self.writer is not None:
+            self.writer.write(text)
+        else:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def write_output(self, output):
+        """
+        Write the output of a command to the binary stream, and release it.
+
+        :param output: A :class:`plix.buffers.OutputBuffer` instance.
+        """
+        if self.writer is not None:
+            self.writer.write_output(output)
+        else:
+            try:
+                output.copy_to(self.binary_stream)
+            finally:
+                output.close()
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        """
+        Write all the queued output, and stop the writer thread, if any.
+        """
+        if self.writer is not None:
+            self.writer.close()
+
+    def format_dropped(self, count):
+        """
+        Get the notice that replaces the text that the display dropped.
+
+        :param count: The number of dropped characters.
+        :returns: The formatted notice.
+        """
+        return self.format_output(
+            "{}\n",
+            warning("[{} character(s) of display output dropped]".format(
+                count,
+            )),
+        )
+
     def format_output(self, message, *args, **kwargs):
         """
         Format some output in regards to the output stream color-capability.
@@ -97,48 +366,218 @@ class StreamDisplay(BaseDisplay):
 
         :param commands: The list of commands to be executed.
         """
-        self.longest_len = max(map(len, commands))
+        self.longest_len = max([0] + [len(command) for command in commands])
+
+    def start_setup(self, pairs):
+        """
+        Indicate that the setup phases shared by several variants started.
+
+        :param pairs: The pairs that all the variants that share the setup
+            have in common.
+        """
+        self.write(self.format_output(
+            "{}\n",
+            important(self.format_setup(pairs)),
+        ))
+
+    def stop_setup(self, pairs, success, statistics=None):
+        """
+        Indicate that the setup phases shared by several variants stopped.
+
+        :param pairs: The pairs that all the variants that share the setup
+            have in common.
+        :param success: Whether all the setup commands succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            setup commands, if available.
+        """
+        self.write(self.format_output(
+            "{}\t[{}]{}\n",
+            important(self.format_setup(pairs)),
+            format_status(success),
+            (
+                " ({})".format(statistics.format())
+                if statistics is not None
+                else ""
+            ),
+        ))
+
+    @staticmethod
+    def format_setup(pairs):
+        """
+        Get the title of a shared setup.
+
+        :param pairs: The pairs of the setup.
+        :returns: An unicode string.
+        """
+        if pairs:
+            return "setup for {}".format(format_variant(pairs))
+
+        return "setup"
+
+    def start_phase(self, phase):
+        """
+        Indicate that a phase started.
+
+        :param phase: The name of the phase.
+        """
+        self.write(self.format_output("[{}]\n", phase))
+
+    def stop_phase(self, phase, success, statistics=None):
+        """
+        Indicate that a phase stopped.
+
+        :param phase: The name of the phase.
+        :param success: Whether all the commands of the phase succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            commands of the phase, if available.
+        """
+        if statistics is not None:
+            self.write(self.format_output(
+                "[{}]\t[{}] ({})\n",
+                phase,
+                format_status(success),
+                statistics.format(),
+            ))
+
+    def start_variant(self, variant):
+        """
+        Indicate that a variant started.
+
+        :param variant: The variant that is about to be executed.
+        """
+        if variant:
+            self.write(self.format_output(
+                "{}\n",
+                important(format_variant(variant)),
+            ))
+
+    def shared_variant(self, variant, reference, success):
+        """
+        Indicate that a variant was not executed on its own because it is
+        equivalent to another one.
+
+        :param variant: The variant that was not executed.
+        :param reference: The variant that was executed in its stead.
+        :param success: Whether all the commands of ``reference`` succeeded.
+        """
+        self.write(self.format_output(
+            "{}\t[{}] (same as {})\n",
+            important(format_variant(variant)),
+            format_status(success),
+            format_variant(reference),
+        ))
+
+    def cached_variant(self, variant, statistics=None):
+        """
+        Indicate that a variant was not executed because a previous execution
+        of the same commands, in the same conditions, succeeded.
+
+        :param variant: The variant that was not executed.
+        :param statistics: The :class:`plix.statistics.Statistics` of the
+            previous execution, if available.
+        """
+        self.write(self.format_output(
+            "{}\t[{}]{}\n",
+            important(format_variant(variant) or "total"),
+            success("cached"),
+            (
+                " ({})".format(statistics.format())
+                if statistics is not None
+                else ""
+            ),
+        ))
+
+    def skipped_variant(self, variant):
+        """
+        Indicate that a variant was not executed because the run was
+        cancelled.
+
+        :param variant: The variant that was not executed.
+        """
+        self.write(self.format_output(
+            "{}\t[{}]\n",
+            important(format_variant(variant) or "total"),
+            warning("skipped"),
+        ))
 
     def start_command(self, index, command):
         """
-        Indicate that a command stopped.
+        Indicate that a command started.
 
         :param index: The index of the command.
         :param command: The command that is about to be executed, as an unicode
             string.
         """
-        self.stream.write(self.format_output(
+        self.write(self.format_output(
             "{}) {}",
             warning(important(index + 1)),
             command,
         ))
-        self.stream.flush()
-        self.output_map[index] = BytesIO()
+        self.output_map[index] = OutputBuffer(
+            spill_threshold=self.spill_threshold,
+            tail_size=self.tail_size,
+        )
 
-    def stop_command(self, index, command, returncode):
+    def stop_variant(self, variant, success, statistics=None):
+        """
+        Indicate that a variant stopped.
+
+        :param variant: The variant that was executed.
+        :param success: Whether all the commands of the variant succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of all the
+            commands of the variant, if available.
+        """
+        if statistics is not None:
+            self.write(self.format_output(
+                "{}\t[{}] ({})\n",
+                important(format_variant(variant) or "total"),
+                format_status(success),
+                statistics.format(),
+            ))
+
+    def stop_command(self, index, command, returncode, statistics=None):
         """
         Indicate that a command stopped.
 
         :param index: The index of the command.
         :param command: The command that was executed, as an unicode string.
         :param returncode: The exit status.
+        :param statistics: The :class:`plix.statistics.Statistics` of the
+            command, if available.
         """
-        self.stream.write(self.format_output(
-            "{}\t[{}]\n",
+        self.write(self.format_output(
+            "{}\t[{}]{}\n",
             " " * (self.longest_len - len(command)),
-            success("success") if returncode == 0 else error("failed"),
+            format_status(returncode == 0),
+            (
+                # The peak memory usage mostly reflects the size of Plix: it
+                # is only shown for whole variants.
+                " ({})".format(statistics.format(memory=False))
+                if statistics is not None
+                else ""
+            ),
         ))
 
+        output = self.output_map.pop(index)
+
         if returncode != 0:
-            self.binary_stream.write(self.output_map[index].getvalue())
-            self.stream.write(self.format_output(
+            if output.omitted:
+                self.write(self.format_output(
+                    "{}\n",
+                    warning("[{} byte(s) of output omitted]".format(
+                        output.omitted,
+                    )),
+                ))
+
+            self.write_output(output)
+            self.write(self.format_output(
                 "{}) {} {}\n",
                 warning(important(index + 1)),
                 error("Command exited with"),
                 important(error(returncode)),
             ))
-
-        del self.output_map[index]
+        else:
+            output.close()
 
     def command_output(self, index, data):
         """
@@ -148,3 +587,99 @@ class StreamDisplay(BaseDisplay):
         :param data: The output data (as bytes).
         """
         self.output_map[index].write(data)
+
+
+class RecordingDisplay(BaseDisplay):
+    """
+    Records the calls made to a display so that they can be replayed later,
+    possibly from another thread.
+
+    The output of each command is kept in a
+    :class:`plix.buffers.OutputBuffer`, and the resources used by all the
+    commands are rolled up in :attr:`statistics`.
+    """
+    accepts_memoryview = True
+
+    def __init__(self, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        """
+        Initialize the :class:`RecordingDisplay`.
+
+        :param spill_threshold: The size, in bytes, past which the output of
+            a command is moved to a temporary file.
+        """
+        super(RecordingDisplay, self).__init__()
+        self.spill_threshold = spill_threshold
+        self.calls = []
+        self.outputs = []
+        self.output_map = {}
+        self.statistics = Statistics()
+
+    def set_context(self, commands):
+        self.calls.append(('set_context', {'commands': commands}))
+
+    def start_phase(self, phase):
+        self.calls.append(('start_phase', {'phase': phase}))
+
+    def stop_phase(self, phase, success, statistics=None):
+        self.calls.append((
+            'stop_phase',
+            {'phase': phase, 'success': success, 'statistics': statistics},
+        ))
+
+    def start_command(self, index, command):
+        # Indexes restart from zero in each phase.
+        self.output_map.pop(index, None)
+        self.calls.append((
+            'start_command',
+            {'index': index, 'command': command},
+        ))
+
+    def stop_command(self, index, command, returncode, statistics=None):
+        self.calls.append((
+            'stop_command',
+            {
+                'index': index,
+                'command': command,
+                'returncode': returncode,
+                'statistics': statistics,
+            },
+        ))
+
+    def command_output(self, index, data):
+        output = self.output_map.get(index)
+
+        if output is None:
+            output = self.output_map[index] = OutputBuffer(
+                spill_threshold=self.spill_threshold,
+            )
+            self.calls.append((
+                'command_output',
+                {'index': index, 'output': len(self.outputs)},
+            ))
+            self.outputs.append(output)
+
+        output.write(data)
+
+    def replay(self, display):
+        """
+        Replay all the recorded calls on another display, in order.
+
+        The output of a command is replayed in as few chunks as possible.
+
+        :param display: The display to replay the calls on.
+        """
+        for name, kwargs in self.calls:
+            if name == 'command_output':
+                index = kwargs['index']
+
+                for chunk in self.outputs[kwargs['output']].chunks():
+                    display.command_output(index, chunk)
+            else:
+                getattr(display, name)(**kwargs)
+
+    def close(self):
+        """
+        Release the resources held by the recorded output.
+        """
+        for output in self.outputs:
+            output.close()
@@ -0,0 +1,575 @@
+"""
+Distributed matrix execution over ZeroMQ.
+
+A broker binds a ROUTER socket and hands jobs to workers, which connect
+with DEALER sockets. Workers execute the jobs with the executor from the
+broker's configuration, and stream the display calls and the output of the
+commands back to the broker.
+
+All messages are multipart. Workers send:
+
+- ``[b'ready']`` when they start;
+- ``[b'call', name_and_kwargs]`` for display calls, as JSON;
+- ``[b'output', index, data]`` for command output;
+- ``[b'done', success, statistics]`` when a job completes, as JSON.
+
+Statistics travel as the dictionaries of
+:meth:`plix.statistics.Statistics.to_dict`.
+
+The broker answers ``ready`` and ``done`` messages with either
+``[b'job', job]``, where ``job`` is a YAML document, or ``[b'stop']``.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import threading
+import uuid
+
+import yaml
+import zmq
+
+from collections import deque
+from contextlib import contextmanager
+from timeit import default_timer
+
+from .compat import yaml_dump
+from .configuration import normalize
+from .displays import (
+    BaseDisplay,
+    RecordingDisplay,
+)
+from .log import logger
+from .runner import (
+    SETUP_PHASES,
+    VARIANT_PHASES,
+    build_environment,
+    execute_phases,
+    Runner,
+)
+from .statistics import Statistics
+
+# Brokers only accept local workers, unless they are explicitly bound to
+# another interface, as jobs hold the global environment of the
+# configuration.
+DEFAULT_BIND_ENDPOINT = 'tcp://127.0.0.1:7474'
+DEFAULT_CONNECT_ENDPOINT = 'tcp://127.0.0.1:7474'
+
+# The interval, in seconds, between the heartbeats of workers.
+DEFAULT_HEARTBEAT_INTERVAL = 1.0
+
+# The time, in seconds, after which a silent worker is considered lost.
+DEFAULT_HEARTBEAT_TIMEOUT = 10.0
+
+# The number of times a job is handed to workers that get lost before it is
+# reported as failed.
+MAX_ATTEMPTS = 3
+
+
+def dumps(value):
+    """
+    Serialize a value as JSON bytes.
+
+    :param value: The value to serialize.
+    :returns: The JSON representation of ``value``, as bytes.
+    """
+    return json.dumps(value).encode('utf-8')
+
+
+def loads(data):
+    """
+    Deserialize JSON bytes.
+
+    :param data: The JSON representation, as bytes.
+    :returns: The deserialized value.
+    """
+    return json.loads(data.decode('utf-8'))
+
+
+class Broker(object):
+    """
+    Hands jobs to the workers that connect to it.
+    """
+
+    def __init__(
+        self,
+        endpoint=DEFAULT_BIND_ENDPOINT,
+        context=None,
+        heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT,
+    ):
+        """
+        Initialize the :class:`Broker`.
+
+        :param endpoint: The endpoint to bind to.
+        :param context: The ZeroMQ context to use. If ``None``, the global
+            instance is used.
+        :param heartbeat_timeout: The time, in seconds, after which a worker
+            that doesn't send anything is considered lost.
+        """
+        self.context = context or zmq.Context.instance()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.bind(endpoint)
+
+    @property
+    def endpoint(self):
+        """
+        Get the endpoint the broker is bound to.
+
+        :returns: The endpoint, with any wildcard port resolved.
+        """
+        return self.socket.getsockopt(zmq.LAST_ENDPOINT).decode('utf-8')
+
+    def close(self):
+        """
+        Close the broker socket.
+        """
+        self.socket.close(linger=0)
+
+    def execute_recorded(self, jobs, cancellation=None):
+        """
+        Execute jobs on the workers.
+
+        Workers that stay silent for longer than the heartbeat timeout while
+        they execute a job are considered lost, and their job is handed to
+        another worker. A job that gets lost :data:`MAX_ATTEMPTS` times is
+        reported as failed.
+
+        :param jobs: A list of job documents. See :meth:`DistributedRunner.
+            serialize`.
+        :param cancellation: If not ``None``, a
+            :class:`plix.cancellation.CancellationToken` instance that the
+            first failed job cancels. Once it is cancelled, the remaining jobs
+            are not handed to workers anymore.
+        :yields: A `(recording, success)` tuple for each job, in the order of
+            ``jobs``, where ``recording`` is a
+            :class:`plix.displays.RecordingDisplay`, or ``None`` if the job
+            was not handed because of a cancellation.
+        """
+        pending = deque(enumerate(jobs))
+        # The workers that wait for the jobs of lost workers.
+        idle = deque()
+        assignments = {}
+        attempts = {}
+        last_seen = {}
+        results = {}
+
+        def hand(worker):
+            if cancellation is not None and cancellation.cancelled:
+                while pending:
+                    job_position, _ = pending.popleft()
+                    results[job_position] = (None, False)
+
+            if pending:
+                job_position, job = pending.popleft()
+                assignments[worker] = (job_position, RecordingDisplay())
+                self.socket.send_multipart([worker, b'job', job])
+            elif assignments:
+                idle.append(worker)
+            else:
+                last_seen.pop(worker, None)
+                self.socket.send_multipart([worker, b'stop'])
+
+        def complete(job_position, recording, success):
+            results[job_position] = (recording, success)
+
+            if cancellation is not None and not success:
+                cancellation.cancel()
+
+        def check_workers():
+            deadline = default_timer() - self.heartbeat_timeout
+
+            for worker in [
+                worker for worker, seen in last_seen.items()
+                if seen < deadline
+            ]:
+                del last_seen[worker]
+
+                if worker in idle:
+                    idle.remove(worker)
+
+                if worker not in assignments:
+                    continue
+
+                job_position, recording = assignments.pop(worker)
+                recording.close()
+                attempts[job_position] = attempts.get(job_position, 0) + 1
+
+                if attempts[job_position] < MAX_ATTEMPTS:
+                    logger.warning(
+                        "Lost the worker of job #%s. Handing it again.",
+                        job_position + 1,
+                    )
+                    pending.appendleft((job_position, jobs[job_position]))
+                else:
+                    logger.error(
+                        "Lost the worker of job #%s %s times. Giving up.",
+                        job_position + 1,
+                        attempts[job_position],
+                    )
+                    complete(job_position, RecordingDisplay(), False)
+
+            while idle and (pending or not assignments):
+                hand(idle.popleft())
+
+        try:
+            for position in range(len(jobs)):
+                while position not in results:
+                    if self.socket.poll(self.heartbeat_timeout * 250):
+                        frames = self.socket.recv_multipart()
+                        worker, kind = frames[0], frames[1]
+                        arguments = frames[2:]
+                    else:
+                        kind = None
+
+                    if kind == b'heartbeat':
+                        worker = arguments[0]
+
+                        if worker in last_seen:
+                            last_seen[worker] = default_timer()
+                    elif kind is not None:
+                        last_seen[worker] = default_timer()
+                        assignment = assignments.get(worker)
+
+                        if kind == b'call':
+                            if assignment is not None:
+                                name, kwargs = loads(arguments[0])
+
+                                if kwargs.get('statistics') is not None:
+                                    kwargs['statistics'] = Statistics(
+                                        **kwargs['statistics']
+                                    )
+
+                                getattr(assignment[1], name)(**kwargs)
+                        elif kind == b'output':
+                            if assignment is not None:
+                                assignment[1].command_output(
+                                    int(arguments[0]),
+                                    arguments[1],
+                                )
+                        else:
+                            # A worker that was considered lost may still
+                            # complete its job: it was handed again already.
+                            if kind == b'done' and assignment is not None:
+                                job_position, recording = assignments.pop(
+                                    worker,
+                                )
+                                recording.statistics = Statistics(
+                                    **loads(arguments[1])
+                                )
+                                complete(
+                                    job_position,
+                                    recording,
+                                    loads(arguments[0]),
+                                )
+
+                            hand(worker)
+
+                    check_workers()
+
+                yield results.pop(position)
+        finally:
+            for worker in idle:
+                self.socket.send_multipart([worker, b'stop'])
+
+
+class DistributedRunner(Runner):
+    """
+    Runs the variants of a matrix on the workers of a :class:`Broker`.
+
+    As workers don't share their environment, each job runs the setup phases
+    of its variants before the other phases.
+    """
+    setup_phases = ()
+    variant_phases = SETUP_PHASES + VARIANT_PHASES
+
+    def __init__(
+        self,
+        configuration,
+        display,
+        broker,
+        deduplicate=False,
+        cache=None,
+        history=None,
+        fail_fast=False,
+    ):
+        """
+        Initialize the :class:`DistributedRunner`.
+
+        :param configuration: The normalized configuration.
+        :param display: The display to report the variants results to.
+        :param broker: The :class:`Broker` instance to use.
+        :param deduplicate: Whether equivalent variants get executed only
+            once. See :func:`plix.planning.plan`.
+        :param cache: If not ``None``, a :class:`plix.cache.ResultCache`
+            instance. See :class:`plix.runner.Runner`.
+        :param history: If not ``None``, a :class:`plix.history.History`
+            instance. See :class:`plix.runner.Runner`.
+        :param fail_fast: Whether the first failure stops the run. The jobs
+            that are running on workers complete, but no other job gets
+            handed.
+        """
+        super(DistributedRunner, self).__init__(
+            configuration=configuration,
+            display=display,
+            deduplicate=deduplicate,
+            cache=cache,
+            history=history,
+            fail_fast=fail_fast,
+        )
+        self.broker = broker
+
+    def serialize(self, job):
+        """
+        Serialize a job for a worker.
+
+        :param job: The :class:`plix.planning.Job` to serialize.
+        :returns: A YAML document, as bytes, that holds the executor and
+            global environment of the configuration, the pairs and the
+            phases of the job.
+        """
+        return yaml_dump({
+            'configuration': {
+                'executor': self.configuration['executor'],
+                'global': self.configuration['global'],
+            },
+            'pairs': sorted(list(pair) for pair in job.pairs),
+            'phases': [
+                [phase, list(commands)] for phase, commands in job.phases
+            ],
+        }).encode('utf-8')
+
+    def run_jobs(self, jobs, setups=None):
+        return self.run_parallel(jobs, concurrency=None, setups=setups)
+
+    @contextmanager
+    def execute_recorded(self, jobs, concurrency, parents=None):
+        # The setup phases run within the jobs, so no job depends on another.
+        outcomes = self.broker.execute_recorded(
+            [self.serialize(job) for job in jobs],
+            cancellation=self.cancellation,
+        )
+
+        try:
+            yield outcomes
+        finally:
+            outcomes.close()
+
+
+class RemoteDisplay(BaseDisplay):
+    """
+    Forwards display calls to a broker.
+    """
+    accepts_memoryview = True
+
+    def __init__(self, socket):
+        """
+        Initialize the :class:`RemoteDisplay`.
+
+        :param socket: The socket connected to the broker.
+        """
+        super(RemoteDisplay, self).__init__()
+        self.socket = socket
+
+    def forward(self, name, **kwargs):
+        """
+        Forward a display call to the broker.
+
+        :param name: The name of the display method.
+        :param kwargs: The keyword arguments of the call. They must be JSON
+            serializable.
+        """
+        self.socket.send_multipart([b'call', dumps([name, kwargs])])
+
+    def set_context(self, commands):
+        self.forward('set_context', commands=commands)
+
+    def start_phase(self, phase):
+        self.forward('start_phase', phase=phase)
+
+    def stop_phase(self, phase, success, statistics=None):
+        self.forward(
+            'stop_phase',
+            phase=phase,
+            success=success,
+            statistics=(
+                statistics.to_dict()
+                if statistics is not None
+                else None
+            ),
+        )
+
+    def start_command(self, index, command):
+        self.forward('start_command', index=index, command=command)
+
+    def stop_command(self, index, command, returncode, statistics=None):
+        self.forward(
+            'stop_command',
+            index=index,
+            command=command,
+            returncode=returncode,
+            statistics=(
+                statistics.to_dict()
+                if statistics is not None
+                else None
+            ),
+        )
+
+    def command_output(self, index, data):
+        self.socket.send_multipart([
+            b'output',
+            str(index).encode('utf-8'),
+            data,
+        ])
+
+
+class Worker(object):
+    """
+    Executes the jobs of a :class:`Broker`.
+    """
+
+    def __init__(
+        self,
+        endpoint=DEFAULT_CONNECT_ENDPOINT,
+        context=None,
+        environment=None,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+    ):
+        """
+        Initialize the :class:`Worker`.
+
+        :param endpoint: The endpoint of the broker.
+        :param context: The ZeroMQ context to use. If ``None``, the global
+            instance is used.
+        :param environment: The base environment of every job. If ``None``,
+            the environment of the current process is used.
+        :param heartbeat_interval: The interval, in seconds, between the
+            heartbeats that tell the broker that the worker is alive.
+        """
+        self.context = context or zmq.Context.instance()
+        self.endpoint = endpoint
+        self.identity = uuid.uuid4().hex.encode('ascii')
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.IDENTITY, self.identity)
+        self.socket.connect(endpoint)
+        self.environment = os.environ if environment is None else environment
+        self.heartbeat_interval = heartbeat_interval
+        self.configurations = {}
+
+    def close(self):
+        """
+        Close the executors of the received configurations, and the worker
+        socket.
+        """
+        for configuration in self.configurations.values():
+            configuration['executor'].close()
+
+        self.socket.close(linger=0)
+
+    def send_heartbeats(self, stopped):
+        """
+        Send heartbeats to the broker until ``stopped`` is set.
+
+        Heartbeats go through their own socket, as sockets can't be shared
+        between threads, so that they keep flowing while a job executes.
+
+        :param stopped: A :class:`threading.Event` instance.
+        """
+        socket = self.context.socket(zmq.DEALER)
+        socket.connect(self.endpoint)
+
+        try:
+            while not stopped.wait(self.heartbeat_interval):
+                socket.send_multipart([b'heartbeat', self.identity])
+        finally:
+            socket.close(linger=0)
+
+    def load_configuration(self, configuration):
+        """
+        Normalize a configuration sent by the broker.
+
+        As all the jobs of a broker share the same configuration, normalized
+        configurations are cached.
+
+        :param configuration: The configuration, as a dictionary.
+        :returns: The normalized configuration.
+        """
+        key = yaml_dump(configuration)
+
+        if key not in self.configurations:
+            self.configurations[key] = normalize(configuration)
+
+        return self.configurations[key]
+
+    def execute(self, job, statistics=None):
+        """
+        Execute a job.
+
+        :param job: The job, as a YAML document.
+        :param statistics: If not ``None``, a
+            :class:`plix.statistics.Statistics` instance to add the resources
+            used by the job to.
+        :returns: True if the execution went fine, False otherwise.
+        """
+        job = yaml.safe_load(job.decode('utf-8'))
+        configuration = self.load_configuration(job['configuration'])
+
+        return execute_phases(
+            executor=configuration['executor'],
+            environment=build_environment(
+                base_environment=self.environment,
+                global_environment=configuration['global'],
+                variant=[tuple(pair) for pair in job['pairs']],
+            ),
+            phases=[tuple(phase) for phase in job['phases']],
+            display=RemoteDisplay(socket=self.socket),
+            statistics=statistics,
+        )
+
+    def run(self):
+        """
+        Execute jobs until the broker has no more jobs to hand.
+
+        :returns: The number of executed jobs.
+        """
+        count = 0
+        stopped = threading.Event()
+        heartbeats = threading.Thread(
+            target=self.send_heartbeats,
+            args=(stopped,),
+        )
+        heartbeats.daemon = True
+        heartbeats.start()
+
+        try:
+            self.socket.send_multipart([b'ready'])
+
+            while True:
+                frames = self.socket.recv_multipart()
+
+                if frames[0] == b'stop':
+                    return count
+
+                logger.debug("Received job #%s.", count + 1)
+                statistics = Statistics()
+
+                try:
+                    success = self.execute(frames[1], statistics=statistics)
+                except Exception as ex:
+                    logger.error(
+                        "Unable to execute job #%s: %s",
+                        count + 1,
+                        ex,
+                    )
+                    success = False
+
+                count += 1
+                self.socket.send_multipart([
+                    b'done',
+                    dumps(success),
+                    dumps(statistics.to_dict()),
+                ])
+        finally:
+            stopped.set()
+            heartbeats.join()
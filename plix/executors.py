@@ -4,14 +4,67 @@ Executor class.
 
 from __future__ import unicode_literals
 
+import errno
+import json
+import os
+import signal
+import sys
+import threading
+import uuid
 import yaml
 import subprocess
 
-from voluptuous import Schema
-from contextlib import closing
+from voluptuous import (
+    Schema,
+    Optional,
+    All,
+    Any,
+    Range,
+)
+from collections import namedtuple
+from contextlib import (
+    closing,
+    contextmanager,
+)
 from functools import partial
 from six import PY2
+from six.moves import shlex_quote
 from locale import getpreferredencoding
+from timeit import default_timer
+
+from .cancellation import DEFAULT_GRACE_PERIOD
+from .statistics import Statistics
+
+# The initial size of the chunks read from the output of commands.
+READ_SIZE = 4096
+
+# The size the chunks can grow to, under sustained output.
+MAX_READ_SIZE = 1024 * 1024
+
+# Whether processes can be started with `posix_spawn`.
+HAS_POSIX_SPAWN = hasattr(os, 'posix_spawn')
+
+# The signals that Python ignores, and that commands get the default handlers
+# of back, as :class:`subprocess.Popen` does with `restore_signals`.
+RESTORED_SIGNALS = tuple(
+    getattr(signal, name)
+    for name in ('SIGPIPE', 'SIGXFSZ')
+    if hasattr(signal, name)
+)
+
+# The shell that commands are executed with.
+DEFAULT_SHELL = '/bin/sh'
+
+# The unit of `ru_maxrss`, in bytes.
+MAX_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+#: The exit status of a command, along with the CPU time and the memory it
+#: used. Executors can return instances of it instead of plain return codes.
+#: The memory usage is an upper bound: see :func:`wait_process`.
+ExitStatus = namedtuple(
+    'ExitStatus',
+    ['returncode', 'user_time', 'system_time', 'max_rss'],
+)
 
 
 class BaseExecutor(object):
@@ -20,6 +73,11 @@ class BaseExecutor(object):
     """
     options_schema = Schema({})
 
+    #: Whether :func:`execute_one` takes a `cancellation` argument, and stops
+    #: the running command when it gets cancelled. Other executors only stop
+    #: between commands.
+    cancellable = False
+
     def __init__(self, options=None):
         self.options = self.options_schema(options or {})
 
@@ -36,28 +94,75 @@ class BaseExecutor(object):
             name=self.__class__.__name__,
         )
 
-    def execute(self, environment, commands, display):
+    def execute(
+        self,
+        environment,
+        commands,
+        display,
+        statistics=None,
+        cancellation=None,
+    ):
         """
         Execute the specified commands.
 
         :param environment: The environment variables dictionary.
         :param commands: A list of commands to execute.
         :param display: The display to use for command output and report.
+        :param statistics: If not ``None``, a
+            :class:`plix.statistics.Statistics` instance to add the resources
+            used by the commands to.
+        :param cancellation: If not ``None``, a
+            :class:`plix.cancellation.CancellationToken` instance. No command
+            starts once it is cancelled.
         :returns: True if the execution went fine, False otherwise.
         """
         display.set_context(commands=commands)
+        kwargs = {}
+
+        if cancellation is not None and self.cancellable:
+            kwargs['cancellation'] = cancellation
 
         for index, command in enumerate(commands):
+            if cancellation is not None and cancellation.cancelled:
+                return False
+
+            output = partial(display.command_output, index)
+
+            if not display.accepts_memoryview:
+                output = partial(to_bytes_output, output)
+
             with display.command(
                     index,
                     command,
             ) as result:
-                result.returncode = self.execute_one(
+                result.statistics = Statistics()
+                start = default_timer()
+                status = self.execute_one(
                     environment=environment,
                     command=command,
-                    output=partial(display.command_output, index),
+                    output=partial(
+                        counted_output,
+                        result.statistics,
+                        output,
+                    ),
+                    **kwargs
+                )
+                result.statistics.wall_time = default_timer() - start
+                result.statistics.command_times[command] = (
+                    result.statistics.wall_time
                 )
 
+                if isinstance(status, ExitStatus):
+                    result.returncode = status.returncode
+                    result.statistics.user_time = status.user_time
+                    result.statistics.system_time = status.system_time
+                    result.statistics.max_rss = status.max_rss
+                else:
+                    result.returncode = status
+
+                if statistics is not None:
+                    statistics.add(result.statistics)
+
                 if result.returncode is None:
                     raise RuntimeError(
                         "No returncode specified for command execution "
@@ -70,6 +175,346 @@ class BaseExecutor(object):
 
         return True
 
+    def execute_one(self, environment, command, output):
+        """
+        Execute a command.
+
+        :param environment: The environment variables dictionary.
+        :param command: The command to execute.
+        :param output: A callable that gets called with the output chunks of
+            the command, as they arrive.
+        :returns: The exit status of the command, either as an integer or as
+            an :class:`ExitStatus` instance.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def session(self, environment):
+        """
+        Wrap the execution of all the phases of a job.
+
+        Executors can override it to share state between the commands of a
+        job. As jobs may run concurrently in different threads, that state
+        must be thread-local. The default implementation does nothing.
+
+        :param environment: The environment variables dictionary of the job.
+        """
+        yield
+
+    def close(self):
+        """
+        Release the resources that the executor keeps between jobs, like
+        idle processes.
+
+        The executor remains usable, and acquires them again when needed. The
+        default implementation does nothing.
+        """
+
+
+def counted_output(statistics, output, data):
+    """
+    Call an output function, and count the size of the output.
+
+    :param statistics: The :class:`plix.statistics.Statistics` instance to
+        count the output size in.
+    :param output: The output function.
+    :param data: The output data.
+    """
+    statistics.output_size += len(data)
+    output(data)
+
+
+def to_bytes_output(output, data):
+    """
+    Call an output function with a copy of ``data`` if it is a buffer.
+
+    :param output: The output function.
+    :param data: The output data, as bytes or as a :class:`memoryview`.
+    """
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+
+    output(data)
+
+
+def pump(stream, output, read_size=READ_SIZE, max_read_size=None):
+    """
+    Read a stream until its end, and pass its content to an output function.
+
+    Reads are done with ``readinto`` in a buffer that is reused from one read
+    to the next, and ``output`` is called with :class:`memoryview` instances
+    over that buffer, which are only valid until ``output`` returns. Streams
+    that have no ``readinto`` method are read with ``read`` instead.
+
+    :param stream: The stream to read from. Preferably an unbuffered one, so
+        that reads return as soon as some data is available.
+    :param output: A callable that gets called with the read chunks.
+    :param read_size: The initial size of the reads.
+    :param max_read_size: If not ``None``, whenever a read fills the whole
+        requested size, the next one will request twice as much, up to that
+        size.
+    """
+    readinto = getattr(stream, 'readinto', None)
+    max_read_size = max(read_size, max_read_size or read_size)
+
+    if readinto is None:
+        while True:
+            data = stream.read(read_size)
+
+            if not data:
+                return
+
+            output(data)
+
+    buffer = memoryview(bytearray(read_size))
+
+    while True:
+        count = readinto(buffer[:read_size])
+
+        if not count:
+            break
+
+        output(buffer[:count])
+
+        if count == read_size and read_size < max_read_size:
+            read_size = min(read_size * 2, max_read_size)
+
+            if read_size > len(buffer):
+                buffer = memoryview(bytearray(read_size))
+
+
+def get_exit_code(status):
+    """
+    Get the return code that corresponds to a wait status.
+
+    :param status: A wait status, as returned by :func:`os.wait4`.
+    :returns: The exit code of the process, or the opposite of the signal
+        number that terminated it, like :attr:`subprocess.Popen.returncode`.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+
+def wait_process(process):
+    """
+    Wait for a process to terminate.
+
+    :param process: The :class:`subprocess.Popen` instance to wait for.
+    :returns: An :class:`ExitStatus` instance. The CPU times and memory usage
+        cover the process and all the descendants it waited for, and are
+        ``None`` on platforms that don't have :func:`os.wait4`. On Linux, the
+        peak memory usage includes the one the process inherited from Plix
+        when it was forked: it is an upper bound.
+    """
+    if not hasattr(os, 'wait4'):
+        return ExitStatus(
+            returncode=process.wait(),
+            user_time=None,
+            system_time=None,
+            max_rss=None,
+        )
+
+    while True:
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            break
+        except OSError as ex:
+            if ex.errno != errno.EINTR:
+                raise
+
+    process.returncode = get_exit_code(status)
+
+    return ExitStatus(
+        returncode=process.returncode,
+        user_time=usage.ru_utime,
+        system_time=usage.ru_stime,
+        max_rss=usage.ru_maxrss * MAX_RSS_UNIT,
+    )
+
+
+def get_session_options():
+    """
+    Get the :class:`subprocess.Popen` arguments that start a process in a new
+    session, and thus in its own process group.
+
+    :returns: A dictionary of keyword arguments.
+    """
+    if os.name != 'posix':
+        return {}
+
+    if PY2:
+        return {'preexec_fn': os.setsid}
+
+    return {'start_new_session': True}
+
+
+class SpawnedProcess(object):
+    """
+    A shell command started with :func:`os.posix_spawn`, with its output and
+    error streams merged into a pipe.
+
+    It has the attributes and methods of :class:`subprocess.Popen` that the
+    executors use. Like with :class:`subprocess.Popen`, the signals that
+    Python ignores get their default handlers back in the command.
+    """
+
+    def __init__(self, command, environment, new_session=False):
+        """
+        Start the command.
+
+        :param command: The command to execute.
+        :param environment: The environment variables dictionary, or ``None``
+            to inherit the one of the current process.
+        :param new_session: Whether the command starts in a new session, and
+            thus in its own process group. See :func:`get_session_options`.
+        """
+        read_fd, write_fd = os.pipe()
+
+        try:
+            self.pid = os.posix_spawn(
+                DEFAULT_SHELL,
+                [DEFAULT_SHELL, '-c', command],
+                os.environ if environment is None else environment,
+                file_actions=[
+                    (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                    (os.POSIX_SPAWN_DUP2, write_fd, 2),
+                ],
+                setsigdef=RESTORED_SIGNALS,
+                setsid=new_session,
+            )
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        self.stdout = os.fdopen(read_fd, 'rb', 0)
+        self.returncode = None
+
+    def wait(self):
+        """
+        Wait for the command to terminate.
+
+        :returns: The exit status of the command.
+        """
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self.returncode = get_exit_code(status)
+
+        return self.returncode
+
+    def send_signal(self, signum):
+        """
+        Send a signal to the command, unless it was waited for already.
+
+        :param signum: The signal number.
+        """
+        if self.returncode is None:
+            os.kill(self.pid, signum)
+
+    def terminate(self):
+        """
+        Terminate the command.
+        """
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        """
+        Kill the command.
+        """
+        self.send_signal(signal.SIGKILL)
+
+
+def get_cpu_count():
+    """
+    Get the number of CPUs.
+
+    :returns: The number of CPUs, or 1 if it can't be determined.
+    """
+    from multiprocessing import cpu_count
+
+    try:
+        return cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+class ProcessGroupTerminator(object):
+    """
+    Stops the process group of a process: its members are sent `SIGTERM`, and
+    `SIGKILL` if they are still running after a grace period.
+
+    On platforms without process groups, only the process itself is stopped.
+    """
+
+    def __init__(self, process, grace_period):
+        """
+        Initialize the :class:`ProcessGroupTerminator`.
+
+        :param process: The process, which must lead its process group. See
+            :func:`get_session_options`.
+        :param grace_period: The time, in seconds, between `SIGTERM` and
+            `SIGKILL`.
+        """
+        self.process = process
+        self.grace_period = grace_period
+        self.lock = threading.Lock()
+        self.timer = None
+        self.closed = False
+
+    def signal(self, signum):
+        """
+        Send a signal to the process group.
+
+        :param signum: The signal number.
+        """
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signum)
+            elif signum == signal.SIGTERM:
+                self.process.terminate()
+            else:
+                self.process.kill()
+        except OSError as ex:
+            if ex.errno != errno.ESRCH:
+                raise
+
+    def __call__(self):
+        """
+        Terminate the process group.
+        """
+        with self.lock:
+            if self.closed:
+                return
+
+            self.signal(signal.SIGTERM)
+            self.timer = threading.Timer(self.grace_period, self.kill)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def kill(self):
+        """
+        Kill the process group.
+        """
+        with self.lock:
+            if not self.closed:
+                self.signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def close(self):
+        """
+        Indicate that the process group is gone.
+
+        As its identifier may get reused, the process group doesn't get
+        signalled anymore.
+        """
+        with self.lock:
+            self.closed = True
+
+            if self.timer is not None:
+                self.timer.cancel()
+
 
 def executor_representer(dumper, executor):
     if executor.options:
@@ -90,12 +535,96 @@ def executor_representer(dumper, executor):
 yaml.add_multi_representer(BaseExecutor, executor_representer)
 
 
+@contextmanager
+def stopped_on_cancel(process, cancellation):
+    """
+    Stop the process group of a process if the execution gets cancelled
+    while the context is active.
+
+    An interrupt of the current thread cancels the execution too: processes
+    that lead their own process group don't get the interrupts from the
+    terminal, and would outlive Plix otherwise.
+
+    :param process: The process, which must lead its process group.
+    :param cancellation: A :class:`plix.cancellation.CancellationToken`
+        instance.
+    """
+    terminator = ProcessGroupTerminator(
+        process,
+        grace_period=cancellation.grace_period,
+    )
+
+    try:
+        with cancellation.register(terminator):
+            try:
+                yield
+            except KeyboardInterrupt:
+                cancellation.cancel()
+                raise
+    finally:
+        terminator.close()
+
+
 class ShellExecutor(BaseExecutor):
     """
     An executor that execute commands through the system shell.
+
+    Supported options are:
+
+    - `read_size`: the initial size of the chunks read from the output of
+      the commands. Defaults to 4 KiB.
+    - `max_read_size`: the size the chunks can grow to under sustained
+      output. Defaults to 1 MiB.
+    - `adaptive`: whether the chunks grow under sustained output. Defaults to
+      true.
+    - `launcher`: how the commands are started. `popen` goes through
+      :class:`subprocess.Popen`, while `posix_spawn` calls
+      :func:`os.posix_spawn`, which doesn't copy the memory mappings of a
+      large parent process. Platforms that don't have it fall back to
+      `popen`. Defaults to `popen`.
+
+    When the execution gets cancelled, each command is stopped with its
+    whole process group.
     """
+    cancellable = True
+    options_schema = Schema({
+        Optional('read_size'): All(int, Range(min=1)),
+        Optional('max_read_size'): All(int, Range(min=1)),
+        Optional('adaptive'): bool,
+        Optional('launcher'): Any('popen', 'posix_spawn'),
+    })
+
+    def execute_one(self, environment, command, output, cancellation=None):
+        process = self.start(environment, command, cancellation is not None)
+
+        if cancellation is None:
+            return self.wait(process, output)
+
+        with stopped_on_cancel(process, cancellation):
+            return self.wait(process, output)
+
+    def start(self, environment, command, new_session=False):
+        """
+        Start a command.
+
+        :param environment: The environment variables dictionary.
+        :param command: The command to execute.
+        :param new_session: Whether the command starts in a new session, and
+            thus in its own process group.
+        :returns: A :class:`subprocess.Popen` or a :class:`SpawnedProcess`
+            instance, whose output and error streams are merged in its
+            `stdout` pipe.
+        """
+        if (
+            HAS_POSIX_SPAWN and
+            self.options.get('launcher', 'popen') == 'posix_spawn'
+        ):
+            return SpawnedProcess(
+                command=command,
+                environment=environment,
+                new_session=new_session,
+            )
 
-    def execute_one(self, environment, command, output):
         # Python 2 subprocess doesn't deal well with unicode commands.
         command = (
             command.encode(getpreferredencoding())
@@ -103,22 +632,575 @@ class ShellExecutor(BaseExecutor):
             else command
         )
 
-        process = subprocess.Popen(
+        return subprocess.Popen(
             command,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             shell=True,
             env=environment,
+            bufsize=0,
+            **(get_session_options() if new_session else {})
         )
 
+    def wait(self, process, output):
+        """
+        Pump the output of a process, and wait for it to terminate.
+
+        :param process: The :class:`subprocess.Popen` or
+            :class:`SpawnedProcess` instance.
+        :param output: A callable that gets called with the output chunks of
+            the process.
+        :returns: An :class:`ExitStatus` instance.
+        """
         with closing(process.stdout):
-            while True:
-                data = process.stdout.read(4096)
+            pump(
+                stream=process.stdout,
+                output=output,
+                read_size=self.options.get('read_size', READ_SIZE),
+                max_read_size=(
+                    self.options.get('max_read_size', MAX_READ_SIZE)
+                    if self.options.get('adaptive', True)
+                    else None
+                ),
+            )
 
-                if data:
-                    output(data)
-                else:
+        return wait_process(process)
+
+
+class Session(object):
+    """
+    A long-lived process that commands are written to.
+
+    The end of each command is found thanks to a line that the process
+    prints once it completes, made of a random sentinel and the exit status
+    of the command. Subclasses define how commands are written.
+
+    As the process runs in a session of its own, it doesn't get the
+    interrupts from the terminal: when the wait for a command gets
+    interrupted, or when the session is closed before the command
+    completes, the process group of the process gets stopped.
+    """
+
+    def __init__(self, arguments, environment, read_size=READ_SIZE):
+        """
+        Start the process.
+
+        :param arguments: The command line of the process.
+        :param environment: The environment variables dictionary.
+        :param read_size: The size of the chunks read from the output of the
+            process.
+        """
+        self.read_size = read_size
+        self.sentinel = uuid.uuid4().hex
+        self.marker = '\n{}:'.format(self.sentinel).encode('ascii')
+        self.buffer = bytearray()
+        self.pending = False
+        self.process = subprocess.Popen(
+            arguments,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=environment,
+            bufsize=0,
+            **get_session_options()
+        )
+
+    @property
+    def alive(self):
+        """
+        Whether the process is still running.
+        """
+        return self.process.returncode is None
+
+    def get_request(self, command, environment):
+        """
+        Get the request that makes the process execute a command.
+
+        :param command: The command to execute.
+        :param environment: The environment variables dictionary of the
+            command, or ``None``.
+        :returns: The bytes to write to the standard input of the process.
+        """
+        raise NotImplementedError
+
+    def execute(self, command, output, environment=None):
+        """
+        Execute a command in the process.
+
+        If the process exits, its exit status is returned and the session
+        ends.
+
+        :param command: The command to execute.
+        :param output: A callable that gets called with the output chunks of
+            the command, as they arrive.
+        :param environment: The environment variables dictionary of the
+            command, for the processes that use it.
+        :returns: The exit status of the command.
+        """
+        try:
+            self.process.stdin.write(self.get_request(command, environment))
+        except (IOError, OSError) as ex:
+            if ex.errno != errno.EPIPE:
+                raise
+
+            return self.close()
+
+        self.pending = True
+
+        try:
+            return self.read_result(output)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+
+    def read_result(self, output):
+        """
+        Read the output of the command in progress, until it completes.
+
+        :param output: A callable that gets called with the output chunks of
+            the command, as they arrive.
+        :returns: The exit status of the command.
+        """
+        while True:
+            index = self.buffer.find(self.marker)
+
+            if index >= 0:
+                if index > 0:
+                    output(bytes(self.buffer[:index]))
+                    del self.buffer[:index]
+
+                end = self.buffer.find(b'\n', len(self.marker))
+
+                if end >= 0:
+                    returncode = int(self.buffer[len(self.marker):end])
+                    del self.buffer[:end + 1]
+                    self.pending = False
+
+                    return returncode
+            elif len(self.buffer) >= len(self.marker):
+                # Keep what could be the beginning of the marker.
+                size = len(self.buffer) - len(self.marker) + 1
+                output(bytes(self.buffer[:size]))
+                del self.buffer[:size]
+
+            data = self.process.stdout.read(self.read_size)
+
+            if not data:
+                if self.buffer:
+                    output(bytes(self.buffer))
+                    del self.buffer[:]
+
+                self.pending = False
+
+                return self.close()
+
+            self.buffer.extend(data)
+
+    def stop(self, grace_period=DEFAULT_GRACE_PERIOD):
+        """
+        Stop the process group of the process, without waiting for the
+        command in progress to complete.
+
+        :param grace_period: The time, in seconds, between `SIGTERM` and
+            `SIGKILL`.
+        :returns: The exit status of the process.
+        """
+        terminator = ProcessGroupTerminator(
+            self.process,
+            grace_period=grace_period,
+        )
+        terminator()
+
+        try:
+            wait_process(self.process)
+        finally:
+            terminator.close()
+
+        self.pending = False
+
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except (IOError, OSError):
+                pass
+
+        return self.process.returncode
+
+    def close(self):
+        """
+        Stop the process.
+
+        The process exits once its standard input is closed, unless a command
+        is still in progress, in which case its process group gets stopped.
+
+        :returns: The exit status of the process.
+        """
+        if self.alive and self.pending:
+            return self.stop()
+
+        if self.alive:
+            try:
+                self.process.stdin.close()
+            except (IOError, OSError):
+                pass
+
+            with closing(self.process.stdout):
+                pump(self.process.stdout, lambda data: None)
+
+            wait_process(self.process)
+
+        return self.process.returncode
+
+
+class ShellSession(Session):
+    """
+    A long-lived shell that commands are written to.
+
+    Commands read their standard input from `/dev/null`, so that they can't
+    consume the commands that follow. They are written quoted, as the
+    argument of an `eval`, so that an unterminated quote or heredoc can't
+    swallow the end of the request: the shell reports a syntax error
+    instead, and exits like a shell that executes the command alone.
+    """
+
+    def __init__(self, environment, shell, read_size=READ_SIZE):
+        """
+        Start the shell.
+
+        :param environment: The environment variables dictionary.
+        :param shell: The path of the shell.
+        :param read_size: The size of the chunks read from the output of the
+            shell.
+        """
+        super(ShellSession, self).__init__(
+            arguments=[shell],
+            environment=environment,
+            read_size=read_size,
+        )
+
+    def get_request(self, command, environment):
+        script = (
+            '{{ eval {command}\n}} </dev/null\n'
+            'printf \'\\n%s:%d\\n\' {sentinel} "$?"\n'
+        ).format(command=shlex_quote(command), sentinel=self.sentinel)
+
+        return script.encode(getpreferredencoding())
+
+
+class SessionShellExecutor(BaseExecutor):
+    """
+    An executor that executes the commands of each job in the same shell,
+    so that the shell state, like the current directory or the exported
+    variables, carries over from one command to the next.
+
+    Jobs get their own shell, that is started along with their first command.
+    A command that exits the shell ends it, and the next command gets a new
+    one. Commands executed outside of a session get a shell each.
+
+    Supported options are:
+
+    - `shell`: the path of the shell. Defaults to `/bin/sh`.
+    - `read_size`: the size of the chunks read from the output of the
+      commands. Defaults to 4 KiB.
+
+    When the execution gets cancelled, the shell is stopped with its whole
+    process group.
+    """
+    cancellable = True
+    options_schema = Schema({
+        Optional('shell'): str,
+        Optional('read_size'): All(int, Range(min=1)),
+    })
+
+    def __init__(self, options=None):
+        super(SessionShellExecutor, self).__init__(options=options)
+        self.local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['local']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    @contextmanager
+    def session(self, environment):
+        self.local.active = True
+        self.local.shell = None
+
+        try:
+            yield
+        finally:
+            shell, self.local.shell = self.local.shell, None
+            self.local.active = False
+
+            if shell is not None:
+                shell.close()
+
+    def execute_one(self, environment, command, output, cancellation=None):
+        if not getattr(self.local, 'active', False):
+            with self.session(environment):
+                return self.execute_one(
+                    environment=environment,
+                    command=command,
+                    output=output,
+                    cancellation=cancellation,
+                )
+
+        if self.local.shell is None or not self.local.shell.alive:
+            self.local.shell = ShellSession(
+                environment=environment,
+                shell=self.options.get('shell', '/bin/sh'),
+                read_size=self.options.get('read_size', READ_SIZE),
+            )
+
+        shell = self.local.shell
+
+        if cancellation is None:
+            return shell.execute(command, output)
+
+        with stopped_on_cancel(shell.process, cancellation):
+            return shell.execute(command, output)
+
+
+# The command that starts a worker, in a Python interpreter. The directory
+# that contains the `plix` package is only in the module search path of the
+# worker while it gets imported.
+WORKER_BOOTSTRAP = (
+    'import sys; sys.path.append({path}); '
+    'from plix.worker import main; sys.path.pop(); main(sys.argv[1:])'
+)
+
+
+class PythonSession(Session):
+    """
+    A Python worker process that commands are written to.
+
+    See :mod:`plix.worker`.
+    """
+
+    def __init__(self, python, modules=(), read_size=READ_SIZE):
+        """
+        Start the worker.
+
+        :param python: The path of the Python interpreter.
+        :param modules: The names of the modules the worker imports when it
+            starts.
+        :param read_size: The size of the chunks read from the output of the
+            worker.
+        """
+        path = os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)),
+        )
+        super(PythonSession, self).__init__(
+            arguments=[
+                python,
+                '-u',
+                '-c',
+                WORKER_BOOTSTRAP.format(path=json.dumps(path)),
+            ] + list(modules),
+            environment=None,
+            read_size=read_size,
+        )
+        self.dirty = False
+
+    def reset(self):
+        """
+        Make the worker start over, with a new global namespace and the
+        modules it had when it started, before the next command.
+        """
+        self.dirty = True
+
+    def get_request(self, command, environment):
+        # A pending reset is done before the command executes.
+        request = json.dumps({
+            'command': command,
+            'environment': dict(
+                os.environ if environment is None else environment,
+            ),
+            'sentinel': self.sentinel,
+            'reset': self.dirty,
+        })
+        self.dirty = False
+
+        return '{}\n'.format(request).encode('utf-8')
+
+
+class PythonExecutor(BaseExecutor):
+    """
+    An executor that executes Python commands in worker processes, so that
+    the commands don't pay for the start of an interpreter.
+
+    Each job gets a worker of its own for all its commands. Workers are
+    started ahead of the jobs that use them, and go back to a pool once
+    their job completes. The commands of a job share a global namespace and
+    see the environment of their job in :data:`os.environ`. Before a worker
+    executes the commands of another job, it gets a new namespace, forgets
+    the modules that the previous job imported and restores its module
+    search path. Other changes, like the ones made to the attributes of the
+    preloaded modules, carry over. As workers get started with the
+    environment of Plix, the variables that the interpreter reads when it
+    starts, like `PYTHONPATH`, don't come from the jobs.
+
+    The output and errors of the commands are streamed as they get written.
+    A command that raises an exception prints its traceback and has an exit
+    status of 1, and one that exits the worker, with :func:`os._exit` for
+    instance, ends it.
+
+    Supported options are:
+
+    - `python`: the path of the Python interpreter. Defaults to the one that
+      runs Plix.
+    - `preload`: a list of modules that the workers import when they start.
+    - `workers`: the maximum number of idle workers that are kept in the
+      pool. Defaults to the number of CPUs.
+    - `read_size`: the size of the chunks read from the output of the
+      commands. Defaults to 4 KiB.
+
+    When the execution gets cancelled, the worker is stopped with its whole
+    process group.
+    """
+    cancellable = True
+    options_schema = Schema({
+        Optional('python'): str,
+        Optional('preload'): [str],
+        Optional('workers'): All(int, Range(min=1)),
+        Optional('read_size'): All(int, Range(min=1)),
+    })
+
+    def __init__(self, options=None):
+        super(PythonExecutor, self).__init__(options=options)
+        self.lock = threading.Lock()
+        self.pool = []
+        self.busy = 0
+        self.local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        for attribute in ('lock', 'pool', 'busy', 'local'):
+            del state[attribute]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.pool = []
+        self.busy = 0
+        self.local = threading.local()
+
+    @property
+    def size(self):
+        """
+        The maximum number of idle workers.
+        """
+        return self.options.get('workers') or get_cpu_count()
+
+    def start_worker(self):
+        """
+        Start a worker.
+
+        :returns: A :class:`PythonSession` instance.
+        """
+        return PythonSession(
+            python=self.options.get('python', sys.executable),
+            modules=self.options.get('preload', []),
+            read_size=self.options.get('read_size', READ_SIZE),
+        )
+
+    def acquire(self):
+        """
+        Take a worker from the pool.
+
+        A worker is started if the pool is empty. A spare one is then
+        started too, so that it warms up for the next job, unless there are
+        as many workers as the pool can hold already.
+
+        :returns: A :class:`PythonSession` instance.
+        """
+        with self.lock:
+            while self.pool:
+                worker = self.pool.pop()
+
+                # Workers may have died while they were idle.
+                if worker.process.poll() is None:
                     break
+            else:
+                worker = self.start_worker()
+
+            self.busy += 1
+
+            if not self.pool and self.busy < self.size:
+                self.pool.append(self.start_worker())
+
+        return worker
+
+    def release(self, worker):
+        """
+        Put a worker back in the pool, or stop it if the pool is full.
+
+        :param worker: A :class:`PythonSession` instance.
+        """
+        with self.lock:
+            self.busy -= 1
+
+            if worker.alive and len(self.pool) < self.size:
+                worker.reset()
+                self.pool.append(worker)
+
+                return
+
+        worker.close()
+
+    def close(self):
+        """
+        Stop the idle workers.
+        """
+        with self.lock:
+            pool, self.pool = self.pool, []
+
+        for worker in pool:
+            worker.close()
+
+    @contextmanager
+    def session(self, environment):
+        self.local.active = True
+        self.local.worker = None
+
+        try:
+            yield
+        finally:
+            worker, self.local.worker = self.local.worker, None
+            self.local.active = False
+
+            if worker is not None:
+                self.release(worker)
+
+    def execute_one(self, environment, command, output, cancellation=None):
+        if not getattr(self.local, 'active', False):
+            with self.session(environment):
+                return self.execute_one(
+                    environment=environment,
+                    command=command,
+                    output=output,
+                    cancellation=cancellation,
+                )
+
+        if self.local.worker is not None and not self.local.worker.alive:
+            worker, self.local.worker = self.local.worker, None
+            self.release(worker)
+
+        if self.local.worker is None:
+            self.local.worker = self.acquire()
+
+        worker = self.local.worker
+
+        if cancellation is None:
+            return worker.execute(command, output, environment)
 
-        process.wait()
-        return process.returncode
+        with stopped_on_cancel(worker.process, cancellation):
+            return worker.execute(command, output, environment)
@@ -0,0 +1,256 @@
+"""
+Duration history.
+
+The history remembers how long jobs and commands took to execute, so that the
+longest jobs can be started first the next time they run in parallel.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import os
+import time
+
+from tempfile import NamedTemporaryFile
+
+# The default name of the history file, in the cache directory.
+DEFAULT_HISTORY_FILENAME = 'history.json'
+
+# The weight of the latest duration in the recorded average.
+DEFAULT_SMOOTHING = 0.5
+
+# The default maximum number of job durations, and of command durations, to
+# keep.
+DEFAULT_MAX_ENTRIES = 10000
+
+# The default maximum time, in seconds, since a duration was last recorded.
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def get_job_key(job):
+    """
+    Get the history key of a job.
+
+    :param job: The :class:`plix.planning.Job`.
+    :returns: An hexadecimal string that depends on the pairs and the
+        rendered phases of the job.
+    """
+    document = json.dumps(
+        {
+            'pairs': sorted(list(pair) for pair in job.pairs),
+            'phases': job.phases,
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+    return hashlib.sha1(document.encode('utf-8')).hexdigest()
+
+
+class History(object):
+    """
+    A small database of the durations of jobs and commands, stored as a JSON
+    file.
+
+    Jobs are keyed by their pairs and their rendered commands, and commands
+    by their rendering. Durations are exponential moving averages of the
+    observed ones. The durations that were not recorded for a while are
+    evicted when the history is saved.
+    """
+
+    def __init__(
+        self,
+        path,
+        smoothing=DEFAULT_SMOOTHING,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_age=DEFAULT_MAX_AGE,
+    ):
+        """
+        Initialize the :class:`History`.
+
+        :param path: The path of the history file. It doesn't need to exist.
+        :param smoothing: The weight of the latest duration, between 0 and 1,
+            when updating a recorded one.
+        :param max_entries: The maximum number of job durations, and of
+            command durations, to keep on eviction. If ``None``, the number of
+            durations is not limited.
+        :param max_age: The maximum time, in seconds, since a duration was
+            last recorded. If ``None``, durations don't expire.
+        """
+        self.path = path
+        self.smoothing = smoothing
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.jobs = {}
+        self.commands = {}
+        self.job_times = {}
+        self.command_times = {}
+
+    def load(self, strict=False):
+        """
+        Load the history file.
+
+        :param strict: If ``False``, a missing or invalid file is considered
+            empty. If ``True``, it raises an exception instead.
+        :raises: :class:`ValueError`, in strict mode, if the file can't be
+            loaded.
+        """
+        try:
+            with open(self.path, 'rb') as stream:
+                data = json.loads(stream.read().decode('utf-8'))
+
+            self.jobs = dict(data['jobs'])
+            self.commands = dict(data['commands'])
+            self.job_times = dict(data.get('job_times', {}))
+            self.command_times = dict(data.get('command_times', {}))
+        except (IOError, OSError, ValueError, KeyError, TypeError) as ex:
+            if strict:
+                raise ValueError(
+                    "Unable to load {}: {}".format(self.path, ex),
+                )
+
+            self.jobs = {}
+            self.commands = {}
+            self.job_times = {}
+            self.command_times = {}
+
+    def save(self):
+        """
+        Evict the durations that expired, and save the history file.
+        """
+        self.evict()
+        directory = os.path.dirname(self.path) or '.'
+
+        try:
+            os.makedirs(directory)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+
+        with NamedTemporaryFile(dir=directory, delete=False) as stream:
+            stream.write(json.dumps(
+                {
+                    'jobs': self.jobs,
+                    'commands': self.commands,
+                    'job_times': self.job_times,
+                    'command_times': self.command_times,
+                },
+                sort_keys=True,
+            ).encode('utf-8'))
+
+        try:
+            os.rename(stream.name, self.path)
+        except OSError:
+            os.remove(self.path)
+            os.rename(stream.name, self.path)
+
+    def update(self, durations, key, duration):
+        """
+        Update a recorded duration.
+
+        :param durations: The dictionary of recorded durations.
+        :param key: The key of the duration.
+        :param duration: The observed duration, in seconds.
+        """
+        if key in durations:
+            durations[key] = (
+                self.smoothing * duration +
+                (1 - self.smoothing) * durations[key]
+            )
+        else:
+            durations[key] = duration
+
+    def record(self, job, statistics):
+        """
+        Record the durations of a job and of its commands.
+
+        :param job: The :class:`plix.planning.Job`.
+        :param statistics: The :class:`plix.statistics.Statistics` of the job.
+        """
+        now = time.time()
+        key = get_job_key(job)
+        self.update(self.jobs, key, statistics.wall_time)
+        self.job_times[key] = now
+
+        for command, duration in statistics.command_times.items():
+            self.update(self.commands, command, duration)
+            self.command_times[command] = now
+
+    def evict(self, now=None):
+        """
+        Remove the durations that expired, and the least recently recorded
+        ones past the maximum number of durations.
+
+        :param now: The current time. Defaults to :func:`time.time`.
+        :returns: The number of removed durations.
+        """
+        now = time.time() if now is None else now
+        count = 0
+
+        for durations, times in [
+            (self.jobs, self.job_times),
+            (self.commands, self.command_times),
+        ]:
+            # The durations of older history files have no time: they count
+            # as recorded now.
+            for key in durations:
+                times.setdefault(key, now)
+
+            for key in [key for key in times if key not in durations]:
+                del times[key]
+
+            for position, key in enumerate(
+                sorted(durations, key=times.get, reverse=True),
+            ):
+                if (
+                    (self.max_entries is not None and
+                     position >= self.max_entries) or
+                    (self.max_age is not None and
+                     now - times[key] > self.max_age)
+                ):
+                    del durations[key]
+                    del times[key]
+                    count += 1
+
+        return count
+
+    def estimate(self, job):
+        """
+        Estimate the duration of a job.
+
+        The recorded duration of the job is used when there is one. Otherwise
+        the recorded durations of its commands are summed, and the commands
+        that have no recorded duration are assumed to take the average time
+        of the recorded ones.
+
+        :param job: The :class:`plix.planning.Job`.
+        :returns: The estimated duration, in seconds.
+        """
+        key = get_job_key(job)
+
+        if key in self.jobs:
+            return self.jobs[key]
+
+        default = (
+            sum(self.commands.values()) / len(self.commands)
+            if self.commands
+            else 0.0
+        )
+
+        return sum(
+            self.commands.get(command, default)
+            for _, commands in job.phases
+            for command in commands
+        )
+
+    def schedule(self, jobs):
+        """
+        Order jobs so that the longest ones start first.
+
+        :param jobs: A list of jobs.
+        :returns: A list of the same jobs, by decreasing estimated duration.
+            Jobs with the same estimation keep their relative order.
+        """
+        return sorted(jobs, key=self.estimate, reverse=True)
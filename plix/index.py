@@ -0,0 +1,180 @@
+"""
+Variant index.
+
+The index answers filters from the dimensions of a matrix, without
+enumerating its variants. A query combines, for each dimension, the bitset of
+the values that match the filters, where bit `n` stands for the `n`-th value.
+Only the variants of the selected values then get generated, so that finding
+them takes time roughly proportional to their number.
+"""
+
+from __future__ import unicode_literals
+
+import fnmatch
+
+from collections import namedtuple
+
+from .matrix import generate_variants
+
+#: A query filter, that selects the variants whose value for `key` matches
+#: one of the glob `patterns`, or none of them if `negated` is true.
+Filter = namedtuple('Filter', ['key', 'patterns', 'negated'])
+
+
+def parse_filter(value):
+    """
+    Parse a filter.
+
+    Filters have the `key:pattern` format, where `pattern` is a glob pattern.
+    Several comma-separated patterns select the variants that match any of
+    them, and a leading `!` selects those that match none of them.
+
+    :param value: The string to parse.
+    :returns: A :class:`Filter` instance.
+    :raises ValueError: If ``value`` doesn't respect the format.
+
+    >>> filter = parse_filter('python:!2.*,3.3')
+    >>> filter.negated
+    True
+    >>> print(', '.join(filter.patterns))
+    2.*, 3.3
+    """
+    if ':' not in value:
+        raise ValueError(
+            "{} does not respect the `key:value` format".format(value),
+        )
+
+    key, patterns = value.split(':', 1)
+    negated = patterns.startswith('!')
+
+    if negated:
+        patterns = patterns[1:]
+
+    return Filter(
+        key=key,
+        patterns=tuple(patterns.split(',')),
+        negated=negated,
+    )
+
+
+class VariantIndex(object):
+    """
+    An index of the variants of a matrix, that finds those that match
+    filters.
+    """
+
+    def __init__(self, matrix, exclusions=()):
+        """
+        Index the variants of a matrix.
+
+        :param matrix: The matrix.
+        :param exclusions: A list of exclusions. See
+            :func:`plix.matrix.generate_variants`.
+        """
+        self.values = {key: list(values) for key, values in matrix.items()}
+        self.texts = {
+            key: ['{}'.format(value) for value in values]
+            for key, values in self.values.items()
+        }
+        self.exclusions = exclusions
+
+    def select(self, filter):
+        """
+        Get the values of a dimension that match a filter.
+
+        :param filter: A :class:`Filter` instance, whose key is a dimension.
+        :returns: The bitset of the matching values.
+        """
+        bitset = 0
+
+        for position, text in enumerate(self.texts[filter.key]):
+            if any(
+                fnmatch.fnmatchcase(text, pattern)
+                for pattern in filter.patterns
+            ):
+                bitset |= 1 << position
+
+        if filter.negated:
+            return ((1 << len(self.texts[filter.key])) - 1) & ~bitset
+
+        return bitset
+
+    def query(self, filters=()):
+        """
+        Get the values of each dimension that match all the filters.
+
+        :param filters: A list of :class:`Filter` instances.
+        :returns: A dictionary that maps each dimension to the bitset of its
+            matching values, or ``None`` if no variant matches.
+        """
+        selection = {
+            key: (1 << len(values)) - 1
+            for key, values in self.values.items()
+        }
+
+        for filter in filters:
+            if filter.key not in selection:
+                # No variant has a value for an unknown dimension.
+                if filter.negated:
+                    continue
+
+                return None
+
+            selection[filter.key] &= self.select(filter)
+
+            if not selection[filter.key]:
+                return None
+
+        return selection
+
+    def count(self, filters=()):
+        """
+        Count the variants that match all the filters.
+
+        Without exclusions, the variants are not enumerated.
+
+        :param filters: A list of :class:`Filter` instances.
+        :returns: The number of matching variants.
+        """
+        if self.exclusions:
+            return sum(1 for _ in self.find(filters))
+
+        selection = self.query(filters)
+
+        if selection is None:
+            return 0
+
+        result = 1
+
+        for bitset in selection.values():
+            result *= bin(bitset).count('1')
+
+        return result
+
+    def find(self, filters=()):
+        """
+        Find the variants that match all the filters.
+
+        :param filters: A list of :class:`Filter` instances.
+        :yields: The matching variants, in the order in which
+            :func:`plix.matrix.generate_variants` generates them.
+        """
+        selection = self.query(filters)
+
+        if selection is None:
+            return
+
+        matrix = {
+            key: [
+                value
+                for position, value in enumerate(values)
+                if selection[key] >> position & 1
+            ]
+            for key, values in self.values.items()
+        }
+
+        for variant in generate_variants(
+            matrix=matrix,
+            exclusions=self.exclusions,
+        ):
+            yield variant
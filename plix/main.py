@@ -1,5 +1,9 @@
 """
 Command-line entry point.
+
+Only the modules that parsing the arguments requires are imported up-front:
+the others are imported by the commands that need them, so that the command
+line stays responsive.
 """
 
 from __future__ import print_function
@@ -7,15 +11,18 @@ from __future__ import unicode_literals
 
 import argparse
 import logging
-import sys
 import os
+import sys
 
-from chromalog import basicConfig
+from functools import partial
 
-from .configuration import load_from_file
+from .cache import DEFAULT_CACHE_DIRECTORY
+from .exceptions import UnknownKeys
+from .history import (
+    DEFAULT_HISTORY_FILENAME,
+    History,
+)
 from .log import logger
-from .displays import StreamDisplay
-from .compat import yaml_dump
 
 
 class PairsParser(argparse.Action):
@@ -37,31 +44,240 @@ class PairsParser(argparse.Action):
         setattr(namespace, self.dest, frozenset(pairs))
 
 
+class FiltersParser(argparse.Action):
+    """
+    Parses `key:pattern` filters. See :func:`plix.index.parse_filter`.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .index import parse_filter
+
+        setattr(
+            namespace,
+            self.dest,
+            [parse_filter(value) for value in values],
+        )
+
+
+def positive_integer(value):
+    """
+    Parse a strictly positive integer.
+
+    :param value: The string to parse.
+    :returns: The integer.
+    """
+    result = int(value)
+
+    if result < 1:
+        raise argparse.ArgumentTypeError(
+            "{} is not a strictly positive integer".format(value),
+        )
+
+    return result
+
+
+def coverage_strength(value):
+    """
+    Parse a coverage strength: `pairwise`, or `t=N` where `N` is a strictly
+    positive integer.
+
+    :param value: The string to parse.
+    :returns: The strength, as an integer.
+    """
+    if value == 'pairwise':
+        return 2
+
+    if value.startswith('t='):
+        try:
+            return positive_integer(value[2:])
+        except ValueError:
+            pass
+
+    raise argparse.ArgumentTypeError(
+        "{} is neither `pairwise` nor `t=N`".format(value),
+    )
+
+
+def shard(value):
+    """
+    Parse a shard: `INDEX/COUNT`, where `INDEX` goes from 1 to `COUNT`.
+
+    :param value: The string to parse.
+    :returns: A `(index, count)` tuple, where `index` starts at 0.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        index, count = 0, 0
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "{} is not a valid INDEX/COUNT shard".format(value),
+        )
+
+    return index - 1, count
+
+
+# The commands, the first of which is the default one.
+COMMANDS = ('run', 'broker', 'worker', 'list')
+
+# The commands that work on a matrix, and thus need the configuration.
+MATRIX_COMMANDS = ('run', 'broker', 'list')
+
+# The directory of the normalized configurations, in the cache directory.
+CONFIGURATION_CACHE_DIRECTORY = 'configurations'
+
+
+def find_command(args, parsers):
+    """
+    Find the command in a list of arguments.
+
+    The command is the first argument that is neither an option nor the
+    value of one.
+
+    :param args: The arguments.
+    :param parsers: The parsers of the commands, that tell which options
+        take a value.
+    :returns: The position of the command in ``args``, or ``None`` if the
+        first positional argument isn't a command.
+    """
+    value_options = {
+        option
+        for parser in parsers
+        for action in parser._actions
+        if action.nargs != 0
+        for option in action.option_strings
+    }
+    position = 0
+
+    while position < len(args) and args[position].startswith('-'):
+        position += 2 if args[position] in value_options else 1
+
+    if position < len(args) and args[position] in COMMANDS:
+        return position
+
+
 def parse_args(args):
     """
     Parse the arguments.
 
+    The first positional argument can be the name of a command, and the
+    options can come before it. If it isn't a command, the `run` command is
+    assumed.
+
     :param args: The arguments to parse.
     :returns: A namespace instance.
     """
-    parser = argparse.ArgumentParser(
-        description="Plix - a build matrix runner that cares about humans.",
-    )
-    parser.add_argument(
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument(
         '--debug',
         '-d',
         action='store_true',
         default=False,
         help="Enable debug output.",
     )
-    parser.add_argument(
+
+    configuration_parser = argparse.ArgumentParser(add_help=False)
+    configuration_parser.add_argument(
         '--configuration',
         '-c',
         default='.plix.yml',
-        type=load_from_file,
         help="The configuration file to use.",
     )
-    parser.add_argument(
+    configuration_parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIRECTORY,
+        help=(
+            "The directory of the result cache, of the duration history and "
+            "of the parsed configurations."
+        ),
+    )
+
+    matrix_parser = argparse.ArgumentParser(
+        add_help=False,
+        parents=[configuration_parser],
+    )
+    matrix_parser.add_argument(
+        '--deduplicate',
+        action='store_true',
+        default=False,
+        help=(
+            "Execute only once the variants that render the same commands. "
+            "The dimensions that the commands don't reference are assumed "
+            "not to alter their outcome. Setup phases are always shared "
+            "that way."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--cache',
+        action='store_true',
+        default=False,
+        help=(
+            "Don't execute again the variants that succeeded with the same "
+            "commands, environment and input files."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        default=False,
+        help=(
+            "Stop on the first failure: the running variants are terminated "
+            "and the others are skipped."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--no-history',
+        action='store_true',
+        default=False,
+        help=(
+            "Don't record the durations of the variants, nor use them to "
+            "start the longest variants first."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--coverage',
+        type=coverage_strength,
+        default=None,
+        help=(
+            "Only run a sample of the variants that covers all the "
+            "combinations of values of any two dimensions, with `pairwise`, "
+            "or of any N dimensions, with `t=N`."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--shard',
+        type=shard,
+        default=None,
+        metavar='INDEX/COUNT',
+        help=(
+            "Only run one of COUNT parts of the variants, from 1 to COUNT. "
+            "The variants are dealt to the parts in turn, unless "
+            "--shard-history is given."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--shard-history',
+        default=None,
+        metavar='PATH',
+        help=(
+            "Balance the parts of --shard with the duration history in PATH. "
+            "Every part must be given the same file, so that they all split "
+            "the variants the same way."
+        ),
+    )
+    matrix_parser.add_argument(
+        '--output-tail',
+        type=positive_integer,
+        default=None,
+        metavar='SIZE',
+        help=(
+            "Only keep the last SIZE bytes of the output of each command, "
+            "which are shown if it fails. By default, the whole output is "
+            "kept, on disk past 1 MiB."
+        ),
+    )
+    matrix_parser.add_argument(
         'pairs',
         nargs='*',
         default=[],
@@ -69,27 +285,459 @@ def parse_args(args):
         help="A list of matrix context pairs that will limit the build.",
     )
 
+    parser = argparse.ArgumentParser(
+        description="Plix - a build matrix runner that cares about humans.",
+    )
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser(
+        'run',
+        parents=[common_parser, matrix_parser],
+        help="Run the matrix locally. This is the default command.",
+    )
+    run_parser.add_argument(
+        '--jobs',
+        '-j',
+        default=1,
+        type=positive_integer,
+        help="The maximum number of variants to run in parallel.",
+    )
+
+    broker_parser = subparsers.add_parser(
+        'broker',
+        parents=[common_parser, matrix_parser],
+        help="Run the matrix on remote workers.",
+    )
+    broker_parser.add_argument(
+        '--endpoint',
+        '-e',
+        default='tcp://127.0.0.1:7474',
+        help=(
+            "The ZeroMQ endpoint to bind to. Only local workers can connect "
+            "by default: as they get the global environment of the "
+            "configuration, bind to another interface, like "
+            "`tcp://*:7474`, only on trusted networks."
+        ),
+    )
+
+    worker_parser = subparsers.add_parser(
+        'worker',
+        parents=[common_parser],
+        help="Execute the jobs of a broker.",
+    )
+    worker_parser.add_argument(
+        '--endpoint',
+        '-e',
+        default='tcp://127.0.0.1:7474',
+        help="The ZeroMQ endpoint of the broker.",
+    )
+
+    list_parser = subparsers.add_parser(
+        'list',
+        parents=[common_parser, configuration_parser],
+        help="List the variants of the matrix.",
+    )
+    list_parser.add_argument(
+        '--count',
+        action='store_true',
+        default=False,
+        help="Only print the number of matching variants.",
+    )
+    list_parser.add_argument(
+        'filters',
+        nargs='*',
+        default=[],
+        action=FiltersParser,
+        help=(
+            "A list of `key:pattern` filters that the listed variants match. "
+            "Patterns are glob patterns. Comma-separated patterns match "
+            "variants that match any of them, and a leading `!` those that "
+            "match none of them."
+        ),
+    )
+
+    args = list(args)
+    position = find_command(args, parsers=subparsers.choices.values())
+
+    if position is not None:
+        args.insert(0, args.pop(position))
+    elif args[:1] not in (['-h'], ['--help']):
+        args.insert(0, COMMANDS[0])
+
     try:
         return parser.parse_args(args)
     except Exception as ex:
+        setup_logging()
         logger.error("%s", ex)
         raise SystemExit(1)
 
 
-def main(args=sys.argv[1:], display=StreamDisplay(stream=sys.stdout)):
+def setup_logging():
+    """
+    Set up colored logging to the standard error.
+    """
+    from chromalog import basicConfig
+
     basicConfig(format='%(message)s', level=logging.INFO)
-    params = parse_args(args=args)
 
-    if params.debug:
-        logger.setLevel(logging.DEBUG)
-        logger.debug("Debug mode enabled.")
+
+def load_configuration(params):
+    """
+    Load the configuration file.
+
+    :param params: The parsed arguments. Their `configuration` attribute, a
+        path, is replaced with the normalized configuration.
+    :raises SystemExit: If the configuration can't be loaded.
+    """
+    from .configuration import (
+        ConfigurationCache,
+        load_from_file,
+    )
+
+    try:
+        params.configuration = load_from_file(
+            params.configuration,
+            cache=ConfigurationCache(
+                directory=os.path.join(
+                    params.cache_dir,
+                    CONFIGURATION_CACHE_DIRECTORY,
+                ),
+            ),
+        )
+    except Exception as ex:
+        logger.error("%s", ex)
+        raise SystemExit(1)
+
+
+def report(results):
+    """
+    Report the results of a matrix run.
+
+    :param results: A list of `(variant, success)` tuples, where ``success``
+        is ``None`` for the variants that were skipped.
+    :raises SystemExit: If any variant failed or was skipped.
+    """
+    from .matrix import format_variant
+
+    if not results:
+        logger.warning("No variant matches the specified pairs.")
+
+    failed_variants = [
+        variant for variant, success in results if success is False
+    ]
+    skipped_variants = [
+        variant for variant, success in results if success is None
+    ]
+
+    for variant in filter(None, failed_variants):
+        logger.error("Variant failed: %s", format_variant(variant))
+
+    if failed_variants:
+        logger.error(
+            "%s out of %s variant(s) failed.",
+            len(failed_variants),
+            len(results),
+        )
+
+    if skipped_variants:
+        logger.warning(
+            "%s out of %s variant(s) skipped.",
+            len(skipped_variants),
+            len(results),
+        )
+
+    if failed_variants or skipped_variants:
+        raise SystemExit(1)
+    elif results:
+        logger.success("%s variant(s) succeeded.", len(results))
+
+
+def run_matrix(params, runner):
+    """
+    Run the variants of the matrix that match the parameters.
+
+    :param params: The parsed arguments.
+    :param runner: The :class:`plix.runner.Runner` instance to use.
+    """
+    from .compat import yaml_dump
+    from .matrix import (
+        generate_variants,
+        shard_variants,
+        validate_keys,
+    )
+
+    configuration = params.configuration
+
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug(
             "Parsed configuration is shown below:\n\n%s\n",
-            yaml_dump(params.configuration, indent=2),
+            yaml_dump(configuration, indent=2),
+        )
+
+    try:
+        validate_keys(
+            matrix=configuration['matrix'],
+            keys=(key for key, _ in params.pairs),
+        )
+    except UnknownKeys as ex:
+        logger.error("Unknown matrix dimension(s): %s", ex)
+        raise SystemExit(1)
+
+    if params.coverage is None:
+        variants = generate_variants(
+            matrix=configuration['matrix'],
+            subset_pairs=params.pairs,
+            exclusions=configuration['exclusion_matrix'],
+        )
+    else:
+        from .coverage import generate_covering_variants
+
+        variants = generate_covering_variants(
+            matrix=configuration['matrix'],
+            strength=params.coverage,
+            subset_pairs=params.pairs,
+            exclusions=configuration['exclusion_matrix'],
+        )
+
+    if params.shard is not None:
+        index, count = params.shard
+        variants = shard_variants(
+            variants,
+            index=index,
+            count=count,
+            estimate=get_shard_estimate(params, runner=runner),
         )
+    elif params.shard_history is not None:
+        logger.error("--shard-history requires --shard.")
+        raise SystemExit(1)
+
+    results = runner.run(variants)
+
+    # The summary goes to the log: the queued output of the variants must be
+    # written before it.
+    runner.display.flush()
+    report(results)
+
+
+def get_shard_estimate(params, runner):
+    """
+    Get the function that estimates the durations of the variants to shard.
+
+    The shards are only balanced with an explicitly given history file: the
+    history of each cache directory differs from one machine to the next,
+    and the shards would then overlap or miss variants.
+
+    :param params: The parsed arguments.
+    :param runner: The :class:`plix.runner.Runner` instance to use.
+    :returns: A callable that takes a variant and returns its expected
+        duration, or ``None`` if the shards are split by count.
+    """
+    if params.shard_history is None:
+        return None
+
+    history = History(path=params.shard_history)
+
+    try:
+        history.load(strict=True)
+    except ValueError as ex:
+        logger.error("%s", ex)
+        raise SystemExit(1)
 
-    params.configuration['executor'].execute(
-        environment=os.environ,
-        commands=params.configuration['script'],
+    return partial(runner.estimate, history=history)
+
+
+def get_cache(params):
+    """
+    Get the result cache to use.
+
+    :param params: The parsed arguments.
+    :returns: A :class:`plix.cache.ResultCache` instance, or ``None`` if the
+        cache is disabled.
+    """
+    from .cache import ResultCache
+
+    if not params.cache:
+        return None
+
+    settings = params.configuration['cache']
+
+    return ResultCache(
+        directory=params.cache_dir,
+        max_entries=settings['max_entries'],
+        max_age=settings['max_age'],
+    )
+
+
+def get_history(params):
+    """
+    Get the duration history to use.
+
+    :param params: The parsed arguments.
+    :returns: A loaded :class:`plix.history.History` instance, or ``None`` if
+        the history is disabled.
+    """
+    if params.no_history:
+        return None
+
+    history = History(
+        path=os.path.join(params.cache_dir, DEFAULT_HISTORY_FILENAME),
+    )
+    history.load()
+
+    return history
+
+
+def run_command(params, display):
+    """
+    Run the matrix locally.
+
+    :param params: The parsed arguments.
+    :param display: The display to use.
+    """
+    from .runner import Runner
+
+    run_matrix(params, runner=Runner(
+        configuration=params.configuration,
         display=display,
+        jobs=params.jobs,
+        deduplicate=params.deduplicate,
+        cache=get_cache(params),
+        history=get_history(params),
+        fail_fast=params.fail_fast,
+    ))
+
+
+def broker_command(params, display):
+    """
+    Run the matrix on remote workers.
+
+    :param params: The parsed arguments.
+    :param display: The display to use.
+    """
+    from .distributed import (
+        Broker,
+        DistributedRunner,
     )
+
+    broker = Broker(endpoint=params.endpoint)
+    logger.info("Waiting for workers on %s.", broker.endpoint)
+
+    try:
+        run_matrix(params, runner=DistributedRunner(
+            configuration=params.configuration,
+            display=display,
+            broker=broker,
+            deduplicate=params.deduplicate,
+            cache=get_cache(params),
+            history=get_history(params),
+            fail_fast=params.fail_fast,
+        ))
+    finally:
+        broker.close()
+
+
+def worker_command(params, display):
+    """
+    Execute the jobs of a broker.
+
+    :param params: The parsed arguments.
+    :param display: The display to use. Unused, as the output of the jobs is
+        sent to the broker.
+    """
+    from .distributed import Worker
+
+    worker = Worker(endpoint=params.endpoint)
+    logger.info("Waiting for jobs from %s.", params.endpoint)
+
+    try:
+        count = worker.run()
+    finally:
+        worker.close()
+
+    logger.success("Executed %s job(s).", count)
+
+
+def list_command(params, display):
+    """
+    List the variants of the matrix that match the filters.
+
+    :param params: The parsed arguments.
+    :param display: The display to use. Unused, as the variants are printed
+        on the standard output.
+    """
+    from .index import VariantIndex
+    from .matrix import (
+        format_variant,
+        validate_keys,
+    )
+
+    configuration = params.configuration
+
+    try:
+        validate_keys(
+            matrix=configuration['matrix'],
+            keys=(filter.key for filter in params.filters),
+        )
+    except UnknownKeys as ex:
+        logger.error("Unknown matrix dimension(s): %s", ex)
+        raise SystemExit(1)
+
+    index = VariantIndex(
+        matrix=configuration['matrix'],
+        exclusions=configuration['exclusion_matrix'],
+    )
+
+    if params.count:
+        print(index.count(params.filters))
+    else:
+        for variant in index.find(params.filters):
+            print(format_variant(variant))
+
+
+def main(args=sys.argv[1:], display=None):
+    """
+    Run Plix.
+
+    :param args: The command-line arguments.
+    :param display: The display to use. Defaults to a
+        :class:`plix.displays.StreamDisplay` on the standard output.
+    """
+    params = parse_args(args=args)
+    setup_logging()
+
+    if params.debug:
+        logger.setLevel(logging.DEBUG)
+        logger.debug("Debug mode enabled.")
+
+    if params.command in MATRIX_COMMANDS:
+        load_configuration(params)
+
+    if display is None:
+        from .displays import StreamDisplay
+        from .writers import (
+            DEFAULT_QUEUE_SIZE,
+            SPILL,
+        )
+
+        # The writes go through a thread, so that a slow terminal doesn't
+        # hold up the commands. The text that doesn't fit in its queue is
+        # spilled to disk rather than lost.
+        display = stream_display = StreamDisplay(
+            stream=sys.stdout,
+            tail_size=getattr(params, 'output_tail', None),
+            queue_size=DEFAULT_QUEUE_SIZE,
+            overflow_policy=SPILL,
+        )
+    else:
+        stream_display = None
+
+    try:
+        {
+            'run': run_command,
+            'broker': broker_command,
+            'worker': worker_command,
+            'list': list_command,
+        }[params.command](params, display=display)
+    finally:
+        if stream_display is not None:
+            stream_display.close()
@@ -4,14 +4,140 @@ Matrix utilities.
 
 from __future__ import unicode_literals
 
-from itertools import product
+from .exceptions import UnknownKeys
+from .templates import get_template
 
-from jinja2 import (
-    Environment,
-    meta,
-)
+try:
+    from collections.abc import Set
+except ImportError:  # Python 2
+    from collections import Set
 
-from .exceptions import UnknownKeys
+
+class Dimensions(object):
+    """
+    The values of the dimensions of a matrix, that its variants share.
+    """
+    __slots__ = ('keys', 'values', 'depths')
+
+    def __init__(self, domains):
+        """
+        Initialize the :class:`Dimensions`.
+
+        :param domains: A list of `(key, values)` tuples, sorted by key. See
+            :func:`get_domains`.
+        """
+        self.keys = tuple(key for key, _ in domains)
+        self.values = tuple(tuple(values) for _, values in domains)
+        self.depths = {key: depth for depth, key in enumerate(self.keys)}
+
+    def __reduce__(self):
+        return Dimensions, (list(zip(self.keys, self.values)),)
+
+
+class Variant(Set):
+    """
+    A variant of a matrix.
+
+    Variants are sets of `(key, value)` pairs, that compare and hash like
+    the frozensets of the same pairs. They only hold the indexes of their
+    values in the :class:`Dimensions` of their matrix, and compute their
+    hash once.
+    """
+    __slots__ = ('dimensions', 'indexes', '_hash')
+
+    def __init__(self, dimensions, indexes):
+        """
+        Initialize the :class:`Variant`.
+
+        :param dimensions: The :class:`Dimensions` of the matrix.
+        :param indexes: A tuple of the indexes of the values of the variant,
+            in the order of the dimensions.
+        """
+        self.dimensions = dimensions
+        self.indexes = indexes
+        self._hash = None
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # The results of set operations are plain frozensets.
+        return frozenset(iterable)
+
+    def __reduce__(self):
+        return Variant, (self.dimensions, self.indexes)
+
+    @property
+    def values(self):
+        """
+        The values of the variant, in the order of the dimensions.
+        """
+        return tuple(
+            values[index]
+            for values, index in zip(self.dimensions.values, self.indexes)
+        )
+
+    def as_dict(self):
+        """
+        Get the values of the variant by dimension.
+
+        :returns: A dictionary.
+        """
+        return dict(zip(self.dimensions.keys, self.values))
+
+    def __iter__(self):
+        return iter(zip(self.dimensions.keys, self.values))
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __contains__(self, pair):
+        try:
+            key, value = pair
+            depth = self.dimensions.depths[key]
+        except (TypeError, ValueError, KeyError):
+            return False
+
+        return self.dimensions.values[depth][self.indexes[depth]] == value
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self))
+
+        return self._hash
+
+    def __eq__(self, other):
+        if (
+            isinstance(other, Variant) and
+            other.dimensions is self.dimensions
+        ):
+            return other.indexes == self.indexes
+
+        return Set.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Variant({!r})'.format(sorted(self))
+
+    # The named methods of frozensets, that `Set` doesn't provide.
+
+    def issubset(self, other):
+        return frozenset(self).issubset(other)
+
+    def issuperset(self, other):
+        return all(pair in self for pair in other)
+
+    def union(self, *others):
+        return frozenset(self).union(*others)
+
+    def intersection(self, *others):
+        return frozenset(self).intersection(*others)
+
+    def difference(self, *others):
+        return frozenset(self).difference(*others)
+
+    def symmetric_difference(self, other):
+        return frozenset(self).symmetric_difference(other)
 
 
 def find_required_keys(*commands):
@@ -24,32 +150,167 @@ def find_required_keys(*commands):
     result = set()
 
     for command in commands:
-        result |= meta.find_undeclared_variables(Environment().parse(command))
+        result |= get_template(command).required_keys
 
     return result
 
 
-def generate_variants(matrix, subset_pairs=set()):
+def get_domains(matrix, subset_pairs=set()):
+    """
+    Get the values that the variants of ``matrix`` that contain
+    ``subset_pairs`` can take, for each dimension.
+
+    :param matrix: The matrix.
+    :param subset_pairs: A set of pairs that limits the variants.
+    :returns: A list of `(key, values)` tuples, sorted by key, or ``None`` if
+        no variant can contain ``subset_pairs``.
+    """
+    required_values = {}
+
+    for key, value in subset_pairs:
+        if key not in matrix:
+            return None
+
+        required_values.setdefault(key, set()).add(value)
+
+    domains = []
+
+    for key in sorted(matrix):
+        values = matrix[key]
+
+        if key in required_values:
+            values = [
+                value for value in values
+                if {value} == required_values[key]
+            ]
+
+        if not values:
+            return None
+
+        domains.append((key, values))
+
+    return domains
+
+
+def generate_variants(matrix, subset_pairs=set(), exclusions=()):
     """
     Generate all variants for the specified ``matrix``, eventually limiting to
-    those that contain ``subset_pairs``.
+    those that contain ``subset_pairs`` and that are not excluded by
+    ``exclusions``.
+
+    The variants are generated lazily, dimension by dimension: a partial
+    variant that can't contain ``subset_pairs`` or that matches an exclusion
+    is discarded before any of its completions get generated.
 
     :param matrix: The matrix to generate the variants from.
     :param subset_pairs: A set of pairs that limits the generated matrices.
-    :yields: Sets of pairs for each of the matrix variants.
+    :param exclusions: A list of exclusions. Each exclusion is a dictionary
+        that maps dimensions to lists of values. A variant is excluded if, for
+        all the dimensions of an exclusion, its value is in the exclusion's
+        values. Exclusions that reference unknown dimensions never match.
+    :yields: A :class:`Variant` instance for each of the matrix variants.
     """
-    keys = frozenset(matrix.keys())
-    subset_pairs = frozenset(subset_pairs)
+    domains = get_domains(matrix, subset_pairs)
+
+    if domains is None:
+        return
+
+    dimensions = Dimensions(domains)
+    keys = [key for key, _ in domains]
+    domains = [values for _, values in domains]
+    depths = {key: depth for depth, key in enumerate(keys)}
+
+    # Each exclusion gets checked as soon as all its dimensions are assigned.
+    checks = [[] for _ in keys]
+
+    for exclusion in exclusions:
+        if exclusion and all(key in depths for key in exclusion):
+            constraints = [
+                (depths[key], values) for key, values in exclusion.items()
+            ]
+            deepest = max(depth for depth, _ in constraints)
+            checks[deepest].append(constraints)
+
+    if not keys:
+        yield Variant(dimensions, ())
+        return
 
-    for values in product(
-            *[value for key, value in sorted(matrix.items()) if key in keys]
-    ):
-        variant = frozenset(zip(sorted(keys), values))
+    last_depth = len(keys) - 1
+    assignment = [None] * len(keys)
+    indexes = [0] * len(keys)
+    depth = 0
 
-        if subset_pairs.issubset(variant):
+    while depth >= 0:
+        if indexes[depth] == len(domains[depth]):
+            indexes[depth] = 0
+            depth -= 1
+
+            if depth >= 0:
+                indexes[depth] += 1
+
+            continue
+
+        assignment[depth] = domains[depth][indexes[depth]]
+
+        if any(
+            all(assignment[index] in values for index, values in constraints)
+            for constraints in checks[depth]
+        ):
+            indexes[depth] += 1
+        elif depth == last_depth:
+            yield Variant(dimensions, tuple(indexes))
+            indexes[depth] += 1
+        else:
+            depth += 1
+
+
+def shard_variants(variants, index, count, estimate=None):
+    """
+    Keep the variants of a shard, out of ``count`` shards.
+
+    Variants are assigned lazily, in their order, to the shard that has the
+    lowest expected duration so far, or the fewest variants on ties, or the
+    lowest index. Splitting the same variants with the same estimations
+    thus gives the same shards, wherever it happens.
+
+    :param variants: An iterable of variants.
+    :param index: The index of the shard to keep, from 0 to ``count - 1``.
+    :param count: The number of shards.
+    :param estimate: A callable that takes a variant and returns its
+        expected duration. If ``None``, all the variants are expected to last
+        as long, and get assigned in turn.
+    :yields: The variants of the shard.
+    """
+    loads = [(0, 0, shard) for shard in range(count)]
+
+    for variant in variants:
+        duration, size, shard = min(loads)
+        loads[shard] = (
+            duration + (estimate(variant) if estimate is not None else 0),
+            size + 1,
+            shard,
+        )
+
+        if shard == index:
             yield variant
 
 
+def format_variant(variant):
+    """
+    Get a human-readable representation of a variant.
+
+    :param variant: The variant to represent.
+    :returns: A unicode string that lists the pairs of ``variant``, sorted by
+        key.
+
+    >>> print(format_variant({('b', 2), ('a', 1)}))
+    a=1, b=2
+    """
+    return ', '.join(
+        '{}={}'.format(key, value) for key, value in sorted(variant)
+    )
+
+
 def validate_keys(matrix, keys):
     """
     Validate that all ``keys`` are dimensions in ``matrix``.
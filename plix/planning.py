@@ -0,0 +1,148 @@
+"""
+Execution planning.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from .matrix import find_required_keys
+from .templates import render_commands
+
+# The references to environment variables in shell commands, like `$key` or
+# `${key}`.
+ENVIRONMENT_REFERENCE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
+
+
+def find_environment_keys(*commands):
+    """
+    Get the environment variables that commands reference.
+
+    The variants are exported to the environment of their commands, so those
+    are the dimensions that the commands can read without rendering them.
+
+    :param commands: The command(s) to parse.
+    :returns: A set of variable names.
+
+    >>> sorted(find_environment_keys('echo $a', 'test -n "${b}"'))
+    ['a', 'b']
+    """
+    return {
+        key
+        for command in commands
+        for key in ENVIRONMENT_REFERENCE.findall(command)
+    }
+
+
+class Job(object):
+    """
+    Lists of rendered commands to execute once, on behalf of one or several
+    variants.
+    """
+
+    def __init__(self, variants, phases):
+        """
+        Initialize the :class:`Job`.
+
+        :param variants: The list of variants the job is executed for. The
+            first one is the reference variant, which gets reported with the
+            output of the commands.
+        :param phases: A list of `(phase, commands)` tuples, where `commands`
+            is the list of rendered commands of `phase`.
+        """
+        self.variants = variants
+        self.phases = phases
+
+    @property
+    def pairs(self):
+        """
+        Get the pairs that get exported to the environment of the job.
+
+        Those are the pairs of the reference variant, so that the job runs in
+        the environment of one of its variants.
+
+        :returns: A set of pairs.
+        """
+        return frozenset(self.variants[0])
+
+    @property
+    def shared_pairs(self):
+        """
+        Get the pairs that all the variants of the job have in common.
+
+        :returns: A set of pairs.
+        """
+        return frozenset(self.variants[0]).intersection(*self.variants[1:])
+
+    @property
+    def empty(self):
+        """
+        Check whether the job has no command to execute.
+
+        :returns: True if all the phases of the job are empty.
+        """
+        return not any(commands for _, commands in self.phases)
+
+
+def plan(variants, phases, deduplicate=False):
+    """
+    Plan the execution of variants.
+
+    :param variants: An iterable of variants.
+    :param phases: A list of `(phase, commands)` tuples, where `commands` is
+        the list of commands to execute for each variant during `phase`.
+    :param deduplicate: If True, variants that render the same commands and
+        that have the same values for all the dimensions those commands
+        reference, either as template variables or as environment variables,
+        are grouped into a single job. The dimensions that the commands don't
+        reference are assumed not to alter their outcome. Jobs run in the
+        environment of their reference variant.
+    :returns: A list of :class:`Job` instances, in the order of their first
+        variant.
+    """
+    jobs = []
+    groups = {}
+    required_keys = find_required_keys(*[
+        command
+        for _, commands in phases
+        for command in commands
+    ])
+
+    for variant in variants:
+        rendered_phases = [
+            (phase, render_commands(commands=commands, variant=variant))
+            for phase, commands in phases
+        ]
+
+        if deduplicate:
+            environment_keys = find_environment_keys(*[
+                command
+                for _, commands in rendered_phases
+                for command in commands
+            ])
+            signature = (
+                tuple(
+                    (phase, tuple(commands))
+                    for phase, commands in rendered_phases
+                ),
+                frozenset(
+                    (key, value)
+                    for key, value in variant
+                    if key in required_keys or key in environment_keys
+                ),
+            )
+
+            if signature in groups:
+                groups[signature].variants.append(variant)
+                continue
+
+            job = groups[signature] = Job(
+                variants=[variant],
+                phases=rendered_phases,
+            )
+        else:
+            job = Job(variants=[variant], phases=rendered_phases)
+
+        jobs.append(job)
+
+    return jobs
@@ -0,0 +1,841 @@
+"""
+Matrix runner.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import threading
+
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+from six import reraise
+
+from .cache import (
+    compute_key,
+    hash_inputs,
+)
+from .cancellation import CancellationToken
+from .compat import unicode
+from .displays import RecordingDisplay
+from .log import logger
+from .planning import plan
+from .statistics import Statistics
+
+# The phases that prepare the environment of the variants. They run once per
+# distinct rendering, and are shared by all the variants that need them.
+SETUP_PHASES = ('before_install', 'install')
+
+# The phases that run for each variant.
+VARIANT_PHASES = (
+    'before_script',
+    'script',
+    'after_success',
+    'after_failure',
+    'after_script',
+)
+
+# The phases that run whatever the outcome of the previous ones, and that
+# don't alter that outcome.
+CONDITIONAL_PHASES = ('after_success', 'after_failure', 'after_script')
+
+
+def should_run_phase(phase, success):
+    """
+    Check whether a phase must run.
+
+    :param phase: The name of the phase.
+    :param success: Whether all the previous phases succeeded.
+    :returns: True if the phase must run.
+    """
+    if phase == 'after_success':
+        return success
+    elif phase == 'after_failure':
+        return not success
+    elif phase == 'after_script':
+        return True
+
+    return success
+
+
+def execute_phases(
+    executor,
+    environment,
+    phases,
+    display,
+    statistics=None,
+    cancellation=None,
+):
+    """
+    Execute the phases of a job.
+
+    A failure stops the execution of the subsequent phases, except for the
+    `after_*` ones, which run depending on the outcome of the previous phases
+    and don't alter it. All the phases run within the same session of the
+    executor.
+
+    :param executor: The executor to use.
+    :param environment: The environment variables dictionary.
+    :param phases: A list of `(phase, commands)` tuples.
+    :param display: The display to use for command output and report.
+    :param statistics: If not ``None``, a
+        :class:`plix.statistics.Statistics` instance to add the resources
+        used by the phases to.
+    :param cancellation: If not ``None``, a
+        :class:`plix.cancellation.CancellationToken` instance. No phase
+        starts once it is cancelled.
+    :returns: True if the execution went fine, False otherwise.
+    """
+    success = True
+
+    with executor.session(environment):
+        for phase, commands in phases:
+            if not commands or not should_run_phase(phase, success):
+                continue
+
+            if cancellation is not None and cancellation.cancelled:
+                return False
+
+            with display.phase(phase) as result:
+                result.statistics = Statistics()
+                result.success = executor.execute(
+                    environment=environment,
+                    commands=commands,
+                    display=display,
+                    statistics=result.statistics,
+                    cancellation=cancellation,
+                )
+
+            if statistics is not None:
+                statistics.add(result.statistics)
+
+            if phase not in CONDITIONAL_PHASES:
+                success = result.success
+
+    return success
+
+
+def build_environment(base_environment, global_environment, variant):
+    """
+    Build the environment of a variant.
+
+    :param base_environment: The environment to start from. Usually the
+        environment of the current process.
+    :param global_environment: The environment variables that are common to
+        all the variants.
+    :param variant: The variant, as a set of pairs.
+    :returns: The environment dictionary for ``variant``. All values are
+        unicode strings.
+    """
+    environment = dict(base_environment)
+    environment.update(
+        (key, unicode(value)) for key, value in global_environment.items()
+    )
+    environment.update((key, unicode(value)) for key, value in variant)
+
+    return environment
+
+
+class PendingOutcome(object):
+    """
+    The outcome of an execution that happens in another thread.
+    """
+
+    def __init__(self):
+        """
+        Initialize the :class:`PendingOutcome`.
+        """
+        self.event = threading.Event()
+        self.value = None
+        self.exc_info = None
+
+    def set(self, value, exc_info=None):
+        """
+        Set the outcome.
+
+        :param value: The outcome.
+        :param exc_info: If not ``None``, the :func:`sys.exc_info` tuple of
+            the exception that the execution raised.
+        """
+        self.value = value
+        self.exc_info = exc_info
+        self.event.set()
+
+    def get(self):
+        """
+        Wait for the outcome.
+
+        :returns: The outcome.
+        :raises: The exception that the execution raised, if any.
+        """
+        self.event.wait()
+
+        if self.exc_info is not None:
+            reraise(*self.exc_info)
+
+        return self.value
+
+
+class Runner(object):
+    """
+    Runs the variants of a matrix, possibly in parallel.
+
+    The setup phases of each variant run first, and the other phases then
+    run if they succeeded. With deduplication, the variants that render the
+    setup phases the same share them.
+    """
+
+    #: The phases that are shared by the variants that render them the same.
+    setup_phases = SETUP_PHASES
+
+    #: The phases that run for each variant.
+    variant_phases = VARIANT_PHASES
+
+    def __init__(
+        self,
+        configuration,
+        display,
+        jobs=1,
+        environment=None,
+        deduplicate=False,
+        cache=None,
+        history=None,
+        fail_fast=False,
+    ):
+        """
+        Initialize the :class:`Runner`.
+
+        :param configuration: The normalized configuration.
+        :param display: The display to report the variants results to.
+        :param jobs: The maximum number of jobs to execute concurrently.
+        :param environment: The base environment of every variant. If
+            ``None``, the environment of the current process is used.
+        :param deduplicate: Whether equivalent variants get executed only
+            once. See :func:`plix.planning.plan`. The setup phases of
+            equivalent variants are always shared.
+        :param cache: If not ``None``, a :class:`plix.cache.ResultCache`
+            instance. Jobs that already succeeded in the same conditions are
+            not executed again. The configuration must then have a `cache`
+            section.
+        :param history: If not ``None``, a loaded
+            :class:`plix.history.History` instance. The durations of the jobs
+            are recorded in it, and saved at the end of each run. Parallel
+            jobs are started by decreasing expected duration.
+        :param fail_fast: Whether the first failure stops the run. Running
+            jobs are cancelled, and the jobs that didn't start are skipped.
+        """
+        self.configuration = configuration
+        self.display = display
+        self.jobs = jobs
+        self.environment = os.environ if environment is None else environment
+        self.deduplicate = deduplicate
+        self.cache = cache
+        self.cache_keys = {}
+        self.history = history
+        self.fail_fast = fail_fast
+        self.cancellation = None
+
+    def prepare(self, job):
+        """
+        Prepare the execution of a job.
+
+        :param job: The :class:`plix.planning.Job` to prepare.
+        :returns: A dictionary with the `environment` and `phases`
+            arguments to pass to :func:`execute_phases`.
+        """
+        return {
+            'environment': build_environment(
+                base_environment=self.environment,
+                global_environment=self.configuration['global'],
+                variant=job.pairs,
+            ),
+            'phases': job.phases,
+        }
+
+    def execute(self, job, display, statistics=None):
+        """
+        Execute a job.
+
+        :param job: The :class:`plix.planning.Job` to execute.
+        :param display: The display to use for command output and report.
+        :param statistics: If not ``None``, a
+            :class:`plix.statistics.Statistics` instance to add the resources
+            used by the job to.
+        :returns: True if the execution went fine, False otherwise.
+        """
+        return execute_phases(
+            executor=self.configuration['executor'],
+            display=display,
+            statistics=statistics,
+            cancellation=self.cancellation,
+            **self.prepare(job)
+        )
+
+    @property
+    def cancelled(self):
+        """
+        Whether the current run was cancelled.
+        """
+        return self.cancellation is not None and self.cancellation.cancelled
+
+    def cancel(self):
+        """
+        Cancel the current run, if it stops on the first failure.
+        """
+        if self.cancellation is not None:
+            self.cancellation.cancel()
+
+    def get_phases(self, phases):
+        """
+        Get the commands of phases.
+
+        :param phases: The names of the phases.
+        :returns: A list of `(phase, commands)` tuples.
+        """
+        return [
+            (phase, self.configuration.get(phase, []))
+            for phase in phases
+        ]
+
+    def estimate(self, variant, history=None):
+        """
+        Estimate the duration of a variant, from the history.
+
+        :param variant: The variant.
+        :param history: The :class:`plix.history.History` to estimate from.
+            Defaults to the history of the runner.
+        :returns: The estimated duration of the job of the variant, in
+            seconds. It doesn't include the setup phases.
+        """
+        job, = plan(
+            variants=[variant],
+            phases=self.get_phases(self.variant_phases),
+        )
+
+        return (self.history if history is None else history).estimate(job)
+
+    def get_cache_key(self, job, setup, inputs=None):
+        """
+        Get the cache key of a job.
+
+        :param job: The :class:`plix.planning.Job`.
+        :param setup: The :class:`plix.planning.Job` of the setup phases of
+            ``job``.
+        :param inputs: The digest of the input files, as returned by
+            :func:`plix.cache.hash_inputs`.
+        :returns: The key, as an hexadecimal string.
+        """
+        settings = self.configuration['cache']
+
+        return compute_key(
+            commands=setup.phases + job.phases,
+            executor=self.configuration['executor'],
+            environment=build_environment(
+                base_environment={
+                    key: self.environment[key]
+                    for key in settings['environment']
+                    if key in self.environment
+                },
+                global_environment=self.configuration['global'],
+                variant=job.pairs,
+            ),
+            inputs=inputs,
+        )
+
+    def run(self, variants):
+        """
+        Run variants.
+
+        Each variant runs once its setup phases succeeded. Variants that
+        render the same setup commands, and that have the same values for
+        the dimensions those commands reference, share their setup. A
+        variant whose setup failed is reported as failed without being
+        executed. In parallel, the setups and the variants of the ones that
+        succeeded all share the same pool of concurrent jobs.
+
+        Variants are reported to the display in the order of ``variants``,
+        whatever the order in which they complete, each setup right before
+        its first variant. Variants that share the job of a previous variant
+        are reported right after it. Variants whose job is found in the cache
+        are reported first, and setups whose variants are all found in the
+        cache don't run.
+
+        In fail-fast mode, the variants that didn't start when a failure
+        occurs are reported as skipped.
+
+        :param variants: An iterable of variants.
+        :returns: A list of `(variant, success)` tuples, in the order of
+            ``variants``. ``success`` is ``None`` for the skipped variants.
+        """
+        variants = list(variants)
+        results = {}
+        self.cancellation = CancellationToken() if self.fail_fast else None
+
+        if self.cache is not None:
+            inputs = hash_inputs(self.configuration['cache']['inputs'])
+
+        try:
+            jobs = []
+            setups = {}
+
+            for setup in plan(
+                variants=variants,
+                phases=self.get_phases(self.setup_phases),
+                deduplicate=True,
+            ):
+                setup_jobs = plan(
+                    variants=setup.variants,
+                    phases=self.get_phases(self.variant_phases),
+                    deduplicate=self.deduplicate,
+                )
+
+                if self.cache is not None:
+                    setup_jobs = self.skip_cached_jobs(
+                        setup_jobs,
+                        setup=setup,
+                        inputs=inputs,
+                        results=results,
+                    )
+
+                jobs.extend(setup_jobs)
+
+                if not setup.empty:
+                    setups.update((job, setup) for job in setup_jobs)
+
+            for job, success in self.run_jobs(jobs, setups=setups):
+                results.update((variant, success) for variant in job.variants)
+        finally:
+            # Idle worker processes must not outlive the run.
+            self.configuration['executor'].close()
+
+            if self.cache is not None:
+                self.cache_keys.clear()
+                self.cache.evict()
+
+            if self.history is not None:
+                # The history only speeds up the next runs: failing to save it
+                # must not hide the outcome of this one.
+                try:
+                    self.history.save()
+                except (IOError, OSError) as ex:
+                    logger.warning(
+                        "Unable to save the duration history: %s",
+                        ex,
+                    )
+
+        return [(variant, results[variant]) for variant in variants]
+
+    def skip_cached_jobs(self, jobs, setup, inputs, results):
+        """
+        Report the jobs that are found in the cache.
+
+        :param jobs: A list of jobs.
+        :param setup: The :class:`plix.planning.Job` of the setup phases of
+            ``jobs``.
+        :param inputs: The digest of the input files.
+        :param results: A dictionary in which the variants of the cached jobs
+            are marked as successful.
+        :returns: The list of the jobs that were not found in the cache.
+        """
+        remaining_jobs = []
+
+        for job in jobs:
+            key = self.cache_keys[job] = self.get_cache_key(
+                job,
+                setup=setup,
+                inputs=inputs,
+            )
+            entry = self.cache.get(key)
+
+            if entry is None:
+                remaining_jobs.append(job)
+            else:
+                for variant in job.variants:
+                    self.display.cached_variant(
+                        variant=variant,
+                        statistics=Statistics(**entry['statistics']),
+                    )
+                    results[variant] = True
+
+        return remaining_jobs
+
+    def run_setup(self, setup):
+        """
+        Run the setup phases of some variants, in the current thread.
+
+        :param setup: The :class:`plix.planning.Job` of the setup phases.
+        :returns: True if the execution went fine, False otherwise.
+        """
+        with self.display.setup(setup.shared_pairs) as result:
+            result.statistics = Statistics()
+            result.success = self.execute(
+                setup,
+                display=self.display,
+                statistics=result.statistics,
+            )
+
+        if not result.success:
+            self.cancel()
+
+        return result.success
+
+    def report_setup(self, setup, recording, success):
+        """
+        Report the recorded execution of the setup phases of some variants.
+
+        :param setup: The :class:`plix.planning.Job` of the setup phases.
+        :param recording: The :class:`plix.displays.RecordingDisplay` of the
+            execution, or ``None`` if the setup didn't run because the run was
+            cancelled.
+        :param success: Whether the execution went fine.
+        :returns: ``success``, or ``None`` if the setup didn't run.
+        """
+        if recording is None:
+            return None
+
+        with self.display.setup(setup.shared_pairs) as result:
+            recording.replay(self.display)
+            result.success = success
+            result.statistics = recording.statistics
+
+        recording.close()
+
+        return success
+
+    def report_failed_jobs(self, jobs):
+        """
+        Report the variants of jobs that can't be executed as failed.
+
+        :param jobs: A list of jobs.
+        :returns: A list of `(job, False)` tuples, in the order of ``jobs``.
+        """
+        for job in jobs:
+            with self.display.variant(job.variants[0]) as result:
+                result.success = False
+
+            self.report_shared_variants(job, success=False)
+
+        return [(job, False) for job in jobs]
+
+    def skip_job(self, job):
+        """
+        Report the variants of a job that is not executed because the run was
+        cancelled.
+
+        :param job: The job.
+        :returns: ``None``.
+        """
+        for variant in job.variants:
+            self.display.skipped_variant(variant=variant)
+
+    def run_jobs(self, jobs, setups=None):
+        """
+        Run jobs, sequentially or in parallel depending on the number of
+        allowed concurrent jobs.
+
+        :param jobs: A list of jobs.
+        :param setups: A dictionary that maps jobs to the
+            :class:`plix.planning.Job` of their setup phases, if they have
+            any. The jobs that share a setup must be contiguous in ``jobs``.
+        :returns: A list of `(job, success)` tuples, in the order of ``jobs``.
+        """
+        setups = setups or {}
+        concurrency = min(self.jobs, len(jobs) + len(set(setups.values())))
+
+        if concurrency > 1:
+            return self.run_parallel(
+                jobs,
+                concurrency=concurrency,
+                setups=setups,
+            )
+
+        outcomes = []
+        setup_results = {}
+
+        for job in jobs:
+            setup = setups.get(job)
+
+            if setup is not None and setup not in setup_results:
+                if self.cancelled:
+                    setup_results[setup] = None
+                else:
+                    setup_results[setup] = self.run_setup(setup)
+
+            if setup_results.get(setup) is False:
+                outcomes.extend(self.report_failed_jobs([job]))
+            else:
+                outcomes.append((job, self.run_sequential(job)))
+
+        return outcomes
+
+    def complete(self, job, success, statistics):
+        """
+        Handle the completion of a job.
+
+        The variants of the job that were not reported along with its output
+        are reported and, if it succeeded, the job is stored in the cache and
+        its durations are recorded in the history.
+
+        :param job: The job.
+        :param success: Whether the job succeeded.
+        :param statistics: The :class:`plix.statistics.Statistics` of the
+            job.
+        """
+        self.report_shared_variants(job, success=success)
+
+        if success and job in self.cache_keys:
+            self.cache.put(
+                self.cache_keys[job],
+                {'statistics': statistics.to_dict()},
+            )
+
+        if success and self.history is not None:
+            self.history.record(job, statistics)
+
+    def report_shared_variants(self, job, success):
+        """
+        Report the variants of a job that were not reported along with its
+        output.
+
+        :param job: The job.
+        :param success: Whether the job succeeded.
+        """
+        reference = job.variants[0]
+
+        for variant in job.variants[1:]:
+            self.display.shared_variant(
+                variant=variant,
+                reference=reference,
+                success=success,
+            )
+
+    def run_sequential(self, job):
+        """
+        Run a job in the current thread, reporting its output live.
+
+        :param job: The job to run.
+        :returns: True if the execution went fine, False otherwise, or
+            ``None`` if the job was skipped because the run was cancelled.
+        """
+        if self.cancelled:
+            return self.skip_job(job)
+
+        with self.display.variant(job.variants[0]) as result:
+            result.statistics = Statistics()
+            result.success = self.execute(
+                job,
+                display=self.display,
+                statistics=result.statistics,
+            )
+
+        self.complete(
+            job,
+            success=result.success,
+            statistics=result.statistics,
+        )
+
+        if not result.success:
+            self.cancel()
+
+        return result.success
+
+    def run_parallel(self, jobs, concurrency, setups=None):
+        """
+        Run jobs concurrently.
+
+        Jobs run on a pool of worker threads or, if the executor has an
+        ``execute_async`` coroutine method, on a single event loop. The
+        setups run first, and each job starts as soon as its setup
+        succeeded. If there is a history, the jobs that are expected to last
+        longer are started first.
+
+        The output of each job is recorded, and replayed on the display as
+        soon as all the preceding jobs in ``jobs`` were reported.
+
+        :param jobs: A list of jobs.
+        :param concurrency: The maximum number of concurrent jobs.
+        :param setups: A dictionary that maps jobs to the
+            :class:`plix.planning.Job` of their setup phases, if they have
+            any. The jobs that share a setup must be contiguous in ``jobs``.
+        :returns: A list of `(job, success)` tuples, in the order of ``jobs``.
+        """
+        setups = setups or {}
+        setup_jobs = []
+
+        for job in jobs:
+            setup = setups.get(job)
+
+            if setup is not None and (
+                not setup_jobs or setup_jobs[-1] is not setup
+            ):
+                setup_jobs.append(setup)
+
+        if self.history is not None:
+            scheduled_jobs = setup_jobs + self.history.schedule(jobs)
+        else:
+            scheduled_jobs = setup_jobs + jobs
+
+        positions = {job: position for position, job in enumerate(setup_jobs)}
+        parents = [
+            positions.get(setups.get(job)) for job in scheduled_jobs
+        ]
+        results = []
+        outcomes_map = {}
+        setup_results = {}
+
+        with self.execute_recorded(
+            scheduled_jobs,
+            concurrency,
+            parents=parents,
+        ) as outcomes:
+            for scheduled_job, outcome in zip(scheduled_jobs, outcomes):
+                outcomes_map[scheduled_job] = outcome
+
+                while len(results) < len(jobs):
+                    job = jobs[len(results)]
+                    setup = setups.get(job)
+
+                    if setup is not None and setup not in setup_results:
+                        if setup not in outcomes_map:
+                            break
+
+                        setup_results[setup] = self.report_setup(
+                            setup,
+                            *outcomes_map.pop(setup)
+                        )
+
+                    if job not in outcomes_map:
+                        break
+
+                    recording, success = outcomes_map.pop(job)
+
+                    if setup_results.get(setup) is False:
+                        results.extend(self.report_failed_jobs([job]))
+                        continue
+                    elif recording is None:
+                        results.append((job, self.skip_job(job)))
+                        continue
+
+                    with self.display.variant(job.variants[0]) as result:
+                        recording.replay(self.display)
+                        result.success = success
+                        result.statistics = recording.statistics
+
+                    recording.close()
+                    self.complete(
+                        job,
+                        success=success,
+                        statistics=recording.statistics,
+                    )
+                    results.append((job, success))
+
+        return results
+
+    def record(self, job):
+        """
+        Execute a job, recording its output.
+
+        :param job: The job to execute.
+        :returns: A `(recording, success)` tuple, where ``recording`` is a
+            :class:`plix.displays.RecordingDisplay`, or ``None`` if the job
+            didn't start because the run was cancelled. A failed job cancels
+            the run.
+        """
+        if self.cancelled:
+            return None, False
+
+        recording = RecordingDisplay()
+        success = self.execute(
+            job,
+            display=recording,
+            statistics=recording.statistics,
+        )
+
+        if not success:
+            self.cancel()
+
+        return recording, success
+
+    @contextmanager
+    def execute_recorded(self, jobs, concurrency, parents=None):
+        """
+        Execute jobs concurrently, recording their output.
+
+        :param jobs: A list of jobs.
+        :param concurrency: The maximum number of concurrent jobs.
+        :param parents: If not ``None``, a list that holds, for each job, the
+            position in ``jobs`` of the job it depends on, or ``None``. A job
+            starts once the job it depends on succeeded, and doesn't start at
+            all if it failed.
+        :yields: An iterator of `(recording, success)` tuples, in the order of
+            ``jobs``. ``recording`` is ``None`` for the jobs that didn't
+            start because the run was cancelled or the job they depend on
+            failed. The first failed job cancels the run.
+        """
+        executor = self.configuration['executor']
+        parents = parents or [None] * len(jobs)
+
+        if hasattr(executor, 'execute_async'):
+            from . import aio
+
+            outcomes = aio.execute_recorded(
+                executor=executor,
+                calls=[self.prepare(job) for job in jobs],
+                concurrency=concurrency,
+                cancellation=self.cancellation,
+                parents=parents,
+            )
+
+            try:
+                yield outcomes
+            except KeyboardInterrupt:
+                # Stop the running commands before waiting for them.
+                self.cancel()
+                raise
+            finally:
+                outcomes.close()
+        else:
+            pool = ThreadPool(concurrency)
+            outcomes = [PendingOutcome() for _ in jobs]
+            children = [[] for _ in jobs]
+
+            for position, parent in enumerate(parents):
+                if parent is not None:
+                    children[parent].append(position)
+
+            def finish(position, value, exc_info=None):
+                # Only the jobs that are ready get queued in the pool.
+                for child in children[position]:
+                    if value[1]:
+                        pool.apply_async(execute, (child,))
+                    else:
+                        finish(child, (None, False))
+
+                outcomes[position].set(value, exc_info=exc_info)
+
+            def execute(position):
+                try:
+                    value = self.record(jobs[position])
+                except Exception:
+                    finish(position, (None, False), exc_info=sys.exc_info())
+                else:
+                    finish(position, value)
+
+            for position, parent in enumerate(parents):
+                if parent is None:
+                    pool.apply_async(execute, (position,))
+
+            try:
+                yield (outcome.get() for outcome in outcomes)
+            except KeyboardInterrupt:
+                # Stop the running commands before waiting for them.
+                self.cancel()
+                raise
+            finally:
+                # All the tasks are complete unless we got here through an
+                # exception, in which case we don't want to schedule new
+                # ones.
+                pool.terminate()
+                pool.join()
@@ -0,0 +1,153 @@
+"""
+Execution statistics.
+"""
+
+from __future__ import unicode_literals
+
+# The fields of the statistics, in display order.
+FIELDS = (
+    'wall_time',
+    'user_time',
+    'system_time',
+    'max_rss',
+    'output_size',
+    'command_times',
+)
+
+
+def format_size(size):
+    """
+    Get a human-readable representation of a size.
+
+    :param size: The size, in bytes.
+    :returns: An unicode string.
+
+    >>> format_size(512)
+    '512 B'
+    >>> format_size(3 * 1024 * 1024)
+    '3.0 MiB'
+    """
+    if size < 1024:
+        return '{} B'.format(size)
+
+    for unit in ('KiB', 'MiB', 'GiB'):
+        size /= 1024.0
+
+        if size < 1024 or unit == 'GiB':
+            return '{:.1f} {}'.format(size, unit)
+
+
+class Statistics(object):
+    """
+    The resources used by the execution of a command, or the sum of the
+    resources used by the execution of several commands.
+
+    The CPU times and the peak memory usage are ``None`` when the executor
+    can't measure them.
+
+    The peak memory usage is an upper bound: on Linux, a process starts with
+    the peak resident set size of the Plix process it was forked from.
+    """
+
+    def __init__(
+        self,
+        wall_time=0.0,
+        user_time=None,
+        system_time=None,
+        max_rss=None,
+        output_size=0,
+        command_times=None,
+    ):
+        """
+        Initialize the :class:`Statistics`.
+
+        :param wall_time: The elapsed time, in seconds.
+        :param user_time: The CPU time spent in user mode, in seconds.
+        :param system_time: The CPU time spent in kernel mode, in seconds.
+        :param max_rss: An upper bound of the peak resident set size, in
+            bytes, that includes the size of Plix.
+        :param output_size: The number of bytes of output.
+        :param command_times: A dictionary of the elapsed time, in seconds,
+            of each of the executed commands.
+        """
+        self.wall_time = wall_time
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+        self.output_size = output_size
+        self.command_times = dict(command_times or {})
+
+    def __eq__(self, other):
+        if not isinstance(other, Statistics):
+            return NotImplemented
+
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return 'Statistics({})'.format(', '.join(
+            '{}={!r}'.format(field, getattr(self, field)) for field in FIELDS
+        ))
+
+    def add(self, other):
+        """
+        Add the resources used by another execution.
+
+        Times and output sizes are summed, and peak memory usages are
+        maxed.
+
+        :param other: The :class:`Statistics` instance to add.
+        """
+        self.wall_time += other.wall_time
+        self.output_size += other.output_size
+
+        for command, wall_time in other.command_times.items():
+            self.command_times[command] = (
+                self.command_times.get(command, 0.0) + wall_time
+            )
+
+        if other.user_time is not None:
+            self.user_time = (self.user_time or 0.0) + other.user_time
+
+        if other.system_time is not None:
+            self.system_time = (self.system_time or 0.0) + other.system_time
+
+        if other.max_rss is not None:
+            self.max_rss = max(self.max_rss or 0, other.max_rss)
+
+    def to_dict(self):
+        """
+        Get a serializable representation of the statistics.
+
+        :returns: A dictionary that can be passed as keyword arguments to
+            :class:`Statistics`.
+        """
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def format(self, memory=True):
+        """
+        Get a human-readable representation of the statistics.
+
+        :param memory: Whether to show the peak memory usage.
+        :returns: An unicode string.
+        """
+        parts = ['{:.3f}s wall'.format(self.wall_time)]
+
+        if self.user_time is not None:
+            parts.append('{:.3f}s user'.format(self.user_time))
+
+        if self.system_time is not None:
+            parts.append('{:.3f}s sys'.format(self.system_time))
+
+        if memory and self.max_rss is not None:
+            parts.append(
+                '<= {} max RSS (with plix)'.format(format_size(self.max_rss)),
+            )
+
+        parts.append('{} output'.format(format_size(self.output_size)))
+
+        return ', '.join(parts)
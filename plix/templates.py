@@ -0,0 +1,98 @@
+"""
+Command templates.
+
+Commands are Jinja2 templates, rendered with the pairs of each variant, so
+that `{{ key }}` stands for the value of the `key` dimension. Shell syntax
+that looks like Jinja2, like `${#VAR}` or `{{.Id}}`, must be written between
+`{% raw %}` and `{% endraw %}` to be kept as is:
+
+.. code-block:: yaml
+
+    script:
+      - docker inspect -f '{% raw %}{{.Id}}{% endraw %}' {{ image }}
+"""
+
+from __future__ import unicode_literals
+
+from jinja2 import (
+    Environment,
+    meta,
+)
+
+# The Jinja2 environment shared by all templates.
+_environment = Environment()
+
+# The compiled templates, by source.
+_templates = {}
+
+
+class CommandTemplate(object):
+    """
+    A command template, compiled once and rendered for any number of
+    variants.
+    """
+
+    def __init__(self, source):
+        """
+        Initialize the :class:`CommandTemplate`.
+
+        :param source: The source of the template, as an unicode string.
+        """
+        self.source = source
+        ast = _environment.parse(source)
+        self.required_keys = frozenset(meta.find_undeclared_variables(ast))
+        self.template = _environment.from_string(ast)
+        self.renderings = {}
+
+    def render(self, variant):
+        """
+        Render the template for a variant.
+
+        Renderings are memoized by the pairs of the variant that the template
+        references, so that variants that only differ by unreferenced
+        dimensions share their rendering.
+
+        :param variant: The variant to render the template for.
+        :returns: The rendered command, as an unicode string.
+        """
+        context = frozenset(
+            (key, value)
+            for key, value in variant
+            if key in self.required_keys
+        )
+
+        try:
+            return self.renderings[context]
+        except KeyError:
+            result = self.renderings[context] = self.template.render(
+                dict(context),
+            )
+
+            return result
+
+
+def get_template(source):
+    """
+    Get the compiled template for a command.
+
+    :param source: The command, as an unicode string.
+    :returns: A :class:`CommandTemplate` instance. Calls with the same
+        ``source`` return the same instance.
+    """
+    try:
+        return _templates[source]
+    except KeyError:
+        result = _templates[source] = CommandTemplate(source)
+
+        return result
+
+
+def render_commands(commands, variant):
+    """
+    Render a list of commands for a variant.
+
+    :param commands: The list of commands to render.
+    :param variant: The variant to render the commands for.
+    :returns: The list of rendered commands.
+    """
+    return [get_template(command).render(variant) for command in commands]
@@ -0,0 +1,153 @@
+"""
+Python worker processes.
+
+A worker executes the Python commands it reads from its standard input, one
+JSON request per line, and prints a line made of the sentinel of the request
+and the exit status of the command once it completes. Workers are started
+by :class:`plix.executors.PythonExecutor`.
+
+Commands share a global namespace until a request asks for a reset, which
+the executor does when a worker moves on to another job. A reset also
+forgets the modules that the commands imported and restores the module
+search path, so that jobs don't see the imports of the previous ones.
+
+This module only depends on the standard library, so that workers start
+fast.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import sys
+import traceback
+
+
+def get_exit_code(code):
+    """
+    Get the exit status of a :class:`SystemExit` code, the way the
+    interpreter does when it exits.
+
+    :param code: The code.
+    :returns: The exit status.
+    """
+    if code is None:
+        return 0
+
+    if isinstance(code, int):
+        return code % 256
+
+    sys.stderr.write('{}\n'.format(code))
+
+    return 1
+
+
+def get_namespace():
+    """
+    Get a new global namespace for the commands.
+
+    :returns: The namespace dictionary.
+    """
+    return {'__name__': '__main__'}
+
+
+def get_state():
+    """
+    Get the state of the interpreter that resets restore.
+
+    :returns: A `(modules, path)` tuple, made of a copy of
+        :data:`sys.modules` and one of :data:`sys.path`.
+    """
+    return dict(sys.modules), list(sys.path)
+
+
+def reset(state):
+    """
+    Restore the state of the interpreter.
+
+    Modules imported since the state was taken are forgotten, so that they
+    get imported again, but the changes to the modules that were already
+    loaded stay.
+
+    :param state: A `(modules, path)` tuple. See :func:`get_state`.
+    """
+    modules, path = state
+
+    for name in set(sys.modules) - set(modules):
+        del sys.modules[name]
+
+    sys.modules.update(modules)
+    sys.path[:] = path
+
+
+def execute(command, environment, namespace):
+    """
+    Execute a command.
+
+    Commands see the `environment` in :data:`os.environ`. The current
+    directory is restored once they complete.
+
+    :param command: The Python source code to execute.
+    :param environment: The environment variables dictionary.
+    :param namespace: The global namespace of the command.
+    :returns: The exit status of the command.
+    """
+    directory = os.getcwd()
+    os.environ.clear()
+    os.environ.update(environment)
+
+    try:
+        exec(compile(command, '<command>', 'exec'), namespace)
+    except SystemExit as ex:
+        return get_exit_code(ex.code)
+    except Exception:
+        # Leave the frame of the worker out of the traceback.
+        kind, value, trace = sys.exc_info()
+        traceback.print_exception(kind, value, trace.tb_next)
+
+        return 1
+    finally:
+        os.chdir(directory)
+
+    return 0
+
+
+def main(modules):
+    """
+    Run a worker.
+
+    :param modules: The names of the modules to import before executing
+        the commands.
+    """
+    # Commands get `/dev/null` as their standard input, so that they can't
+    # consume the requests.
+    requests = os.fdopen(os.dup(0), 'rb')
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, 0)
+    os.close(null)
+    sys.stdin = open(os.devnull)
+
+    for module in modules:
+        __import__(module)
+
+    state = get_state()
+    namespace = get_namespace()
+
+    for line in iter(requests.readline, b''):
+        request = json.loads(line.decode('utf-8'))
+
+        if request.get('reset'):
+            reset(state)
+            namespace = get_namespace()
+
+        returncode = execute(
+            request['command'],
+            request['environment'],
+            namespace,
+        )
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.write(1, '\n{}:{}\n'.format(
+            request['sentinel'],
+            returncode,
+        ).encode('ascii'))
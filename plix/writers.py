@@ -0,0 +1,285 @@
+"""
+Queued stream writers.
+
+A :class:`QueuedWriter` does the writes to a stream on a dedicated thread,
+so that the threads that produce the output don't wait for a slow stream,
+like a paused terminal or a busy log collector.
+"""
+
+from __future__ import unicode_literals
+
+import codecs
+import threading
+
+from collections import deque
+
+from .buffers import OutputBuffer
+
+#: The default maximum size, in characters, of the queued text.
+DEFAULT_QUEUE_SIZE = 256 * 1024
+
+#: Wait for the queue to drain.
+BLOCK = 'block'
+
+#: Discard the text, and write a notice in its stead.
+DROP = 'drop'
+
+#: Queue the text in a temporary file.
+SPILL = 'spill'
+
+#: The policies for the text that doesn't fit in the queue.
+OVERFLOW_POLICIES = (BLOCK, DROP, SPILL)
+
+# The kinds of queued items.
+TEXT = 'text'
+OUTPUT = 'output'
+SPILLED = 'spilled'
+DROPPED = 'dropped'
+
+
+def format_dropped(count):
+    """
+    Get the notice that replaces some dropped text.
+
+    :param count: The number of dropped characters.
+    :returns: An unicode string.
+    """
+    return "[{} character(s) of output dropped]\n".format(count)
+
+
+class QueuedWriter(object):
+    """
+    Writes text and command outputs to a stream from a dedicated thread.
+
+    Consecutive text writes are coalesced into a single write to the stream,
+    followed by a single flush.
+
+    The queue holds at most `queue_size` characters of text. The text that
+    doesn't fit is handled according to the overflow policy:
+
+    - :data:`BLOCK` makes the caller wait until the queue drains, which slows
+      it down to the pace of the stream;
+    - :data:`DROP` discards the text, and a notice tells how much was;
+    - :data:`SPILL` queues the text in a temporary file instead.
+
+    In all cases, the text is written in the order it was queued.
+    """
+
+    def __init__(
+        self,
+        stream,
+        binary_stream=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        overflow_policy=BLOCK,
+        format_dropped=format_dropped,
+    ):
+        """
+        Initialize the :class:`QueuedWriter` and start its thread.
+
+        :param stream: The text stream to write to.
+        :param binary_stream: The binary stream that command outputs are
+            copied to. Defaults to ``stream``.
+        :param queue_size: The maximum size, in characters, of the queued
+            text. A single write that is larger is queued nonetheless when the
+            queue is empty.
+        :param overflow_policy: One of :data:`OVERFLOW_POLICIES`.
+        :param format_dropped: A function that takes a number of dropped
+            characters and returns the notice to write in their stead.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy: {}".format(overflow_policy),
+            )
+
+        self.stream = stream
+        self.binary_stream = (
+            binary_stream if binary_stream is not None else stream
+        )
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.format_dropped = format_dropped
+        self.items = deque()
+        self.size = 0
+        self.busy = False
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, text):
+        """
+        Queue some text.
+
+        :param text: The text, as an unicode string.
+        """
+        if not text:
+            return
+
+        with self.condition:
+            if self.closed:
+                raise ValueError("The writer is closed")
+
+            if self.size and self.size + len(text) > self.queue_size:
+                if self.overflow_policy == DROP:
+                    dropped = self.overflow(DROPPED, lambda: [0])
+                    dropped[0] += len(text)
+
+                    return
+                elif self.overflow_policy == SPILL:
+                    self.overflow(
+                        SPILLED,
+                        lambda: OutputBuffer(spill_threshold=0),
+                    ).write(text.encode('utf-8'))
+
+                    return
+
+                while (
+                    self.size and
+                    self.size + len(text) > self.queue_size and
+                    self.thread.is_alive()
+                ):
+                    self.condition.wait()
+
+            self.items.append((TEXT, text))
+            self.size += len(text)
+            self.condition.notify_all()
+
+    def overflow(self, kind, factory):
+        """
+        Get the queued item that holds the overflowing text.
+
+        Consecutive overflowing writes share the same item, at the end of the
+        queue. Must be called with :attr:`condition` held.
+
+        :param kind: The kind of the item.
+        :param factory: A function that creates the value of a new item.
+        :returns: The value of the item.
+        """
+        if self.items and self.items[-1][0] == kind:
+            return self.items[-1][1]
+
+        value = factory()
+        self.items.append((kind, value))
+        self.condition.notify_all()
+
+        return value
+
+    def write_output(self, output):
+        """
+        Queue the output of a command, to be copied to the binary stream.
+
+        The output doesn't count in the size of the queue, as it is already
+        bounded by its buffer.
+
+        :param output: A :class:`plix.buffers.OutputBuffer` instance. The
+            writer takes ownership of it, and closes it once it is copied.
+        """
+        with self.condition:
+            if self.closed:
+                output.close()
+
+                raise ValueError("The writer is closed")
+
+            self.items.append((OUTPUT, output))
+            self.condition.notify_all()
+
+    def flush(self):
+        """
+        Wait until everything queued so far is written.
+        """
+        with self.condition:
+            while (self.items or self.busy) and self.thread.is_alive():
+                self.condition.wait()
+
+    def close(self):
+        """
+        Write everything that is queued, and stop the thread.
+
+        :raises: The exception that the stream raised, if any. Once the stream
+            fails, the rest of the queue is discarded.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        self.thread.join()
+
+        if self.error is not None:
+            error, self.error = self.error, None
+
+            raise error
+
+    def run(self):
+        """
+        Write the queued items until the writer is closed.
+        """
+        while True:
+            with self.condition:
+                while not self.items and not self.closed:
+                    self.condition.wait()
+
+                if not self.items:
+                    return
+
+                items = list(self.items)
+                self.items.clear()
+                self.busy = True
+
+            try:
+                if self.error is None:
+                    self.write_items(items)
+            except Exception as ex:
+                self.error = ex
+            finally:
+                for kind, value in items:
+                    if kind in (OUTPUT, SPILLED):
+                        value.close()
+
+                with self.condition:
+                    self.size -= sum(
+                        len(value) for kind, value in items if kind == TEXT
+                    )
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def write_items(self, items):
+        """
+        Write some items to the streams.
+
+        :param items: A list of `(kind, value)` tuples.
+        """
+        texts = []
+
+        for kind, value in items:
+            if kind == TEXT:
+                texts.append(value)
+            elif kind == DROPPED:
+                texts.append(self.format_dropped(value[0]))
+            else:
+                self.write_text(''.join(texts))
+                texts = []
+
+                if kind == OUTPUT:
+                    value.copy_to(self.binary_stream)
+                else:
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+
+                    for chunk in value.chunks():
+                        self.stream.write(decoder.decode(chunk))
+
+                    self.stream.write(decoder.decode(b'', final=True))
+                    self.stream.flush()
+
+        self.write_text(''.join(texts))
+
+    def write_text(self, text):
+        """
+        Write some text to the stream, and flush it.
+
+        :param text: The text, as an unicode string.
+        """
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
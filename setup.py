@@ -1,8 +1,23 @@
+import re
+
 from setuptools import (
     setup,
     find_packages,
 )
 
+
+def get_version():
+    """
+    Get the version of Plix, as defined once in its package.
+    """
+    with open('plix/__init__.py') as stream:
+        return re.search(
+            r"^__version__ = '([^']+)'$",
+            stream.read(),
+            re.MULTILINE,
+        ).group(1)
+
+
 setup(
     name='plix',
     url='http://plix.readthedocs.org/en/latest/index.html',
@@ -11,7 +26,7 @@ setup(
     maintainer='Julien Kauffmann',
     maintainer_email='julien.kauffmann@freelan.org',
     license='MIT',
-    version=open('VERSION').read().strip(),
+    version=get_version(),
     description=(
         "A tool to create build matrices and run them in parallel."
     ),
@@ -21,6 +36,8 @@ parallel, on different platforms.
 """,
     packages=find_packages(exclude=[
         'tests',
+        'benchmarks',
+        'benchmarks.*',
     ]),
     install_requires=[
         'chromalog',
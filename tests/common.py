@@ -25,18 +25,32 @@ class PythonExecutor(BaseExecutor):
         stdout = StringIO()
         stderr = StringIO()
 
+        returncode = 0
+
         with patch('sys.stderr', stderr), patch('sys.stdout', stdout):
-            exec(command, self.globals, self.locals)
+            try:
+                exec(command, self.globals, self.locals)
+            except SystemExit as ex:
+                returncode = ex.code
 
-        output(stdout.getvalue())
-        output(stderr.getvalue())
+        output(stdout.getvalue().encode('utf-8'))
+        output(stderr.getvalue().encode('utf-8'))
 
-        return 0
+        return returncode
 
 
 class MockDisplay(BaseDisplay):
     def __new__(cls):
         self = super(MockDisplay, cls).__new__(cls)
+        self.start_setup = MagicMock()
+        self.stop_setup = MagicMock()
+        self.start_variant = MagicMock()
+        self.stop_variant = MagicMock()
+        self.shared_variant = MagicMock()
+        self.cached_variant = MagicMock()
+        self.skipped_variant = MagicMock()
+        self.start_phase = MagicMock()
+        self.stop_phase = MagicMock()
         self.set_context = MagicMock()
         self.start_command = MagicMock()
         self.stop_command = MagicMock()
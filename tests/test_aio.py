@@ -0,0 +1,222 @@
+"""
+Test the asyncio-based executors.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import threading
+
+from unittest import (
+    TestCase,
+    skipIf,
+)
+from mock import (
+    ANY,
+    call,
+    MagicMock,
+    patch,
+)
+from six import PY2
+
+from plix.cancellation import CancellationToken
+from plix.configuration import parse_executor
+from plix.runner import Runner
+
+from .common import MockDisplay
+
+if not PY2:
+    from plix.aio import (
+        AsyncShellExecutor,
+        execute_recorded,
+        run_coroutine,
+    )
+
+
+@skipIf(PY2, "asyncio requires Python 3")
+class AioTests(TestCase):
+    def test_async_shell_executor_is_loadable(self):
+        executor = parse_executor('plix.aio.AsyncShellExecutor')
+
+        self.assertIsInstance(executor, AsyncShellExecutor)
+
+    def test_async_shell_executor_requires_python_3_7(self):
+        with patch('plix.aio.sys.version_info', (3, 6, 0)):
+            with self.assertRaises(RuntimeError):
+                AsyncShellExecutor()
+
+    def test_async_shell_executor_execute_one(self):
+        executor = AsyncShellExecutor()
+        output = MagicMock()
+        returncode = executor.execute_one(
+            environment=dict(os.environ, FOO='bar'),
+            command='echo $FOO; exit 3',
+            output=output,
+        )
+
+        self.assertEqual(3, returncode)
+        output.assert_called_once_with(b'bar\n')
+
+    def test_async_shell_executor_execute_async(self):
+        executor = AsyncShellExecutor()
+        display = MockDisplay()
+        success = run_coroutine(executor.execute_async(
+            environment=dict(os.environ),
+            commands=['echo a', 'false', 'echo b'],
+            display=display,
+        ))
+
+        self.assertFalse(success)
+        self.assertEqual(
+            [
+                call(
+                    index=0,
+                    command='echo a',
+                    returncode=0,
+                    statistics=ANY,
+                ),
+                call(
+                    index=1,
+                    command='false',
+                    returncode=1,
+                    statistics=ANY,
+                ),
+            ],
+            display.stop_command.mock_calls,
+        )
+        display.command_output.assert_called_once_with(0, b'a\n')
+
+    def test_execute_recorded(self):
+        executor = AsyncShellExecutor()
+        outcomes = list(execute_recorded(
+            executor=executor,
+            calls=[
+                {
+                    'environment': dict(os.environ),
+                    'phases': [
+                        ('script', [
+                            'sleep 0.{}; echo {}'.format(3 - index, index),
+                        ]),
+                        ('after_success', ['echo done']),
+                    ],
+                }
+                for index in range(3)
+            ],
+            concurrency=3,
+        ))
+
+        self.assertEqual([True, True, True], [ok for _, ok in outcomes])
+
+        for index, (recording, _) in enumerate(outcomes):
+            display = MockDisplay()
+            recording.replay(display)
+            recording.close()
+            self.assertEqual(
+                [
+                    call(0, '{}\n'.format(index).encode('utf-8')),
+                    call(0, b'done\n'),
+                ],
+                display.command_output.mock_calls,
+            )
+            self.assertEqual(
+                [call(phase='script'), call(phase='after_success')],
+                display.start_phase.mock_calls,
+            )
+
+    def test_execute_recorded_with_parents(self):
+        def call(command):
+            return {
+                'environment': dict(os.environ),
+                'phases': [('script', [command])],
+            }
+
+        outcomes = list(execute_recorded(
+            executor=AsyncShellExecutor(),
+            calls=[
+                call('false'),
+                call('true'),
+                call('echo 1'),
+                call('echo 2'),
+            ],
+            concurrency=1,
+            parents=[None, None, 0, 1],
+        ))
+
+        self.assertEqual(
+            [False, True, False, True],
+            [ok for _, ok in outcomes],
+        )
+        self.assertIsNone(outcomes[2][0])
+        self.assertIsNotNone(outcomes[3][0])
+
+    def test_async_shell_executor_terminates_process_group(self):
+        cancellation = CancellationToken()
+        executor = AsyncShellExecutor()
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        returncode = executor.execute_one(
+            environment=dict(os.environ),
+            command='sleep 30 & sleep 30',
+            output=MagicMock(),
+            cancellation=cancellation,
+        )
+
+        self.assertEqual(-15, returncode)
+
+    def test_runner_fail_fast(self):
+        display = MockDisplay()
+        runner = Runner(
+            configuration={
+                'executor': AsyncShellExecutor(),
+                'global': {},
+                'script': ['sleep $A; test $A != 0'],
+            },
+            display=display,
+            jobs=2,
+            fail_fast=True,
+        )
+        variants = [frozenset({('A', value)}) for value in (30, 0, 31)]
+        results = runner.run(variants)
+
+        self.assertEqual(
+            [
+                (variants[0], False),
+                (variants[1], False),
+                (variants[2], None),
+            ],
+            results,
+        )
+        # The first variant was terminated, and the last one never started.
+        self.assertEqual(
+            [call(variant=variants[0]), call(variant=variants[1])],
+            display.start_variant.mock_calls,
+        )
+        self.assertEqual(
+            [call(variant=variants[2])],
+            display.skipped_variant.mock_calls,
+        )
+
+    def test_runner_uses_the_event_loop(self):
+        display = MockDisplay()
+        runner = Runner(
+            configuration={
+                'executor': AsyncShellExecutor(),
+                'global': {},
+                'script': ['test $A != 2'],
+            },
+            display=display,
+            jobs=4,
+        )
+        variants = [frozenset({('A', index)}) for index in range(4)]
+        results = runner.run(variants)
+
+        self.assertEqual(
+            [
+                (variants[0], True),
+                (variants[1], True),
+                (variants[2], False),
+                (variants[3], True),
+            ],
+            results,
+        )
@@ -0,0 +1,113 @@
+"""
+Test the output buffers.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from io import BytesIO
+from tempfile import TemporaryFile
+from unittest import TestCase
+from mock import patch
+
+from plix.buffers import (
+    copy_file,
+    OutputBuffer,
+)
+
+
+class BuffersTests(TestCase):
+    def test_copy_file_to_stream(self):
+        source = TemporaryFile()
+        source.write(b"hello world")
+        destination = BytesIO()
+        copy_file(source=source, destination=destination)
+
+        self.assertEqual(b"hello world", destination.getvalue())
+
+    def test_copy_file_to_file(self):
+        source = TemporaryFile()
+        source.write(b"hello world")
+        destination = TemporaryFile()
+        copy_file(source=source, destination=destination)
+        destination.seek(0)
+
+        self.assertEqual(b"hello world", destination.read())
+
+    @patch('os.sendfile', side_effect=OSError, create=True)
+    def test_copy_file_falls_back_on_sendfile_errors(self, _):
+        source = TemporaryFile()
+        source.write(b"hello world")
+        destination = TemporaryFile()
+        copy_file(source=source, destination=destination)
+        destination.seek(0)
+
+        self.assertEqual(b"hello world", destination.read())
+
+    def test_output_buffer_in_memory(self):
+        output = OutputBuffer(spill_threshold=10)
+        output.write(b"hello")
+        output.write(memoryview(b"world"))
+
+        self.assertIsNone(output.file)
+        self.assertEqual(0, output.omitted)
+        self.assertEqual(b"helloworld", output.getvalue())
+        self.assertEqual([b"helloworld"], list(output.chunks()))
+
+        destination = BytesIO()
+        output.copy_to(destination)
+        output.close()
+
+        self.assertEqual(b"helloworld", destination.getvalue())
+
+    def test_output_buffer_empty(self):
+        output = OutputBuffer()
+
+        self.assertEqual([], list(output.chunks()))
+
+    def test_output_buffer_spills_to_disk(self):
+        output = OutputBuffer(spill_threshold=10)
+        output.write(b"hello")
+        output.write(b"world")
+        output.write(b"!")
+
+        self.assertIsNotNone(output.file)
+        self.assertIsNone(output.getvalue())
+        self.assertEqual(b"helloworld!", b"".join(output.chunks()))
+
+        destination = TemporaryFile()
+        output.copy_to(destination)
+        output.close()
+        destination.seek(0)
+
+        self.assertEqual(b"helloworld!", destination.read())
+
+    def test_output_buffer_never_spills_without_threshold(self):
+        output = OutputBuffer(spill_threshold=None)
+        output.write(os.urandom(1024))
+
+        self.assertIsNone(output.file)
+
+    def test_output_buffer_tail(self):
+        output = OutputBuffer(spill_threshold=1, tail_size=6)
+
+        for data in [b"abc", b"def", b"ghi", b"j"]:
+            output.write(data)
+
+        self.assertIsNone(output.file)
+        self.assertEqual(4, output.omitted)
+        self.assertEqual(b"efghij", output.getvalue())
+        self.assertLessEqual(len(output.tail), 3)
+
+        destination = BytesIO()
+        output.copy_to(destination)
+
+        self.assertEqual(b"efghij", destination.getvalue())
+
+    def test_output_buffer_empty_tail(self):
+        output = OutputBuffer(tail_size=0)
+        output.write(b"abc")
+
+        self.assertEqual(3, output.omitted)
+        self.assertEqual(b"", output.getvalue())
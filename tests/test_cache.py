@@ -0,0 +1,152 @@
+"""
+Test the result cache.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from plix.cache import (
+    ResultCache,
+    compute_key,
+    find_inputs,
+    hash_inputs,
+)
+from plix.executors import ShellExecutor
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory, path)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, 'wb') as stream:
+            stream.write(content)
+
+    def test_find_inputs(self):
+        self.write('a.txt', b'a')
+        self.write('b.py', b'b')
+        self.write(os.path.join('c', 'd.txt'), b'd')
+
+        self.assertEqual(
+            ['a.txt', os.path.join('c', 'd.txt')],
+            find_inputs(['*.txt', 'c/*', 'c'], root=self.directory),
+        )
+
+    def test_hash_inputs(self):
+        self.write('a.txt', b'a')
+        digest = hash_inputs(['*.txt'], root=self.directory)
+
+        self.assertEqual(digest, hash_inputs(['*.txt'], root=self.directory))
+
+        self.write('a.txt', b'b')
+        changed_digest = hash_inputs(['*.txt'], root=self.directory)
+
+        self.assertNotEqual(digest, changed_digest)
+
+        self.write('b.txt', b'')
+
+        self.assertNotEqual(
+            changed_digest,
+            hash_inputs(['*.txt'], root=self.directory),
+        )
+
+    def test_compute_key(self):
+        executor = ShellExecutor()
+        key = compute_key(
+            commands=['a', 'b'],
+            executor=executor,
+            environment={'A': '1'},
+        )
+
+        self.assertEqual(64, len(key))
+        self.assertEqual(
+            key,
+            compute_key(
+                commands=['a', 'b'],
+                executor=ShellExecutor(),
+                environment={'A': 1},
+            ),
+        )
+
+        for kwargs in [
+            {'commands': ['a']},
+            {'executor': ShellExecutor(options={'read_size': 1})},
+            {'environment': {'A': '2'}},
+            {'inputs': 'digest'},
+        ]:
+            arguments = {
+                'commands': ['a', 'b'],
+                'executor': executor,
+                'environment': {'A': '1'},
+            }
+            arguments.update(kwargs)
+
+            self.assertNotEqual(key, compute_key(**arguments))
+
+    def test_get_and_put(self):
+        cache = ResultCache(directory=os.path.join(self.directory, 'cache'))
+
+        self.assertIsNone(cache.get('abcd'))
+
+        cache.put('abcd', {'foo': 1})
+        cache.put('abcd', {'foo': 2})
+
+        self.assertEqual({'foo': 2}, cache.get('abcd'))
+        self.assertEqual(
+            [os.path.join(self.directory, 'cache', 'ab', 'abcd')],
+            [path for _, path in cache.entries()],
+        )
+
+    def test_get_marks_entries_as_used(self):
+        cache = ResultCache(directory=self.directory)
+        cache.put('abcd', {})
+        os.utime(cache.get_path('abcd'), (0, 0))
+        cache.get('abcd')
+
+        self.assertGreater(os.path.getmtime(cache.get_path('abcd')), 0)
+
+    def test_evict_by_count(self):
+        cache = ResultCache(
+            directory=self.directory,
+            max_entries=2,
+            max_age=None,
+        )
+
+        for timestamp, key in enumerate(['aa', 'bb', 'cc']):
+            cache.put(key, {})
+            os.utime(cache.get_path(key), (timestamp, timestamp))
+
+        self.assertEqual(1, cache.evict())
+        self.assertIsNone(cache.get('aa'))
+        self.assertEqual({}, cache.get('bb'))
+        self.assertEqual({}, cache.get('cc'))
+
+    def test_evict_by_age(self):
+        cache = ResultCache(directory=self.directory, max_age=10)
+
+        for timestamp, key in [(0, 'aa'), (100, 'bb')]:
+            cache.put(key, {})
+            os.utime(cache.get_path(key), (timestamp, timestamp))
+
+        self.assertEqual(1, cache.evict(now=105))
+        self.assertEqual(['bb'], [
+            os.path.basename(path) for _, path in cache.entries()
+        ])
+
+    def test_evict_without_directory(self):
+        cache = ResultCache(directory=os.path.join(self.directory, 'none'))
+
+        self.assertEqual(0, cache.evict())
@@ -0,0 +1,43 @@
+"""
+Test the cooperative cancellation.
+"""
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from mock import MagicMock
+
+from plix.cancellation import CancellationToken
+
+
+class CancellationTests(TestCase):
+    def test_cancel_calls_registered_callbacks(self):
+        token = CancellationToken()
+        callback = MagicMock()
+
+        with token.register(callback):
+            self.assertFalse(token.cancelled)
+            token.cancel()
+            token.cancel()
+
+        self.assertTrue(token.cancelled)
+        callback.assert_called_once_with()
+
+    def test_cancel_ignores_unregistered_callbacks(self):
+        token = CancellationToken()
+        callback = MagicMock()
+
+        with token.register(callback):
+            pass
+
+        token.cancel()
+
+        self.assertFalse(callback.called)
+
+    def test_register_when_cancelled(self):
+        token = CancellationToken()
+        token.cancel()
+        callback = MagicMock()
+
+        with token.register(callback):
+            callback.assert_called_once_with()
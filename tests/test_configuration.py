@@ -4,6 +4,12 @@ Test the configuration parser.
 
 from __future__ import print_function
 
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
 from unittest import TestCase
 from contextlib import contextmanager
 from voluptuous import (
@@ -16,8 +22,15 @@ from mock import (
     MagicMock,
 )
 
+import plix
 import plix.configuration
 
+from plix.executors import (
+    SessionShellExecutor,
+    ShellExecutor,
+)
+from plix.templates import get_template
+
 
 class ConfigurationTests(TestCase):
     def test_load_from_stream(self):
@@ -53,6 +66,175 @@ class ConfigurationTests(TestCase):
             loaded_conf['script'],
         )
 
+    def test_load_from_stream_returns_unicode_strings(self):
+        loaded_conf = plix.configuration.load_from_stream(
+            stream=StringIO(u"script: alpha"),
+        )
+
+        self.assertIsInstance(loaded_conf['script'][0], type(u''))
+
+    def test_load_from_file_with_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(
+            directory=os.path.join(directory, 'cache'),
+        )
+
+        with open(filename, 'w') as stream:
+            stream.write(u"script: alpha\n")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['alpha'], loaded_conf['script'])
+        self.assertEqual(1, len(cache.entries()))
+
+        with patch('plix.configuration.normalize') as normalize:
+            cached_conf = plix.configuration.load_from_file(
+                filename,
+                cache=cache,
+            )
+
+        self.assertFalse(normalize.called)
+        self.assertEqual(['alpha'], cached_conf['script'])
+        self.assertIsInstance(cached_conf['executor'], ShellExecutor)
+
+        # Changing the file invalidates the cached configuration.
+        with open(filename, 'w') as stream:
+            stream.write(u"script: beta\n")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['beta'], loaded_conf['script'])
+
+    def test_load_from_file_with_invalid_cache_entry(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+
+        with open(filename, 'wb') as stream:
+            stream.write(b"script: alpha\n")
+
+        key = cache.get_key(b"script: alpha\n")
+        os.makedirs(os.path.dirname(cache.get_path(key)))
+
+        with open(cache.get_path(key), 'wb') as stream:
+            stream.write(b"garbage")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['alpha'], loaded_conf['script'])
+
+    def test_configuration_cache_key_depends_on_version(self):
+        key = plix.configuration.ConfigurationCache.get_key(b"script: a")
+
+        with patch('plix.configuration.__version__', '0.0.0'):
+            self.assertNotEqual(
+                key,
+                plix.configuration.ConfigurationCache.get_key(b"script: a"),
+            )
+
+    def test_load_from_file_with_unwritable_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+        cache.put = MagicMock(side_effect=OSError(13, "Permission denied"))
+
+        with open(filename, 'wb') as stream:
+            stream.write(b"script: alpha\n")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['alpha'], loaded_conf['script'])
+
+    def test_load_from_file_with_failing_cache_eviction(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+        cache.evict = MagicMock(side_effect=OSError(13, "Permission denied"))
+
+        with open(filename, 'wb') as stream:
+            stream.write(b"script: alpha\n")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['alpha'], loaded_conf['script'])
+
+    def test_configuration_cache_stores_json(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+
+        with open(filename, 'wb') as stream:
+            stream.write(
+                b"executor:\n"
+                b"  name: plix.executors.SessionShellExecutor\n"
+                b"  options:\n"
+                b"    shell: /bin/sh\n"
+                b"script: alpha\n",
+            )
+
+        plix.configuration.load_from_file(filename, cache=cache)
+
+        with open(cache.entries()[0][1], 'rb') as stream:
+            document = json.loads(stream.read().decode('utf-8'))
+
+        self.assertEqual(
+            {
+                'name': 'plix.executors.SessionShellExecutor',
+                'options': {'shell': '/bin/sh'},
+            },
+            document['executor'],
+        )
+
+        cached_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertIsInstance(
+            cached_conf['executor'],
+            SessionShellExecutor,
+        )
+        self.assertEqual(
+            {'shell': '/bin/sh'},
+            cached_conf['executor'].options,
+        )
+
+    def test_configuration_cache_ignores_pickles(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+
+        with open(filename, 'wb') as stream:
+            stream.write(b"script: alpha\n")
+
+        key = cache.get_key(b"script: alpha\n")
+        os.makedirs(os.path.dirname(cache.get_path(key)))
+
+        with open(cache.get_path(key), 'wb') as stream:
+            stream.write(pickle.dumps(MagicMock))
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual(['alpha'], loaded_conf['script'])
+
+    def test_load_from_file_does_not_cache_inexact_configurations(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'plix.yml')
+        cache = plix.configuration.ConfigurationCache(directory=directory)
+
+        with open(filename, 'wb') as stream:
+            stream.write(b"global:\n  1: alpha\n")
+
+        loaded_conf = plix.configuration.load_from_file(filename, cache=cache)
+
+        self.assertEqual({1: 'alpha'}, loaded_conf['global'])
+        self.assertEqual([], cache.entries())
+
     def test_command_or_command_list_with_strings(self):
         value = "hello"
         self.assertEqual(
@@ -86,6 +268,124 @@ class ConfigurationTests(TestCase):
         with self.assertRaises(ValueError):
             plix.configuration.command_or_command_list(None)
 
+    def test_normalize_rejects_invalid_command_templates(self):
+        for command in ["echo ${#HOME}", "docker inspect -f '{{.Id}}'"]:
+            with self.assertRaises(MultipleInvalid) as context:
+                plix.configuration.normalize({'script': ['true', command]})
+
+            self.assertIn(repr(command), str(context.exception))
+            self.assertIn("{% raw %}", str(context.exception))
+
+    def test_normalize_accepts_raw_command_templates(self):
+        command = "echo {% raw %}${#HOME} {{.Id}}{% endraw %}"
+        configuration = plix.configuration.normalize({'script': command})
+
+        self.assertEqual(
+            "echo ${#HOME} {{.Id}}",
+            get_template(configuration['script'][0]).render(frozenset()),
+        )
+
+    def test_exclusion_list_with_dict(self):
+        value = {'a': 1, 'b': [2, 3]}
+        self.assertEqual(
+            [{'a': [1], 'b': [2, 3]}],
+            plix.configuration.exclusion_list(value),
+        )
+
+    def test_exclusion_list_with_list(self):
+        value = [{'a': 1}, {'b': (2, 3)}]
+        self.assertEqual(
+            [{'a': [1]}, {'b': [2, 3]}],
+            plix.configuration.exclusion_list(value),
+        )
+
+    def test_exclusion_list_with_string(self):
+        with self.assertRaises(ValueError):
+            plix.configuration.exclusion_list("a")
+
+    def test_exclusion_list_with_list_of_strings(self):
+        with self.assertRaises(ValueError):
+            plix.configuration.exclusion_list(["a"])
+
+    def test_cache_settings_defaults(self):
+        settings = plix.configuration.cache_settings(None)
+
+        self.assertEqual([], settings['inputs'])
+        self.assertEqual([], settings['environment'])
+        self.assertEqual(1000, settings['max_entries'])
+
+    def test_cache_settings(self):
+        settings = plix.configuration.cache_settings({
+            'inputs': 'src/*.c',
+            'environment': ['CC', 'CFLAGS'],
+            'max_age': 60,
+        })
+
+        self.assertEqual(['src/*.c'], settings['inputs'])
+        self.assertEqual(['CC', 'CFLAGS'], settings['environment'])
+        self.assertEqual(60.0, settings['max_age'])
+
+    def test_cache_settings_with_invalid_values(self):
+        with self.assertRaises(MultipleInvalid):
+            plix.configuration.cache_settings({'max_entries': 0})
+
+    def test_normalize_does_not_share_defaults(self):
+        first = plix.configuration.normalize({})
+        second = plix.configuration.normalize({})
+
+        self.assertEqual(first['cache'], second['cache'])
+        self.assertIsNot(first['script'], second['script'])
+        self.assertIsNot(first['executor'], second['executor'])
+        self.assertIsNot(first['cache'], second['cache'])
+
+    def test_normalize_all(self):
+        configurations = plix.configuration.normalize_all(
+            iter([{'script': 'alpha'}, {'script': ['beta']}]),
+        )
+
+        self.assertEqual(
+            [['alpha'], ['beta']],
+            [configuration['script'] for configuration in configurations],
+        )
+
+    def test_normalize_all_reports_the_invalid_configuration(self):
+        with self.assertRaises(MultipleInvalid) as ex:
+            plix.configuration.normalize_all([{}, {'script': 1.5}])
+
+        self.assertEqual([1, 'script'], ex.exception.path)
+
+    def test_get_executor_class(self):
+        get_executor_class = plix.configuration.get_executor_class
+
+        self.assertIs(
+            ShellExecutor,
+            get_executor_class('plix.executors.ShellExecutor'),
+        )
+
+        with patch('plix.configuration.__import__', create=True) as import_:
+            self.assertIs(
+                ShellExecutor,
+                get_executor_class('plix.executors.ShellExecutor'),
+            )
+
+        self.assertFalse(import_.called)
+
+    def test_get_executor_class_honors_replaced_modules(self):
+        get_executor_class = plix.configuration.get_executor_class
+        my_module = MagicMock()
+        get_executor_class('plix.executors.ShellExecutor')
+
+        with patch.dict('sys.modules', {'plix.executors': my_module}):
+            self.assertIs(
+                my_module.ShellExecutor,
+                get_executor_class('plix.executors.ShellExecutor'),
+            )
+
+        self.assertIs(
+            ShellExecutor,
+            get_executor_class('plix.executors.ShellExecutor'),
+        )
+
     def test_normalize_with_appropriate_configuration(self):
         conf = {
             'matrix': {
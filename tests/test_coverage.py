@@ -0,0 +1,120 @@
+"""
+Test covering arrays.
+"""
+
+from itertools import combinations
+from unittest import TestCase
+
+from plix.coverage import generate_covering_variants
+from plix.matrix import generate_variants
+
+
+class CoverageTests(TestCase):
+    def assertCovers(self, variants, matrix, strength, **kwargs):
+        all_variants = set(generate_variants(matrix=matrix, **kwargs))
+
+        self.assertEqual(len(variants), len(set(variants)))
+        self.assertLessEqual(set(variants), all_variants)
+
+        for keys in combinations(sorted(matrix), strength):
+            self.assertEqual(
+                {
+                    tuple(dict(variant)[key] for key in keys)
+                    for variant in all_variants
+                },
+                {
+                    tuple(dict(variant)[key] for key in keys)
+                    for variant in variants
+                },
+            )
+
+    def test_generate_covering_variants(self):
+        matrix = {
+            'key{}'.format(index): [1, 2, 3]
+            for index in range(4)
+        }
+        variants = list(generate_covering_variants(matrix=matrix))
+
+        self.assertCovers(variants, matrix, 2)
+        self.assertLessEqual(len(variants), 12)
+
+    def test_generate_covering_variants_with_strength(self):
+        matrix = {
+            'key{}'.format(index): [1, 2]
+            for index in range(6)
+        }
+        variants = list(generate_covering_variants(matrix=matrix, strength=3))
+
+        self.assertCovers(variants, matrix, 3)
+        self.assertLess(len(variants), 2 ** 6)
+
+    def test_generate_covering_variants_with_high_strength(self):
+        matrix = {
+            'a': [1, 2],
+            'b': [3, 4],
+        }
+
+        self.assertEqual(
+            list(generate_variants(matrix=matrix)),
+            list(generate_covering_variants(matrix=matrix, strength=3)),
+        )
+
+    def test_generate_covering_variants_with_empty_matrix(self):
+        self.assertEqual(
+            [frozenset()],
+            list(generate_covering_variants(matrix={})),
+        )
+
+    def test_generate_covering_variants_with_invalid_strength(self):
+        with self.assertRaises(ValueError):
+            list(generate_covering_variants(matrix={'a': [1]}, strength=0))
+
+    def test_generate_covering_variants_with_exclusions(self):
+        matrix = {
+            'a': [1, 2, 3],
+            'b': [1, 2],
+            'c': [1, 2, 3],
+            'd': [1, 2],
+        }
+        exclusions = [
+            {'a': [1], 'b': [1]},
+            {'c': [2, 3], 'd': [2]},
+            {'a': [3], 'c': [1], 'd': [1]},
+            {'e': [1]},
+        ]
+        variants = list(generate_covering_variants(
+            matrix=matrix,
+            exclusions=exclusions,
+        ))
+
+        self.assertCovers(variants, matrix, 2, exclusions=exclusions)
+
+    def test_generate_covering_variants_with_subset_pairs(self):
+        matrix = {
+            'a': [1, 2, 3],
+            'b': [1, 2],
+            'c': [1, 2, 3],
+        }
+        exclusions = [{'a': [1], 'c': [1]}]
+        variants = list(generate_covering_variants(
+            matrix=matrix,
+            subset_pairs={('a', 1)},
+            exclusions=exclusions,
+        ))
+
+        self.assertCovers(
+            variants,
+            matrix,
+            2,
+            subset_pairs={('a', 1)},
+            exclusions=exclusions,
+        )
+
+    def test_generate_covering_variants_with_unknown_subset_pairs(self):
+        self.assertEqual(
+            [],
+            list(generate_covering_variants(
+                matrix={'a': [1, 2], 'b': [1, 2], 'c': [1, 2]},
+                subset_pairs={('d', 1)},
+            )),
+        )
@@ -4,6 +4,7 @@ Test the displays.
 
 from __future__ import unicode_literals
 
+from io import BytesIO
 from unittest import TestCase
 from mock import (
     MagicMock,
@@ -15,7 +16,9 @@ from chromalog.colorizer import GenericColorizer
 from plix.displays import (
     BaseDisplay,
     StreamDisplay,
+    RecordingDisplay,
 )
+from plix.statistics import Statistics
 
 
 class DisplaysTests(TestCase):
@@ -37,8 +40,381 @@ class DisplaysTests(TestCase):
             index=42,
             command="my command",
             returncode=1234,
+            statistics=None,
         )
 
+    def test_base_display_variant_context_manager(self):
+        class MyDisplay(BaseDisplay):
+            start_variant = MagicMock()
+            stop_variant = MagicMock()
+
+        display = MyDisplay()
+        variant = frozenset({('a', 1)})
+
+        with display.variant(variant) as result:
+            result.success = True
+
+        display.start_variant.assert_called_once_with(variant=variant)
+        display.stop_variant.assert_called_once_with(
+            variant=variant,
+            success=True,
+            statistics=None,
+        )
+
+    def test_base_display_setup_and_phase_context_managers(self):
+        class MyDisplay(BaseDisplay):
+            start_setup = MagicMock()
+            stop_setup = MagicMock()
+            start_phase = MagicMock()
+            stop_phase = MagicMock()
+
+        display = MyDisplay()
+        pairs = frozenset({('a', 1)})
+
+        with display.setup(pairs) as result:
+            with display.phase('install') as phase_result:
+                phase_result.success = True
+
+            result.success = True
+
+        display.start_setup.assert_called_once_with(pairs=pairs)
+        display.stop_setup.assert_called_once_with(
+            pairs=pairs,
+            success=True,
+            statistics=None,
+        )
+        display.start_phase.assert_called_once_with(phase='install')
+        display.stop_phase.assert_called_once_with(
+            phase='install',
+            success=True,
+            statistics=None,
+        )
+
+    def test_base_display_variant_hooks_do_nothing(self):
+        display = BaseDisplay()
+        display.cached_variant(variant=frozenset())
+
+        with display.setup(frozenset()) as result:
+            with display.phase('install'):
+                result.success = False
+
+        with display.variant(frozenset()) as result:
+            result.success = False
+
+        display.shared_variant(
+            variant=frozenset(),
+            reference=frozenset(),
+            success=False,
+        )
+
+    def test_recording_display_replay(self):
+        recording = RecordingDisplay()
+        recording.set_context(commands=["my command"])
+
+        with recording.command(0, "my command") as result:
+            recording.command_output(0, b"DATA")
+            result.returncode = 0
+
+        display = MagicMock()
+        recording.replay(display)
+
+        self.assertEqual(
+            [
+                call.set_context(commands=["my command"]),
+                call.start_command(index=0, command="my command"),
+                call.command_output(0, b"DATA"),
+                call.stop_command(
+                    index=0,
+                    command="my command",
+                    returncode=0,
+                    statistics=None,
+                ),
+            ],
+            display.mock_calls,
+        )
+
+    def test_recording_display_replay_phases(self):
+        recording = RecordingDisplay()
+
+        for phase in ['script', 'after_script']:
+            with recording.phase(phase) as phase_result:
+                with recording.command(0, "my command") as result:
+                    recording.command_output(0, phase.encode('utf-8'))
+                    result.returncode = 0
+
+                phase_result.success = True
+
+        display = MagicMock()
+        recording.replay(display)
+        recording.close()
+
+        self.assertEqual(
+            [
+                call.start_phase(phase='script'),
+                call.start_command(index=0, command="my command"),
+                call.command_output(0, b"script"),
+                call.stop_command(
+                    index=0,
+                    command="my command",
+                    returncode=0,
+                    statistics=None,
+                ),
+                call.stop_phase(phase='script', success=True, statistics=None),
+                call.start_phase(phase='after_script'),
+                call.start_command(index=0, command="my command"),
+                call.command_output(0, b"after_script"),
+                call.stop_command(
+                    index=0,
+                    command="my command",
+                    returncode=0,
+                    statistics=None,
+                ),
+                call.stop_phase(
+                    phase='after_script',
+                    success=True,
+                    statistics=None,
+                ),
+            ],
+            display.mock_calls,
+        )
+
+    def test_stream_display_setup_and_phases(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+
+        with display.setup(frozenset({('a', 1)})) as result:
+            with display.phase('install'):
+                pass
+
+            result.success = True
+            result.statistics = Statistics(wall_time=1.5)
+
+        with display.setup(frozenset()) as result:
+            result.success = False
+
+        self.assertEqual(
+            [
+                call("setup for a=1\n"),
+                call("[install]\n"),
+                call("setup for a=1\t[success] (1.500s wall, 0 B output)\n"),
+                call("setup\n"),
+                call("setup\t[failed]\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_phase_statistics(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+
+        with display.phase('install') as result:
+            result.success = True
+            result.statistics = Statistics(wall_time=1.5)
+
+        with display.phase('script') as result:
+            result.success = False
+
+        self.assertEqual(
+            [
+                call("[install]\n"),
+                call("[install]\t[success] (1.500s wall, 0 B output)\n"),
+                call("[script]\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_variant(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+
+        with display.variant(frozenset({('b', 2), ('a', 1)})):
+            pass
+
+        with display.variant(frozenset()):
+            pass
+
+        self.assertEqual(
+            [
+                call("a=1, b=2\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_shared_variant(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.shared_variant(
+            variant=frozenset({('a', 1), ('b', 2)}),
+            reference=frozenset({('a', 1), ('b', 1)}),
+            success=True,
+        )
+
+        self.assertEqual(
+            [
+                call("a=1, b=2\t[success] (same as a=1, b=1)\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_statistics(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.set_context(commands=["my command"])
+        statistics = Statistics(wall_time=1.5, output_size=4)
+
+        with display.variant(frozenset({('a', 1)})) as variant_result:
+            with display.command(0, "my command") as result:
+                display.command_output(0, b"DATA")
+                result.returncode = 0
+                result.statistics = statistics
+
+            variant_result.success = True
+            variant_result.statistics = statistics
+
+        self.assertEqual(
+            [
+                call("a=1\n"),
+                call("1) my command"),
+                call("\t[success] (1.500s wall, 4 B output)\n"),
+                call("a=1\t[success] (1.500s wall, 4 B output)\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_statistics_without_variant(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.stop_variant(
+            variant=frozenset(),
+            success=False,
+            statistics=Statistics(wall_time=1.5),
+        )
+
+        self.assertEqual(
+            [
+                call("total\t[failed] (1.500s wall, 0 B output)\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_cached_variant(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.cached_variant(variant=frozenset({('a', 1)}))
+        display.cached_variant(
+            variant=frozenset(),
+            statistics=Statistics(wall_time=1.5),
+        )
+
+        self.assertEqual(
+            [
+                call("a=1\t[cached]\n"),
+                call("total\t[cached] (1.500s wall, 0 B output)\n"),
+            ],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_skipped_variant(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.skipped_variant(variant=frozenset({('a', 1)}))
+
+        self.assertEqual(
+            [call("a=1\t[skipped]\n")],
+            stream.write.mock_calls,
+        )
+
+    def test_stream_display_tail(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream, tail_size=4)
+        display.set_context(commands=["my command"])
+
+        with display.command(0, "my command") as result:
+            display.command_output(0, b"0123456789")
+            result.returncode = 1
+
+        self.assertEqual(
+            [
+                call("1) my command"),
+                call("\t[failed]\n"),
+                call("[6 byte(s) of output omitted]\n"),
+                call("1) Command exited with 1\n"),
+            ],
+            stream.write.mock_calls,
+        )
+        stream.buffer.write.assert_called_once_with(b"6789")
+
+    def test_stream_display_spilled_output(self):
+        stream = MagicMock()
+        del stream.isatty
+        stream.buffer = BytesIO()
+        display = StreamDisplay(stream=stream, spill_threshold=4)
+        display.set_context(commands=["my command"])
+
+        with display.command(0, "my command") as result:
+            display.command_output(0, b"0123456789")
+            display.command_output(0, b"abc")
+            result.returncode = 1
+
+        self.assertEqual(b"0123456789abc", stream.buffer.getvalue())
+
+    def test_stream_display_discards_successful_output(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+        display.set_context(commands=["my command"])
+
+        with display.command(0, "my command") as result:
+            display.command_output(0, b"0123456789")
+            result.returncode = 0
+
+        self.assertEqual({}, display.output_map)
+        self.assertEqual([], stream.buffer.write.mock_calls)
+
+    def test_recording_display_replay_spilled_output(self):
+        recording = RecordingDisplay(spill_threshold=4)
+        recording.set_context(commands=["my command"])
+
+        with recording.command(0, "my command") as result:
+            recording.command_output(0, b"0123")
+            recording.command_output(0, b"4567")
+            result.returncode = 0
+
+        display = MagicMock()
+        recording.replay(display)
+        recording.close()
+
+        self.assertEqual(
+            [
+                call.set_context(commands=["my command"]),
+                call.start_command(index=0, command="my command"),
+                call.command_output(0, b"01234567"),
+                call.stop_command(
+                    index=0,
+                    command="my command",
+                    returncode=0,
+                    statistics=None,
+                ),
+            ],
+            display.mock_calls,
+        )
+
+    def test_stream_display_without_commands(self):
+        stream = MagicMock()
+        display = StreamDisplay(stream=stream)
+        display.set_context(commands=[])
+
+        self.assertEqual(0, display.longest_len)
+
     def test_stream_display_py2_no_color(self):
         stream = MagicMock()
         del stream.isatty
@@ -149,3 +525,53 @@ class DisplaysTests(TestCase):
             AnsiToWin32().stream.write.mock_calls,
         )
         stream.buffer.write.assert_called_once_with(data)
+
+    def test_stream_display_flush(self):
+        writes = []
+        stream = MagicMock()
+        del stream.isatty
+        stream.write.side_effect = writes.append
+        display = StreamDisplay(stream=stream, queue_size=1024)
+        self.addCleanup(display.close)
+        display.start_variant(variant=frozenset({('a', '1')}))
+        display.flush()
+
+        self.assertNotEqual([], writes)
+
+    def test_stream_display_queued_writes(self):
+        writes = []
+        stream = MagicMock()
+        del stream.isatty
+        stream.write.side_effect = writes.append
+        stream.buffer.write.side_effect = writes.append
+        display = StreamDisplay(stream=stream, queue_size=1024)
+        display.set_context(commands=["my command"])
+
+        with display.command(0, "my command") as result:
+            display.command_output(0, b"DATA")
+            result.returncode = 1
+
+        display.close()
+
+        self.assertEqual(
+            "".join([
+                "1) my command\t[failed]\n",
+                "DATA",
+                "1) Command exited with 1\n",
+            ]),
+            "".join(
+                write.decode('utf-8') if isinstance(write, bytes) else write
+                for write in writes
+            ),
+        )
+        self.assertIn(b"DATA", writes)
+
+    def test_stream_display_dropped_notice(self):
+        stream = MagicMock()
+        del stream.isatty
+        display = StreamDisplay(stream=stream)
+
+        self.assertEqual(
+            "[3 character(s) of display output dropped]\n",
+            display.format_dropped(3),
+        )
@@ -0,0 +1,312 @@
+"""
+Test the distributed matrix execution.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import threading
+import yaml
+import zmq
+
+from unittest import TestCase
+from mock import (
+    call,
+    MagicMock,
+)
+
+from plix.distributed import (
+    Broker,
+    DistributedRunner,
+    RemoteDisplay,
+    Worker,
+    dumps,
+    loads,
+)
+from plix.executors import ShellExecutor
+from plix.planning import Job
+from plix.statistics import Statistics
+
+from .common import MockDisplay
+
+
+class DistributedTests(TestCase):
+    def setUp(self):
+        self.context = zmq.Context()
+        self.broker = Broker(
+            endpoint='tcp://127.0.0.1:*',
+            context=self.context,
+            heartbeat_timeout=0.5,
+        )
+
+    def tearDown(self):
+        self.broker.close()
+        self.context.term()
+
+    def start_workers(self, count):
+        counts = []
+
+        def work():
+            worker = Worker(
+                endpoint=self.broker.endpoint,
+                context=self.context,
+                environment=dict(os.environ, BASE='base'),
+                heartbeat_interval=0.05,
+            )
+
+            try:
+                counts.append(worker.run())
+            finally:
+                worker.close()
+
+        threads = [threading.Thread(target=work) for _ in range(count)]
+
+        for thread in threads:
+            thread.start()
+
+        return threads, counts
+
+    def test_dumps_and_loads(self):
+        self.assertEqual(['a', {'b': 1}], loads(dumps(['a', {'b': 1}])))
+
+    def test_remote_display(self):
+        socket = MagicMock()
+        display = RemoteDisplay(socket=socket)
+        display.start_phase(phase='script')
+        display.set_context(commands=['a'])
+        display.start_command(index=0, command='a')
+        display.command_output(0, memoryview(b'data'))
+        statistics = Statistics(wall_time=1.5, output_size=4)
+        display.stop_command(
+            index=0,
+            command='a',
+            returncode=0,
+            statistics=statistics,
+        )
+
+        display.stop_phase(phase='script', success=True)
+
+        self.assertEqual(
+            [
+                call([b'call', dumps(['start_phase', {'phase': 'script'}])]),
+                call([b'call', dumps(['set_context', {'commands': ['a']}])]),
+                call([
+                    b'call',
+                    dumps(['start_command', {'index': 0, 'command': 'a'}]),
+                ]),
+                call([b'output', b'0', b'data']),
+                call([
+                    b'call',
+                    dumps([
+                        'stop_command',
+                        {
+                            'index': 0,
+                            'command': 'a',
+                            'returncode': 0,
+                            'statistics': statistics.to_dict(),
+                        },
+                    ]),
+                ]),
+                call([
+                    b'call',
+                    dumps([
+                        'stop_phase',
+                        {
+                            'phase': 'script',
+                            'success': True,
+                            'statistics': None,
+                        },
+                    ]),
+                ]),
+            ],
+            socket.send_multipart.mock_calls,
+        )
+
+    def test_serialize(self):
+        runner = DistributedRunner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {'G': 1},
+            },
+            display=MockDisplay(),
+            broker=self.broker,
+        )
+        job = Job(
+            variants=[frozenset({('a', 1)})],
+            phases=[('install', []), ('script', ['echo 1'])],
+        )
+
+        self.assertEqual(
+            {
+                'configuration': {
+                    'executor': 'plix.executors.ShellExecutor',
+                    'global': {'G': 1},
+                },
+                'pairs': [['a', 1]],
+                'phases': [['install', []], ['script', ['echo 1']]],
+            },
+            yaml.safe_load(runner.serialize(job)),
+        )
+
+    def test_distributed_run(self):
+        display = MockDisplay()
+        runner = DistributedRunner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {'G': 'g'},
+                'script': [
+                    'echo $BASE $G $A',
+                    'test {{A}} != 2',
+                ],
+            },
+            display=display,
+            broker=self.broker,
+        )
+        variants = [frozenset({('A', index)}) for index in range(4)]
+        threads, counts = self.start_workers(2)
+        results = runner.run(variants)
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4, sum(counts))
+        self.assertEqual(
+            [
+                (variants[0], True),
+                (variants[1], True),
+                (variants[2], False),
+                (variants[3], True),
+            ],
+            results,
+        )
+        self.assertEqual(
+            [
+                call(0, 'base g {}\n'.format(index).encode('utf-8'))
+                for index in range(4)
+            ],
+            display.command_output.mock_calls,
+        )
+        self.assertEqual(
+            [
+                call(index=1, command='test {} != 2'.format(index))
+                for index in range(4)
+            ],
+            display.start_command.mock_calls[1::2],
+        )
+
+        for _, _, kwargs in display.stop_command.mock_calls:
+            self.assertIsInstance(kwargs['statistics'], Statistics)
+
+        self.assertEqual(
+            [
+                len('base g {}\n'.format(index))
+                for index in range(4)
+            ],
+            [
+                kwargs['statistics'].output_size
+                for _, _, kwargs in display.stop_variant.mock_calls
+            ],
+        )
+
+    def test_distributed_run_fail_fast(self):
+        display = MockDisplay()
+        runner = DistributedRunner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {},
+                'script': ['test {{A}} != 0'],
+            },
+            display=display,
+            broker=self.broker,
+            fail_fast=True,
+        )
+        variants = [frozenset({('A', index)}) for index in range(3)]
+        threads, counts = self.start_workers(1)
+        results = runner.run(variants)
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([1], counts)
+        self.assertEqual(
+            [
+                (variants[0], False),
+                (variants[1], None),
+                (variants[2], None),
+            ],
+            results,
+        )
+        self.assertEqual(
+            [call(variant=variants[1]), call(variant=variants[2])],
+            display.skipped_variant.mock_calls,
+        )
+
+    def test_worker_closes_executors(self):
+        worker = Worker(endpoint=self.broker.endpoint, context=self.context)
+        executor = MagicMock()
+        worker.configurations['key'] = {'executor': executor}
+        worker.close()
+
+        executor.close.assert_called_once_with()
+
+    def test_worker_reports_execution_errors(self):
+        display = MockDisplay()
+        runner = DistributedRunner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {},
+                'script': ['{{A}}'],
+            },
+            display=display,
+            broker=self.broker,
+        )
+        runner.serialize = MagicMock(return_value=b'[invalid')
+        threads, counts = self.start_workers(1)
+        results = runner.run([frozenset({('A', 'true')})])
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([(frozenset({('A', 'true')}), False)], results)
+
+    def test_distributed_run_hands_jobs_of_lost_workers_again(self):
+        display = MockDisplay()
+        runner = DistributedRunner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {},
+                'script': ['sleep 0.6; echo {{A}}'],
+            },
+            display=display,
+            broker=self.broker,
+        )
+        variants = [frozenset({('A', index)}) for index in range(2)]
+        workers = []
+
+        def work_and_die():
+            # This worker takes a job, and never completes it nor sends
+            # heartbeats.
+            socket = self.context.socket(zmq.DEALER)
+            socket.connect(self.broker.endpoint)
+            socket.send_multipart([b'ready'])
+            socket.recv_multipart()
+            socket.close(linger=0)
+            workers.append(self.start_workers(1))
+
+        thread = threading.Thread(target=work_and_die)
+        thread.start()
+        results = runner.run(variants)
+        thread.join()
+
+        for thread in workers[0][0]:
+            thread.join()
+
+        self.assertEqual([2], workers[0][1])
+        self.assertEqual(
+            [(variants[0], True), (variants[1], True)],
+            results,
+        )
+        self.assertEqual(
+            [call(0, b'0\n'), call(0, b'1\n')],
+            display.command_output.mock_calls,
+        )
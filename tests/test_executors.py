@@ -2,22 +2,42 @@
 Test executors logic.
 """
 
+import os
+import pickle
+import threading
+import time
 import yaml
 
-from unittest import TestCase
+from unittest import (
+    TestCase,
+    skipIf,
+)
 from voluptuous import Schema
 from six import StringIO
 
 from mock import (
+    ANY,
     patch,
     call,
     MagicMock,
 )
 
+from io import BytesIO
+from voluptuous import MultipleInvalid
+
+from plix.cancellation import CancellationToken
 from plix.executors import (
+    HAS_POSIX_SPAWN,
     BaseExecutor,
+    ExitStatus,
+    PythonExecutor,
+    SessionShellExecutor,
     ShellExecutor,
+    ShellSession,
+    get_exit_code,
+    pump,
 )
+from plix.statistics import Statistics
 
 from .common import MockDisplay
 
@@ -115,7 +135,10 @@ class ExecutorsTests(TestCase):
 
             return process
 
-        with patch('subprocess.Popen', side_effect=Popen):
+        usage = MagicMock(ru_utime=1.5, ru_stime=0.5, ru_maxrss=2)
+
+        with patch('subprocess.Popen', side_effect=Popen), \
+                patch('os.wait4', return_value=(42, 0, usage)):
             executor.execute(
                 environment=environment,
                 commands=commands,
@@ -132,8 +155,18 @@ class ExecutorsTests(TestCase):
         self.assertEqual(
             display.stop_command.mock_calls,
             [
-                call(index=0, command="alpha", returncode=0),
-                call(index=1, command="beta", returncode=0),
+                call(
+                    index=0,
+                    command="alpha",
+                    returncode=0,
+                    statistics=ANY,
+                ),
+                call(
+                    index=1,
+                    command="beta",
+                    returncode=0,
+                    statistics=ANY,
+                ),
             ],
         )
         self.assertEqual(
@@ -143,3 +176,593 @@ class ExecutorsTests(TestCase):
                 call(1, "beta"),
             ],
         )
+
+    def test_base_executors_report_statistics(self):
+        class MyExecutor(BaseExecutor):
+            def execute_one(self, environment, command, output):
+                output(b'data')
+
+                if command == 'a':
+                    return 0
+
+                return ExitStatus(
+                    returncode=0,
+                    user_time=1.0,
+                    system_time=0.5,
+                    max_rss=1024,
+                )
+
+        display = MockDisplay()
+        statistics = Statistics()
+        MyExecutor().execute(
+            environment={},
+            commands=['a', 'b'],
+            display=display,
+            statistics=statistics,
+        )
+        first, second = [
+            kwargs['statistics']
+            for _, _, kwargs in display.stop_command.mock_calls
+        ]
+
+        self.assertEqual(4, first.output_size)
+        self.assertIsNone(first.user_time)
+        self.assertIsNone(first.max_rss)
+        self.assertEqual(4, second.output_size)
+        self.assertEqual(1.0, second.user_time)
+        self.assertEqual(0.5, second.system_time)
+        self.assertEqual(1024, second.max_rss)
+        self.assertEqual(8, statistics.output_size)
+        self.assertEqual(1.0, statistics.user_time)
+        self.assertEqual(
+            first.wall_time + second.wall_time,
+            statistics.wall_time,
+        )
+
+    def test_base_executors_convert_memoryviews(self):
+        class MyExecutor(BaseExecutor):
+            def execute_one(self, environment, command, output):
+                output(memoryview(b'data'))
+                output(b'more')
+                return 0
+
+        display = MockDisplay()
+        MyExecutor().execute(
+            environment={},
+            commands=['a'],
+            display=display,
+        )
+
+        self.assertEqual(
+            [
+                call(0, b'data'),
+                call(0, b'more'),
+            ],
+            display.command_output.mock_calls,
+        )
+        self.assertEqual(
+            [bytes, bytes],
+            [
+                type(args[1])
+                for _, args, _ in display.command_output.mock_calls
+            ],
+        )
+
+    def test_base_executors_pass_memoryviews(self):
+        class MyExecutor(BaseExecutor):
+            def execute_one(self, environment, command, output):
+                output(memoryview(b'data'))
+                return 0
+
+        display = MockDisplay()
+        display.accepts_memoryview = True
+        MyExecutor().execute(
+            environment={},
+            commands=['a'],
+            display=display,
+        )
+
+        self.assertIsInstance(
+            display.command_output.mock_calls[0][1][1],
+            memoryview,
+        )
+
+    def test_pump_grows_reads(self):
+        stream = BytesIO(b'x' * 100)
+        chunks = []
+        pump(
+            stream=stream,
+            output=lambda data: chunks.append(data.tobytes()),
+            read_size=8,
+            max_read_size=32,
+        )
+
+        self.assertEqual(b'x' * 100, b''.join(chunks))
+        self.assertEqual(
+            [8, 16, 32, 32, 12],
+            [len(chunk) for chunk in chunks],
+        )
+
+    def test_pump_without_growth(self):
+        stream = BytesIO(b'x' * 20)
+        chunks = []
+        pump(
+            stream=stream,
+            output=lambda data: chunks.append(data.tobytes()),
+            read_size=8,
+        )
+
+        self.assertEqual([8, 8, 4], [len(chunk) for chunk in chunks])
+
+    def test_pump_without_readinto(self):
+        stream = StringIO('x' * 20)
+        chunks = []
+        pump(stream=stream, output=chunks.append, read_size=8)
+
+        self.assertEqual(['x' * 8, 'x' * 8, 'x' * 4], chunks)
+
+    def test_shell_executor_options(self):
+        executor = ShellExecutor(options={
+            'read_size': 16,
+            'max_read_size': 64,
+            'adaptive': False,
+        })
+
+        self.assertEqual(16, executor.options['read_size'])
+
+        with self.assertRaises(MultipleInvalid):
+            ShellExecutor(options={'read_size': 0})
+
+    def test_shell_executor_reads_real_output(self):
+        chunks = []
+        executor = ShellExecutor(options={'read_size': 1})
+        status = executor.execute_one(
+            environment={},
+            command='printf abcdef',
+            output=lambda data: chunks.append(bytes(data)),
+        )
+
+        self.assertEqual(0, status.returncode)
+        self.assertIsNotNone(status.user_time)
+        self.assertGreater(status.max_rss, 0)
+        self.assertEqual(b'abcdef', b''.join(chunks))
+
+    def test_shell_executor_reports_signals(self):
+        executor = ShellExecutor()
+        status = executor.execute_one(
+            environment={},
+            command='kill -9 $$',
+            output=lambda data: None,
+        )
+
+        self.assertEqual(-9, status.returncode)
+
+    def test_shell_executor_launcher_option(self):
+        executor = ShellExecutor(options={'launcher': 'posix_spawn'})
+
+        self.assertEqual('posix_spawn', executor.options['launcher'])
+
+        with self.assertRaises(MultipleInvalid):
+            ShellExecutor(options={'launcher': 'fork'})
+
+    @skipIf(not HAS_POSIX_SPAWN, "os.posix_spawn is not available")
+    def test_shell_executor_posix_spawn(self):
+        chunks = []
+        executor = ShellExecutor(options={'launcher': 'posix_spawn'})
+        status = executor.execute_one(
+            environment={'A': 'a'},
+            command='printf "$A"; printf b >&2; exit 3',
+            output=lambda data: chunks.append(bytes(data)),
+        )
+
+        self.assertEqual(3, status.returncode)
+        self.assertGreater(status.max_rss, 0)
+        self.assertEqual(b'ab', b''.join(chunks))
+
+    @skipIf(not HAS_POSIX_SPAWN, "os.posix_spawn is not available")
+    def test_shell_executor_posix_spawn_reports_signals(self):
+        executor = ShellExecutor(options={'launcher': 'posix_spawn'})
+        status = executor.execute_one(
+            environment={},
+            command='kill -9 $$',
+            output=lambda data: None,
+        )
+
+        self.assertEqual(-9, status.returncode)
+
+    @skipIf(not HAS_POSIX_SPAWN, "os.posix_spawn is not available")
+    def test_shell_executor_posix_spawn_restores_signals(self):
+        results = []
+
+        for launcher in ('popen', 'posix_spawn'):
+            chunks = []
+            executor = ShellExecutor(options={'launcher': launcher})
+            status = executor.execute_one(
+                environment=dict(os.environ),
+                command='yes | head -1',
+                output=lambda data: chunks.append(bytes(data)),
+            )
+            results.append((status.returncode, b''.join(chunks)))
+
+        self.assertEqual([(0, b'y\n'), (0, b'y\n')], results)
+
+    @skipIf(not HAS_POSIX_SPAWN, "os.posix_spawn is not available")
+    def test_shell_executor_posix_spawn_terminates_process_group(self):
+        cancellation = CancellationToken()
+        executor = ShellExecutor(options={'launcher': 'posix_spawn'})
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        status = executor.execute_one(
+            environment={},
+            command='sleep 30 & sleep 30',
+            output=lambda data: None,
+            cancellation=cancellation,
+        )
+
+        self.assertEqual(-15, status.returncode)
+
+    def test_base_executors_stop_when_cancelled(self):
+        class MyExecutor(BaseExecutor):
+            execute_one = MagicMock(return_value=0)
+
+        cancellation = CancellationToken()
+        cancellation.cancel()
+        executor = MyExecutor()
+
+        self.assertFalse(executor.execute(
+            environment={},
+            commands=['a'],
+            display=MockDisplay(),
+            cancellation=cancellation,
+        ))
+        self.assertFalse(executor.execute_one.called)
+
+    def test_shell_executor_terminates_process_group(self):
+        cancellation = CancellationToken()
+        executor = ShellExecutor()
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        status = executor.execute_one(
+            environment={},
+            command='sleep 30 & sleep 30',
+            output=lambda data: None,
+            cancellation=cancellation,
+        )
+
+        self.assertEqual(-15, status.returncode)
+
+    def test_shell_executor_kills_process_group(self):
+        cancellation = CancellationToken(grace_period=0.2)
+        executor = ShellExecutor()
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        status = executor.execute_one(
+            environment={},
+            command="trap '' TERM; sleep 30",
+            output=lambda data: None,
+            cancellation=cancellation,
+        )
+
+        self.assertEqual(-9, status.returncode)
+
+    def test_shell_executor_terminates_process_group_on_interrupt(self):
+        cancellation = CancellationToken()
+        executor = ShellExecutor()
+        processes = []
+        start = executor.start
+
+        def start_process(*args, **kwargs):
+            processes.append(start(*args, **kwargs))
+            return processes[-1]
+
+        with patch.object(executor, 'start', side_effect=start_process), \
+                patch.object(executor, 'wait', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                executor.execute_one(
+                    environment={},
+                    command='sleep 30',
+                    output=lambda data: None,
+                    cancellation=cancellation,
+                )
+
+        self.assertTrue(cancellation.cancelled)
+        self.assertEqual(-15, processes[0].wait())
+        processes[0].stdout.close()
+
+    def test_base_executors_session_does_nothing(self):
+        with BaseExecutor().session(environment={}):
+            pass
+
+    def execute_in_session(self, executor, commands):
+        results = []
+
+        with executor.session(environment=dict(os.environ)):
+            for command in commands:
+                chunks = []
+                returncode = executor.execute_one(
+                    environment=dict(os.environ),
+                    command=command,
+                    output=lambda data: chunks.append(bytes(data)),
+                )
+                results.append((returncode, b''.join(chunks)))
+
+        return results
+
+    def test_session_shell_executor_keeps_state(self):
+        self.assertEqual(
+            [
+                (0, b''),
+                (0, b''),
+                (0, b'bar\n/\n'),
+                (0, b'abc'),
+                (1, b''),
+            ],
+            self.execute_in_session(SessionShellExecutor(), [
+                'cd /',
+                'export FOO=bar',
+                'echo $FOO; pwd',
+                'printf abc',
+                'false',
+            ]),
+        )
+
+    def test_session_shell_executor_restarts_exited_shells(self):
+        self.assertEqual(
+            [(0, b''), (3, b'a\n'), (0, b'\n')],
+            self.execute_in_session(SessionShellExecutor(), [
+                'export FOO=bar',
+                'echo a; exit 3',
+                'echo $FOO',
+            ]),
+        )
+
+    def test_session_shell_executor_commands_dont_read_the_session(self):
+        self.assertEqual(
+            [(0, b''), (0, b'b\n')],
+            self.execute_in_session(SessionShellExecutor(), ['cat', 'echo b']),
+        )
+
+    def test_session_shell_executor_reports_syntax_errors(self):
+        results = self.execute_in_session(
+            SessionShellExecutor(options={'shell': '/bin/sh'}),
+            ['echo "unterminated', 'echo $(', 'echo a \'b\' "c"'],
+        )
+
+        self.assertNotEqual(0, results[0][0])
+        self.assertNotEqual(0, results[1][0])
+        self.assertEqual((0, b'a b c\n'), results[2])
+
+    def test_session_shell_executor_splits_sentinels(self):
+        self.assertEqual(
+            [(0, b'x' * 100), (0, b'y\n')],
+            self.execute_in_session(
+                SessionShellExecutor(options={'read_size': 1}),
+                ['printf %100s "" | tr " " x', 'echo y'],
+            ),
+        )
+
+    def test_session_shell_executor_without_session(self):
+        chunks = []
+        returncode = SessionShellExecutor().execute_one(
+            environment={},
+            command='echo a; false',
+            output=chunks.append,
+        )
+
+        self.assertEqual(1, returncode)
+        self.assertEqual([b'a\n'], chunks)
+
+    def test_session_shell_executor_is_picklable(self):
+        executor = pickle.loads(pickle.dumps(
+            SessionShellExecutor(options={'shell': '/bin/sh'}),
+        ))
+
+        self.assertEqual({'shell': '/bin/sh'}, executor.options)
+        self.assertEqual(
+            [(0, b'a\n')],
+            self.execute_in_session(executor, ['echo a']),
+        )
+
+    def test_session_shell_executor_terminates_process_group(self):
+        cancellation = CancellationToken()
+        executor = SessionShellExecutor()
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        with executor.session(environment={}):
+            returncode = executor.execute_one(
+                environment={},
+                command='sleep 30',
+                output=lambda data: None,
+                cancellation=cancellation,
+            )
+
+        self.assertEqual(-15, returncode)
+
+    def test_session_shell_executor_stops_on_interrupt(self):
+        executor = SessionShellExecutor()
+        start = time.time()
+
+        def output(data):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            with executor.session(environment={}):
+                executor.execute_one(
+                    environment={},
+                    command='seq 100; sleep 30',
+                    output=output,
+                )
+
+        self.assertLess(time.time() - start, 10)
+
+    def test_session_shell_stops_unfinished_commands_on_close(self):
+        shell = ShellSession(environment={}, shell='/bin/sh')
+        start = time.time()
+
+        def output(data):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            shell.execute('seq 100; sleep 30', output=output)
+
+        self.assertEqual(-15, shell.close())
+        self.assertLess(time.time() - start, 10)
+
+    def test_python_executor_options(self):
+        executor = PythonExecutor(options={
+            'preload': ['fractions'],
+            'workers': 2,
+        })
+
+        self.assertEqual(2, executor.size)
+
+        with self.assertRaises(MultipleInvalid):
+            PythonExecutor(options={'workers': 0})
+
+    def test_python_executor_executes_commands(self):
+        executor = PythonExecutor()
+        self.addCleanup(executor.close)
+        results = self.execute_in_session(executor, [
+            'import sys; print("a"); sys.stderr.write("b\\n")',
+            'x = 1',
+            'print(x)',
+            'raise ValueError("c")',
+            'import sys; sys.exit(3)',
+            'print(input())',
+        ])
+
+        self.assertEqual((0, b'a\nb\n'), results[0])
+        self.assertEqual((0, b''), results[1])
+        self.assertEqual((0, b'1\n'), results[2])
+        self.assertEqual(1, results[3][0])
+        self.assertIn(b'ValueError: c', results[3][1])
+        self.assertNotIn(b'worker.py', results[3][1])
+        self.assertEqual((3, b''), results[4])
+        self.assertEqual(1, results[5][0])
+        self.assertIn(b'EOFError', results[5][1])
+
+    def test_python_executor_sets_the_environment(self):
+        executor = PythonExecutor()
+        self.addCleanup(executor.close)
+        chunks = []
+        returncode = executor.execute_one(
+            environment={'A': 'a'},
+            command='import os; print(sorted(os.environ.items()))',
+            output=lambda data: chunks.append(bytes(data)),
+        )
+
+        self.assertEqual(0, returncode)
+        self.assertEqual(b"[('A', 'a')]\n", b''.join(chunks))
+
+    def test_python_executor_preloads_modules(self):
+        executor = PythonExecutor(options={'preload': ['fractions']})
+        self.addCleanup(executor.close)
+
+        self.assertEqual(
+            [(0, b'')],
+            self.execute_in_session(executor, [
+                'import sys; assert "fractions" in sys.modules',
+            ]),
+        )
+
+    def test_python_executor_reuses_workers(self):
+        executor = PythonExecutor(options={'workers': 1})
+        self.addCleanup(executor.close)
+        command = 'import os; print(os.getpid())'
+
+        self.assertEqual(
+            self.execute_in_session(executor, [command]),
+            self.execute_in_session(executor, [command]),
+        )
+        self.assertEqual(1, len(executor.pool))
+
+    def test_python_executor_resets_reused_workers(self):
+        executor = PythonExecutor(options={'workers': 1})
+        self.addCleanup(executor.close)
+        first = self.execute_in_session(executor, [
+            'import os, sys, colorsys; print(os.getpid())',
+            'sys.path.append("a"); x = 1',
+        ])
+        second = self.execute_in_session(executor, [
+            'import os; print(os.getpid())',
+            'import sys; print("colorsys" in sys.modules, "a" in sys.path)',
+            'print(x)',
+        ])
+
+        self.assertEqual(first[0], second[0])
+        self.assertEqual((0, b'False False\n'), second[1])
+        self.assertEqual(1, second[2][0])
+        self.assertIn(b'NameError', second[2][1])
+
+    def test_python_executor_restarts_exited_workers(self):
+        executor = PythonExecutor()
+        self.addCleanup(executor.close)
+
+        self.assertEqual(
+            [(4, b''), (0, b'a\n')],
+            self.execute_in_session(executor, [
+                'import os; os._exit(4)',
+                'print("a")',
+            ]),
+        )
+        self.assertEqual(0, executor.busy)
+
+    def test_python_executor_is_picklable(self):
+        executor = pickle.loads(pickle.dumps(
+            PythonExecutor(options={'workers': 1}),
+        ))
+        self.addCleanup(executor.close)
+
+        self.assertEqual({'workers': 1}, executor.options)
+        self.assertEqual(
+            [(0, b'a\n')],
+            self.execute_in_session(executor, ['print("a")']),
+        )
+
+    def test_python_executor_terminates_process_group(self):
+        cancellation = CancellationToken()
+        executor = PythonExecutor()
+        self.addCleanup(executor.close)
+        timer = threading.Timer(0.2, cancellation.cancel)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        returncode = executor.execute_one(
+            environment={},
+            command='import time; time.sleep(30)',
+            output=lambda data: None,
+            cancellation=cancellation,
+        )
+
+        self.assertEqual(-15, returncode)
+        self.assertEqual(0, executor.busy)
+
+    def test_python_executor_stops_workers_on_interrupt(self):
+        executor = PythonExecutor()
+        self.addCleanup(executor.close)
+        start = time.time()
+
+        def output(data):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            executor.execute_one(
+                environment={},
+                command='import time; print("a" * 100); time.sleep(30)',
+                output=output,
+            )
+
+        self.assertEqual(
+            [(0, b'b\n')],
+            self.execute_in_session(executor, ['print("b")']),
+        )
+        self.assertLess(time.time() - start, 10)
+
+    def test_get_exit_code(self):
+        self.assertEqual(0, get_exit_code(0))
+        self.assertEqual(3, get_exit_code(3 << 8))
+        self.assertEqual(-15, get_exit_code(15))
@@ -0,0 +1,143 @@
+"""
+Test the duration history.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from plix.history import (
+    History,
+    get_job_key,
+)
+from plix.planning import Job
+from plix.statistics import Statistics
+
+
+def make_job(value, commands):
+    return Job(
+        variants=[frozenset({('A', value)})],
+        phases=[('script', commands)],
+    )
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'sub', 'history.json')
+
+    def test_get_job_key(self):
+        self.assertEqual(
+            get_job_key(make_job('1', ['a'])),
+            get_job_key(make_job('1', ['a'])),
+        )
+        self.assertNotEqual(
+            get_job_key(make_job('1', ['a'])),
+            get_job_key(make_job('2', ['a'])),
+        )
+        self.assertNotEqual(
+            get_job_key(make_job('1', ['a'])),
+            get_job_key(make_job('1', ['b'])),
+        )
+
+    def test_record(self):
+        history = History(self.path, smoothing=0.5)
+        job = make_job('1', ['a', 'b'])
+        history.record(job, Statistics(
+            wall_time=3.0,
+            command_times={'a': 1.0, 'b': 2.0},
+        ))
+        history.record(job, Statistics(
+            wall_time=5.0,
+            command_times={'a': 3.0, 'b': 2.0},
+        ))
+
+        self.assertEqual({get_job_key(job): 4.0}, history.jobs)
+        self.assertEqual({'a': 2.0, 'b': 2.0}, history.commands)
+
+    def test_estimate(self):
+        history = History(self.path)
+        history.jobs[get_job_key(make_job('1', ['a']))] = 10.0
+        history.commands.update({'a': 1.0, 'b': 3.0})
+
+        self.assertEqual(10.0, history.estimate(make_job('1', ['a'])))
+        self.assertEqual(4.0, history.estimate(make_job('2', ['a', 'b'])))
+        # Unknown commands take the average duration of the known ones.
+        self.assertEqual(3.0, history.estimate(make_job('2', ['a', 'c'])))
+
+    def test_estimate_empty(self):
+        self.assertEqual(
+            0.0,
+            History(self.path).estimate(make_job('1', ['a'])),
+        )
+
+    def test_schedule(self):
+        history = History(self.path)
+        history.commands.update({'a': 1.0, 'b': 3.0})
+        jobs = [
+            make_job('1', ['a']),
+            make_job('2', ['b']),
+            make_job('3', ['a']),
+        ]
+
+        self.assertEqual(
+            [jobs[1], jobs[0], jobs[2]],
+            history.schedule(jobs),
+        )
+
+    def test_save_and_load(self):
+        history = History(self.path)
+        history.record(make_job('1', ['a']), Statistics(
+            wall_time=1.0,
+            command_times={'a': 1.0},
+        ))
+        history.save()
+        loaded = History(self.path)
+        loaded.load()
+
+        self.assertEqual(history.jobs, loaded.jobs)
+        self.assertEqual(history.commands, loaded.commands)
+        self.assertEqual(history.job_times, loaded.job_times)
+        self.assertEqual(history.command_times, loaded.command_times)
+
+    def test_evict(self):
+        history = History(self.path, max_entries=2, max_age=10)
+        history.jobs.update({'a': 1.0, 'b': 2.0, 'c': 3.0, 'd': 4.0})
+        history.job_times.update({'a': 100, 'b': 95, 'c': 85, 'e': 100})
+        history.commands.update({'x': 1.0})
+
+        self.assertEqual(2, history.evict(now=100))
+        # Durations without a time count as recorded now, and times without
+        # durations are dropped.
+        self.assertEqual({'a': 1.0, 'd': 4.0}, history.jobs)
+        self.assertEqual({'a': 100, 'd': 100}, history.job_times)
+        self.assertEqual({'x': 1.0}, history.commands)
+        self.assertEqual({'x': 100}, history.command_times)
+
+    def test_load_missing(self):
+        history = History(self.path)
+        history.load()
+
+        self.assertEqual({}, history.jobs)
+        self.assertEqual({}, history.commands)
+
+    def test_load_missing_strict(self):
+        with self.assertRaises(ValueError):
+            History(self.path).load(strict=True)
+
+    def test_load_invalid(self):
+        os.makedirs(os.path.dirname(self.path))
+
+        with open(self.path, 'wb') as stream:
+            stream.write(b'not json')
+
+        history = History(self.path)
+        history.load()
+
+        self.assertEqual({}, history.jobs)
+        self.assertEqual({}, history.commands)
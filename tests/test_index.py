@@ -0,0 +1,141 @@
+"""
+Test the variant index.
+"""
+
+from unittest import TestCase
+
+from plix.index import (
+    Filter,
+    VariantIndex,
+    parse_filter,
+)
+from plix.matrix import generate_variants
+
+
+class IndexTests(TestCase):
+    def setUp(self):
+        self.matrix = {
+            'alpha': ['foo', 'bar', 'baz'],
+            'beta': ['one', 'two'],
+        }
+        self.variants = list(generate_variants(matrix=self.matrix))
+        self.index = VariantIndex(self.matrix)
+
+    def find(self, *filters):
+        return [
+            dict(variant)
+            for variant in self.index.find([
+                parse_filter(value) for value in filters
+            ])
+        ]
+
+    def test_parse_filter(self):
+        self.assertEqual(
+            Filter(key='alpha', patterns=('foo',), negated=False),
+            parse_filter('alpha:foo'),
+        )
+        self.assertEqual(
+            Filter(key='alpha', patterns=('foo', 'b*'), negated=True),
+            parse_filter('alpha:!foo,b*'),
+        )
+        self.assertEqual(
+            Filter(key='alpha', patterns=('a:b',), negated=False),
+            parse_filter('alpha:a:b'),
+        )
+
+    def test_parse_invalid_filter(self):
+        with self.assertRaises(ValueError):
+            parse_filter('alpha')
+
+    def test_find_all_variants(self):
+        self.assertEqual(self.variants, list(self.index.find()))
+        self.assertEqual(6, self.index.count())
+
+    def test_find_variants(self):
+        self.assertEqual(
+            [
+                {'alpha': 'foo', 'beta': 'two'},
+            ],
+            self.find('alpha:foo', 'beta:two'),
+        )
+
+    def test_find_variants_with_alternatives(self):
+        self.assertEqual(
+            [
+                {'alpha': 'foo', 'beta': 'one'},
+                {'alpha': 'bar', 'beta': 'one'},
+            ],
+            self.find('alpha:foo,bar', 'beta:one'),
+        )
+
+    def test_find_variants_with_negation(self):
+        self.assertEqual(
+            [
+                {'alpha': 'foo', 'beta': 'one'},
+                {'alpha': 'foo', 'beta': 'two'},
+            ],
+            self.find('alpha:!ba*'),
+        )
+
+    def test_find_variants_with_globs(self):
+        self.assertEqual(
+            [
+                {'alpha': 'bar', 'beta': 'two'},
+                {'alpha': 'baz', 'beta': 'two'},
+            ],
+            self.find('alpha:ba?', 'beta:t*'),
+        )
+
+    def test_find_no_variant(self):
+        self.assertEqual([], self.find('alpha:qux'))
+        self.assertEqual([], self.find('alpha:foo', 'alpha:bar'))
+        self.assertEqual(0, self.index.count([parse_filter('gamma:x')]))
+
+    def test_index_non_string_values(self):
+        index = VariantIndex({'a': [1, 2, 10]})
+
+        self.assertEqual(
+            [frozenset({('a', 1)}), frozenset({('a', 10)})],
+            list(index.find([parse_filter('a:1*')])),
+        )
+
+    def test_find_variants_with_unknown_negated_key(self):
+        self.assertEqual(6, len(self.find('gamma:!x')))
+
+    def test_query(self):
+        self.assertEqual(
+            {'alpha': 0b110, 'beta': 0b01},
+            self.index.query([
+                parse_filter('alpha:ba*'),
+                parse_filter('beta:!two'),
+            ]),
+        )
+        self.assertIsNone(self.index.query([parse_filter('beta:three')]))
+
+    def test_count_does_not_enumerate(self):
+        index = VariantIndex({
+            'key{}'.format(key): list(range(10)) for key in range(12)
+        })
+
+        self.assertEqual(
+            2 * 10 ** 11,
+            index.count([parse_filter('key0:1,2')]),
+        )
+
+    def test_find_variants_with_exclusions(self):
+        exclusions = [{'alpha': ['foo'], 'beta': ['one']}]
+        index = VariantIndex(self.matrix, exclusions=exclusions)
+        filters = [parse_filter('alpha:foo,bar')]
+
+        self.assertEqual(
+            [
+                variant
+                for variant in generate_variants(
+                    matrix=self.matrix,
+                    exclusions=exclusions,
+                )
+                if dict(variant)['alpha'] in ('foo', 'bar')
+            ],
+            list(index.find(filters)),
+        )
+        self.assertEqual(3, index.count(filters))
@@ -2,14 +2,30 @@
 Test the main script.
 """
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
 from unittest import TestCase
 from argparse import Namespace
-from mock import patch
+from mock import (
+    ANY,
+    MagicMock,
+    patch,
+    call,
+)
+from six import StringIO
 
+from plix.index import Filter
 from plix.main import (
     PairsParser,
+    get_cache,
+    get_history,
     parse_args,
     main,
+    report,
 )
 
 from .common import (
@@ -19,24 +35,46 @@ from .common import (
 
 
 class MainTests(TestCase):
-    @patch(
-        'plix.main.load_from_file',
-        return_value={},
-    )
-    def test_parse_args_no_arguments(self, load_from_file_mock):
+    def test_parse_args_no_arguments(self):
         args = parse_args([])
         self.assertFalse(args.debug)
-        self.assertEqual(load_from_file_mock.return_value, args.configuration)
+        self.assertEqual('.plix.yml', args.configuration)
 
     @patch(
-        'plix.main.load_from_file',
+        'plix.configuration.load_from_file',
         side_effect=IOError("No such file"),
     )
-    def test_parse_args_non_existing_file(self, _):
+    def test_main_non_existing_file(self, load_from_file):
         with self.assertRaises(SystemExit) as ex:
-            parse_args(['-c', 'foo.yml'])
+            main(args=['-c', 'foo.yml'], display=MockDisplay())
 
         self.assertEqual(1, ex.exception.code)
+        load_from_file.assert_called_once_with('foo.yml', cache=ANY)
+
+    def test_help_does_not_import_heavy_modules(self):
+        code = (
+            "import sys\n"
+            "from plix.main import main\n"
+            "try:\n"
+            "    main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "sys.stderr.write(' '.join(sorted(sys.modules)))\n"
+        )
+        process = subprocess.Popen(
+            [sys.executable, '-c', code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        _, modules = process.communicate()
+        modules = modules.decode('utf-8').split()
+
+        self.assertEqual(0, process.returncode)
+        self.assertIn('plix.main', modules)
+
+        for module in ['yaml', 'jinja2', 'chromalog', 'voluptuous', 'zmq']:
+            self.assertNotIn(module, modules)
 
     def test_parse_args_pairs(self):
         parser = PairsParser(option_strings=[], dest='pairs')
@@ -55,21 +93,628 @@ class MainTests(TestCase):
         with self.assertRaises(ValueError):
             parser(parser=None, namespace=args, values=['a;1'])
 
+    @patch('plix.main.load_configuration')
     @patch('plix.main.parse_args')
-    def test_main_in_debug_mode(self, parse_args):
+    def test_main_in_debug_mode(self, parse_args, _):
         x = []
 
         parse_args.return_value = Namespace(
             configuration={
                 'executor': PythonExecutor(globals=globals(), locals=locals()),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {},
                 'script': [
                     'x.append(42)',
                     'x.append(123)',
                 ],
             },
+            command='run',
             debug=True,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset(),
         )
 
         main(args=['-d'], display=MockDisplay())
 
         self.assertEqual([42, 123], x)
+
+    def test_parse_args_jobs(self):
+        args = parse_args(['-j', '4'])
+
+        self.assertEqual(4, args.jobs)
+
+    def test_parse_args_deduplicate(self):
+        self.assertFalse(parse_args([]).deduplicate)
+        self.assertTrue(parse_args(['--deduplicate']).deduplicate)
+
+    def test_parse_args_cache(self):
+        args = parse_args([])
+
+        self.assertFalse(args.cache)
+        self.assertEqual('.plix-cache', args.cache_dir)
+
+        args = parse_args(['--cache', '--cache-dir', 'foo'])
+
+        self.assertTrue(args.cache)
+        self.assertEqual('foo', args.cache_dir)
+
+    def test_parse_args_fail_fast(self):
+        self.assertFalse(parse_args([]).fail_fast)
+        self.assertTrue(parse_args(['--fail-fast']).fail_fast)
+
+    def test_parse_args_coverage(self):
+        self.assertIsNone(parse_args([]).coverage)
+        self.assertEqual(2, parse_args(['--coverage', 'pairwise']).coverage)
+        self.assertEqual(3, parse_args(['--coverage', 't=3']).coverage)
+
+        for value in ['all', 't=0', 't=x']:
+            with self.assertRaises(SystemExit):
+                parse_args(['--coverage', value])
+
+    def test_parse_args_shard(self):
+        self.assertIsNone(parse_args([]).shard)
+        self.assertEqual((1, 3), parse_args(['--shard', '2/3']).shard)
+
+        for value in ['0/3', '4/3', '1', 'a/b']:
+            with self.assertRaises(SystemExit):
+                parse_args(['--shard', value])
+
+    def test_parse_args_output_tail(self):
+        self.assertIsNone(parse_args([]).output_tail)
+        self.assertEqual(
+            4096,
+            parse_args(['--output-tail', '4096']).output_tail,
+        )
+
+        with self.assertRaises(SystemExit):
+            parse_args(['--output-tail', '0'])
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.displays.StreamDisplay')
+    def test_main_keeps_the_output_tail(self, StreamDisplay, _):
+        StreamDisplay.return_value = MockDisplay()
+        StreamDisplay.return_value.close = MagicMock()
+
+        with patch('plix.main.run_command') as run_command:
+            main(args=['--output-tail', '4096'])
+
+        StreamDisplay.assert_called_once_with(
+            stream=ANY,
+            tail_size=4096,
+            queue_size=ANY,
+            overflow_policy=ANY,
+        )
+        run_command.assert_called_once_with(
+            ANY,
+            display=StreamDisplay.return_value,
+        )
+
+    def test_parse_args_shard_history(self):
+        self.assertIsNone(parse_args([]).shard_history)
+        self.assertEqual(
+            'history.json',
+            parse_args(['--shard-history', 'history.json']).shard_history,
+        )
+
+    def test_parse_args_list(self):
+        args = parse_args(['list', '--count', 'a:1,2', 'b:!3'])
+
+        self.assertEqual('list', args.command)
+        self.assertTrue(args.count)
+        self.assertEqual(
+            [
+                Filter(key='a', patterns=('1', '2'), negated=False),
+                Filter(key='b', patterns=('3',), negated=True),
+            ],
+            args.filters,
+        )
+
+        with self.assertRaises(SystemExit):
+            parse_args(['list', 'a'])
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_list(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'exclusion_matrix': [{'a': ['2'], 'b': ['4']}],
+                'matrix': {
+                    'a': ['1', '2'],
+                    'b': ['3', '4'],
+                },
+            },
+            command='list',
+            debug=False,
+            count=False,
+            filters=[Filter(key='a', patterns=('2',), negated=False)],
+        )
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            main(args=[], display=MockDisplay())
+
+        self.assertEqual('a=2, b=3\n', stdout.getvalue())
+
+        parse_args.return_value.count = True
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            main(args=[], display=MockDisplay())
+
+        self.assertEqual('1\n', stdout.getvalue())
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_list_with_unknown_keys(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'exclusion_matrix': [],
+                'matrix': {'a': ['1']},
+            },
+            command='list',
+            debug=False,
+            count=False,
+            filters=[Filter(key='c', patterns=('1',), negated=False)],
+        )
+
+        with self.assertRaises(SystemExit) as ex:
+            main(args=[], display=MockDisplay())
+
+        self.assertEqual(1, ex.exception.code)
+
+    def test_parse_args_no_history(self):
+        self.assertFalse(parse_args([]).no_history)
+        self.assertTrue(parse_args(['--no-history']).no_history)
+
+    def test_get_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        params = Namespace(no_history=False, cache_dir=directory)
+        history = get_history(params)
+
+        self.assertEqual(
+            os.path.join(directory, 'history.json'),
+            history.path,
+        )
+        self.assertEqual({}, history.jobs)
+
+        params.no_history = True
+
+        self.assertIsNone(get_history(params))
+
+    def test_get_cache(self):
+        params = Namespace(
+            cache=True,
+            cache_dir='foo',
+            configuration={'cache': {'max_entries': 3, 'max_age': 4.0}},
+        )
+        cache = get_cache(params)
+
+        self.assertEqual('foo', cache.directory)
+        self.assertEqual(3, cache.max_entries)
+        self.assertEqual(4.0, cache.max_age)
+
+        params.cache = False
+
+        self.assertIsNone(get_cache(params))
+
+    def test_parse_args_explicit_run_command(self):
+        args = parse_args(['run', '-j', '2', 'a:1'])
+
+        self.assertEqual('run', args.command)
+        self.assertEqual(2, args.jobs)
+        self.assertEqual(frozenset({('a', '1')}), args.pairs)
+
+    def test_parse_args_options_before_the_command(self):
+        args = parse_args(['-d', '-c', 'plix.yml', 'list', 'a:1'])
+
+        self.assertEqual('list', args.command)
+        self.assertTrue(args.debug)
+        self.assertEqual('plix.yml', args.configuration)
+
+        args = parse_args(['-d', '-j', '2', 'a:1'])
+
+        self.assertEqual('run', args.command)
+        self.assertTrue(args.debug)
+        self.assertEqual(2, args.jobs)
+        self.assertEqual(frozenset({('a', '1')}), args.pairs)
+
+    def test_parse_args_broker(self):
+        args = parse_args(['broker', '-e', 'tcp://*:1234', 'a:1'])
+
+        self.assertEqual('broker', args.command)
+        self.assertEqual('tcp://*:1234', args.endpoint)
+        self.assertEqual(frozenset({('a', '1')}), args.pairs)
+
+    def test_parse_args_worker(self):
+        args = parse_args(['worker', '-d'])
+
+        self.assertEqual('worker', args.command)
+        self.assertEqual('tcp://127.0.0.1:7474', args.endpoint)
+        self.assertTrue(args.debug)
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.distributed.Worker')
+    @patch('plix.main.parse_args')
+    def test_main_worker(self, parse_args, Worker, load_configuration):
+        parse_args.return_value = Namespace(
+            command='worker',
+            debug=False,
+            endpoint='tcp://localhost:1234',
+        )
+
+        main(args=[], display=MockDisplay())
+
+        Worker.assert_called_once_with(endpoint='tcp://localhost:1234')
+        Worker().run.assert_called_once_with()
+        Worker().close.assert_called_once_with()
+        self.assertFalse(load_configuration.called)
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.distributed.Broker')
+    @patch('plix.distributed.DistributedRunner')
+    @patch('plix.main.parse_args')
+    def test_main_broker(self, parse_args, DistributedRunner, Broker, _):
+        configuration = {
+            'matrix': {'a': ['1', '2']},
+            'exclusion_matrix': [],
+        }
+        parse_args.return_value = Namespace(
+            command='broker',
+            configuration=configuration,
+            debug=False,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            endpoint='tcp://*:1234',
+            pairs=frozenset(),
+        )
+        DistributedRunner().run.return_value = [
+            (frozenset({('a', '1')}), True),
+            (frozenset({('a', '2')}), True),
+        ]
+        display = MockDisplay()
+
+        main(args=[], display=display)
+
+        Broker.assert_called_once_with(endpoint='tcp://*:1234')
+        DistributedRunner.assert_called_with(
+            configuration=configuration,
+            display=display,
+            broker=Broker(),
+            deduplicate=False,
+            cache=None,
+            history=None,
+            fail_fast=False,
+        )
+        Broker().close.assert_called_once_with()
+
+    def test_parse_args_invalid_jobs(self):
+        with self.assertRaises(SystemExit):
+            parse_args(['-j', '0'])
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_runs_every_variant(self, parse_args, _):
+        x = []
+
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(globals=globals(), locals=locals()),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2'],
+                    'b': ['3', '4'],
+                },
+                'script': [
+                    'x.append(1)',
+                ],
+            },
+            command='run',
+            debug=False,
+            jobs=2,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset({('a', '2')}),
+        )
+        display = MockDisplay()
+
+        main(args=[], display=display)
+
+        self.assertEqual([1, 1], x)
+        self.assertEqual(
+            [
+                call(variant=frozenset({('a', '2'), ('b', '3')})),
+                call(variant=frozenset({('a', '2'), ('b', '4')})),
+            ],
+            display.start_variant.mock_calls,
+        )
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_runs_covering_variants(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2'],
+                    'b': ['3', '4'],
+                    'c': ['5', '6'],
+                },
+                'script': [],
+            },
+            command='run',
+            debug=False,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=2,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset(),
+        )
+        display = MockDisplay()
+
+        main(args=[], display=display)
+
+        self.assertEqual(4, len(display.start_variant.mock_calls))
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_runs_a_shard(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2', '3'],
+                },
+                'script': [],
+            },
+            command='run',
+            debug=False,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=(1, 2),
+            shard_history=None,
+            pairs=frozenset(),
+        )
+        display = MockDisplay()
+
+        main(args=[], display=display)
+
+        self.assertEqual(
+            [call(variant=frozenset({('a', '2')}))],
+            display.start_variant.mock_calls,
+        )
+
+    def run_shard(self, shard, shard_history):
+        display = MockDisplay()
+
+        with patch('plix.main.load_configuration'), \
+                patch('plix.main.parse_args') as parse_args:
+            parse_args.return_value = Namespace(
+                configuration={
+                    'executor': PythonExecutor(),
+                    'global': {},
+                    'exclusion_matrix': [],
+                    'matrix': {
+                        'a': ['1', '2', '3'],
+                    },
+                    'script': ['x = {{a}}'],
+                },
+                command='run',
+                debug=False,
+                jobs=1,
+                deduplicate=False,
+                cache=False,
+                no_history=True,
+                fail_fast=False,
+                coverage=None,
+                shard=shard,
+                shard_history=shard_history,
+                pairs=frozenset(),
+            )
+            main(args=[], display=display)
+
+        return display
+
+    def test_main_runs_a_balanced_shard(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'history.json')
+
+        with open(path, 'w') as stream:
+            stream.write(
+                '{"jobs": {}, '
+                '"commands": {"x = 1": 10.0, "x = 2": 1.0, "x = 3": 1.0}}',
+            )
+
+        display = self.run_shard(shard=(1, 2), shard_history=path)
+
+        self.assertEqual(
+            [
+                call(variant=frozenset({('a', '2')})),
+                call(variant=frozenset({('a', '3')})),
+            ],
+            display.start_variant.mock_calls,
+        )
+
+    def test_main_refuses_a_missing_shard_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with self.assertRaises(SystemExit):
+            self.run_shard(
+                shard=(1, 2),
+                shard_history=os.path.join(directory, 'history.json'),
+            )
+
+    def test_main_refuses_a_shard_history_without_shard(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'history.json')
+
+        with open(path, 'w') as stream:
+            stream.write('{"jobs": {}, "commands": {}}')
+
+        with self.assertRaises(SystemExit):
+            self.run_shard(shard=None, shard_history=path)
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_with_failures(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2'],
+                },
+                'script': [
+                    'raise SystemExit(1)',
+                ],
+            },
+            command='run',
+            debug=False,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset(),
+        )
+
+        with self.assertRaises(SystemExit) as ex:
+            main(args=[], display=MockDisplay())
+
+        self.assertEqual(1, ex.exception.code)
+
+    @patch('plix.main.report')
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_flushes_the_display_before_the_report(
+        self,
+        parse_args,
+        _,
+        report,
+    ):
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2'],
+                },
+                'script': [],
+            },
+            command='run',
+            debug=False,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset(),
+        )
+        display = MockDisplay()
+        display.flush = MagicMock()
+        report.side_effect = lambda results: self.assertTrue(
+            display.flush.called,
+        )
+
+        main(args=[], display=display)
+
+        report.assert_called_once_with(ANY)
+
+    @patch('plix.main.load_configuration')
+    @patch('plix.main.parse_args')
+    def test_main_with_unknown_pairs(self, parse_args, _):
+        parse_args.return_value = Namespace(
+            configuration={
+                'executor': PythonExecutor(),
+                'global': {},
+                'exclusion_matrix': [],
+                'matrix': {
+                    'a': ['1', '2'],
+                },
+                'script': [],
+            },
+            command='run',
+            debug=False,
+            jobs=1,
+            deduplicate=False,
+            cache=False,
+            no_history=True,
+            fail_fast=False,
+            coverage=None,
+            shard=None,
+            shard_history=None,
+            pairs=frozenset({('c', '1')}),
+        )
+
+        with self.assertRaises(SystemExit) as ex:
+            main(args=[], display=MockDisplay())
+
+        self.assertEqual(1, ex.exception.code)
+
+    @patch('plix.main.logger')
+    def test_report_skipped_variants(self, logger):
+        variants = [
+            frozenset({('a', '1')}),
+            frozenset({('a', '2')}),
+            frozenset({('a', '3')}),
+        ]
+
+        with self.assertRaises(SystemExit) as ex:
+            report([
+                (variants[0], True),
+                (variants[1], False),
+                (variants[2], None),
+            ])
+
+        self.assertEqual(1, ex.exception.code)
+        self.assertEqual(
+            [
+                call("Variant failed: %s", 'a=2'),
+                call("%s out of %s variant(s) failed.", 1, 3),
+            ],
+            logger.error.mock_calls,
+        )
+        self.assertEqual(
+            [call("%s out of %s variant(s) skipped.", 1, 3)],
+            logger.warning.mock_calls,
+        )
@@ -2,6 +2,9 @@
 Test matrices functions.
 """
 
+import pickle
+
+from itertools import count
 from unittest import TestCase
 
 import plix.matrix
@@ -68,6 +71,172 @@ class MatrixTests(TestCase):
             variants,
         )
 
+    def test_generate_variants_with_conflicting_subset_pairs(self):
+        matrix = {
+            'a': [1, 2],
+            'b': [3, 4],
+        }
+        subset_pairs = {('a', 1), ('a', 2)}
+        variants = list(plix.matrix.generate_variants(
+            matrix=matrix,
+            subset_pairs=subset_pairs,
+        ))
+        self.assertEqual([], variants)
+
+    def test_generate_variants_with_unknown_subset_pairs(self):
+        matrix = {
+            'a': [1, 2],
+        }
+        subset_pairs = {('b', 1)}
+        variants = list(plix.matrix.generate_variants(
+            matrix=matrix,
+            subset_pairs=subset_pairs,
+        ))
+        self.assertEqual([], variants)
+
+    def test_generate_variants_with_empty_dimension(self):
+        matrix = {
+            'a': [1, 2],
+            'b': [],
+        }
+        variants = list(plix.matrix.generate_variants(matrix=matrix))
+        self.assertEqual([], variants)
+
+    def test_generate_variants_with_empty_matrix(self):
+        variants = list(plix.matrix.generate_variants(matrix={}))
+        self.assertEqual([frozenset()], variants)
+
+    def test_generate_variants_with_exclusions(self):
+        matrix = {
+            'a': [1, 2, 3],
+            'b': [3, 4],
+            'c': [5, 6],
+        }
+        exclusions = [
+            {'a': [1, 2], 'c': [5]},
+            {'b': [4]},
+            {'a': [3], 'd': [7]},
+            {},
+        ]
+        variants = list(plix.matrix.generate_variants(
+            matrix=matrix,
+            exclusions=exclusions,
+        ))
+        self.assertEqual(
+            [
+                frozenset({('a', 1), ('b', 3), ('c', 6)}),
+                frozenset({('a', 2), ('b', 3), ('c', 6)}),
+                frozenset({('a', 3), ('b', 3), ('c', 5)}),
+                frozenset({('a', 3), ('b', 3), ('c', 6)}),
+            ],
+            variants,
+        )
+
+    def test_generate_variants_with_exclusions_and_subset_pairs(self):
+        matrix = {
+            'a': [1, 2, 3],
+            'b': [3, 4],
+        }
+        exclusions = [
+            {'a': [1], 'b': [3]},
+        ]
+        variants = list(plix.matrix.generate_variants(
+            matrix=matrix,
+            subset_pairs={('a', 1)},
+            exclusions=exclusions,
+        ))
+        self.assertEqual(
+            [
+                frozenset({('a', 1), ('b', 4)}),
+            ],
+            variants,
+        )
+
+    def test_variants_behave_like_frozensets(self):
+        dimensions = plix.matrix.Dimensions([('a', [1, 2]), ('b', ['x'])])
+        variant = plix.matrix.Variant(dimensions, (1, 0))
+        pairs = frozenset({('a', 2), ('b', 'x')})
+
+        self.assertEqual(pairs, variant)
+        self.assertEqual(variant, pairs)
+        self.assertFalse(variant != pairs)
+        self.assertNotEqual(frozenset({('a', 1), ('b', 'x')}), variant)
+        self.assertEqual(hash(pairs), hash(variant))
+        self.assertEqual({pairs: 1}, {variant: 1})
+        self.assertEqual(2, len(variant))
+        self.assertIn(('a', 2), variant)
+        self.assertNotIn(('a', 1), variant)
+        self.assertNotIn(('c', 1), variant)
+        self.assertNotIn('a', variant)
+        self.assertEqual(sorted(pairs), sorted(variant))
+        self.assertEqual(
+            frozenset({('b', 'x')}),
+            variant & {('a', 1), ('b', 'x')},
+        )
+        self.assertTrue(variant.issuperset({('b', 'x')}))
+        self.assertEqual({'a': 2, 'b': 'x'}, variant.as_dict())
+        self.assertEqual(
+            "Variant([('a', 2), ('b', 'x')])",
+            repr(variant).replace("u'", "'"),
+        )
+
+    def test_variants_of_the_same_matrix_compare_by_indexes(self):
+        dimensions = plix.matrix.Dimensions([('a', [1, 2])])
+
+        self.assertEqual(
+            plix.matrix.Variant(dimensions, (0,)),
+            plix.matrix.Variant(dimensions, (0,)),
+        )
+        self.assertNotEqual(
+            plix.matrix.Variant(dimensions, (0,)),
+            plix.matrix.Variant(dimensions, (1,)),
+        )
+        self.assertEqual(
+            plix.matrix.Variant(dimensions, (0,)),
+            plix.matrix.Variant(plix.matrix.Dimensions([('a', [1])]), (0,)),
+        )
+
+    def test_variants_are_picklable(self):
+        variants = list(plix.matrix.generate_variants(matrix={'a': [1, 2]}))
+        result = pickle.loads(pickle.dumps(variants))
+
+        self.assertEqual(variants, result)
+        self.assertIs(result[0].dimensions, result[1].dimensions)
+
+    def test_shard_variants(self):
+        variants = list(range(7))
+        shards = [
+            list(plix.matrix.shard_variants(variants, index=index, count=3))
+            for index in range(3)
+        ]
+
+        self.assertEqual([[0, 3, 6], [1, 4], [2, 5]], shards)
+
+    def test_shard_variants_with_estimate(self):
+        durations = [5, 1, 1, 1, 1, 3, 2]
+        shards = [
+            list(plix.matrix.shard_variants(
+                range(len(durations)),
+                index=index,
+                count=2,
+                estimate=durations.__getitem__,
+            ))
+            for index in range(2)
+        ]
+
+        self.assertEqual([[0, 6], [1, 2, 3, 4, 5]], shards)
+
+    def test_shard_variants_is_lazy(self):
+        shard = plix.matrix.shard_variants(count(), index=1, count=4)
+
+        self.assertEqual([1, 5, 9], [next(shard) for _ in range(3)])
+
+    def test_format_variant(self):
+        self.assertEqual(
+            'a=1, b=2',
+            plix.matrix.format_variant(frozenset({('b', 2), ('a', 1)})),
+        )
+
     def test_validate_keys(self):
         matrix = {
             'a': [1, 2],
@@ -0,0 +1,155 @@
+"""
+Test the execution planning.
+"""
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from plix.planning import (
+    Job,
+    plan,
+)
+
+
+class PlanningTests(TestCase):
+    def test_job_pairs(self):
+        job = Job(
+            variants=[
+                frozenset({('a', 1), ('b', 2), ('c', 3)}),
+                frozenset({('a', 1), ('b', 3), ('c', 3)}),
+            ],
+            phases=[],
+        )
+        self.assertEqual(
+            frozenset({('a', 1), ('b', 2), ('c', 3)}),
+            job.pairs,
+        )
+        self.assertEqual(frozenset({('a', 1), ('c', 3)}), job.shared_pairs)
+
+    def test_job_empty(self):
+        self.assertTrue(Job(variants=[], phases=[]).empty)
+        self.assertTrue(Job(variants=[], phases=[('script', [])]).empty)
+        self.assertFalse(
+            Job(variants=[], phases=[('install', []), ('script', ['a'])]).empty
+        )
+
+    def test_plan(self):
+        variants = [
+            frozenset({('a', 1), ('b', 1)}),
+            frozenset({('a', 1), ('b', 2)}),
+        ]
+        jobs = plan(
+            variants=variants,
+            phases=[
+                ('install', ["install {{b}}"]),
+                ('script', ["echo {{a}}"]),
+            ],
+        )
+
+        self.assertEqual(
+            [
+                (
+                    [variants[0]],
+                    [('install', ["install 1"]), ('script', ["echo 1"])],
+                ),
+                (
+                    [variants[1]],
+                    [('install', ["install 2"]), ('script', ["echo 1"])],
+                ),
+            ],
+            [(job.variants, job.phases) for job in jobs],
+        )
+
+    def test_plan_deduplicate(self):
+        variants = [
+            frozenset({('a', 1), ('b', 1), ('c', 1)}),
+            frozenset({('a', 2), ('b', 1), ('c', 1)}),
+            frozenset({('a', 1), ('b', 2), ('c', 1)}),
+            frozenset({('a', 2), ('b', 2), ('c', 2)}),
+        ]
+        jobs = plan(
+            variants=variants,
+            phases=[
+                ('script', [
+                    "echo {{a}}",
+                    "{% if b == 1 %}true{% else %}true{% endif %}",
+                ]),
+            ],
+            deduplicate=True,
+        )
+
+        self.assertEqual(
+            [
+                ([variants[0]], [('script', ["echo 1", "true"])]),
+                ([variants[1]], [('script', ["echo 2", "true"])]),
+                ([variants[2]], [('script', ["echo 1", "true"])]),
+                ([variants[3]], [('script', ["echo 2", "true"])]),
+            ],
+            [(job.variants, job.phases) for job in jobs],
+        )
+
+        jobs = plan(
+            variants=variants,
+            phases=[('script', ["echo {{a}}"])],
+            deduplicate=True,
+        )
+
+        self.assertEqual(
+            [
+                ([variants[0], variants[2]], [('script', ["echo 1"])]),
+                ([variants[1], variants[3]], [('script', ["echo 2"])]),
+            ],
+            [(job.variants, job.phases) for job in jobs],
+        )
+        self.assertEqual(
+            [variants[0], variants[1]],
+            [job.pairs for job in jobs],
+        )
+        self.assertEqual(
+            [
+                frozenset({('a', 1), ('c', 1)}),
+                frozenset({('a', 2)}),
+            ],
+            [job.shared_pairs for job in jobs],
+        )
+
+    def test_plan_deduplicate_environment_references(self):
+        variants = [
+            frozenset({('a', 1), ('b', 1)}),
+            frozenset({('a', 1), ('b', 2)}),
+        ]
+        jobs = plan(
+            variants=variants,
+            phases=[('script', ['echo "[$b]"; test -n "${b}"'])],
+            deduplicate=True,
+        )
+
+        self.assertEqual(
+            [[variants[0]], [variants[1]]],
+            [job.variants for job in jobs],
+        )
+
+    def test_plan_deduplicate_across_phases(self):
+        variants = [
+            frozenset({('a', 1), ('b', 1)}),
+            frozenset({('a', 1), ('b', 2)}),
+        ]
+        jobs = plan(
+            variants=variants,
+            phases=[
+                ('install', ["install {{a}}"]),
+                ('script', ["test {{b}}"]),
+            ],
+            deduplicate=True,
+        )
+
+        self.assertEqual(2, len(jobs))
+
+        jobs = plan(
+            variants=variants,
+            phases=[('install', ["install {{a}}"]), ('script', [])],
+            deduplicate=True,
+        )
+
+        self.assertEqual([variants], [job.variants for job in jobs])
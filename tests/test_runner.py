@@ -0,0 +1,787 @@
+"""
+Test the matrix runner.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+from mock import (
+    ANY,
+    MagicMock,
+    call,
+)
+
+from plix.cache import ResultCache
+from plix.executors import (
+    BaseExecutor,
+    ShellExecutor,
+)
+from plix.history import History
+from plix.planning import plan
+from plix.runner import (
+    build_environment,
+    execute_phases,
+    should_run_phase,
+    Runner,
+)
+from plix.statistics import Statistics
+
+from .common import MockDisplay
+
+
+class EnvironmentExecutor(BaseExecutor):
+    """
+    An executor that evaluates commands as Python expressions with the
+    environment as their namespace.
+    """
+    def __init__(self, options=None):
+        super(EnvironmentExecutor, self).__init__(options=options)
+        self.environments = []
+
+    def execute_one(self, environment, command, output):
+        namespace = dict(environment, time=time)
+        self.environments.append(environment)
+
+        return eval(command, namespace)
+
+
+class RunnerTests(TestCase):
+    def test_build_environment(self):
+        environment = build_environment(
+            base_environment={'A': 'a', 'B': 'b'},
+            global_environment={'B': 'bb', 'C': 3},
+            variant={('C', 'c'), ('D', 4)},
+        )
+
+        self.assertEqual(
+            {
+                'A': 'a',
+                'B': 'bb',
+                'C': 'c',
+                'D': '4',
+            },
+            environment,
+        )
+
+    def test_build_environment_does_not_modify_base_environment(self):
+        base_environment = {'A': 'a'}
+        build_environment(
+            base_environment=base_environment,
+            global_environment={},
+            variant={('A', 'b')},
+        )
+
+        self.assertEqual({'A': 'a'}, base_environment)
+
+    def test_should_run_phase(self):
+        self.assertTrue(should_run_phase('script', True))
+        self.assertFalse(should_run_phase('script', False))
+        self.assertTrue(should_run_phase('after_success', True))
+        self.assertFalse(should_run_phase('after_success', False))
+        self.assertFalse(should_run_phase('after_failure', True))
+        self.assertTrue(should_run_phase('after_failure', False))
+        self.assertTrue(should_run_phase('after_script', True))
+        self.assertTrue(should_run_phase('after_script', False))
+
+    def execute_phases(self, phases):
+        display = MockDisplay()
+        success = execute_phases(
+            executor=EnvironmentExecutor(),
+            environment={},
+            phases=phases,
+            display=display,
+        )
+
+        return success, [
+            (kwargs['phase'], kwargs['success'])
+            for _, _, kwargs in display.stop_phase.mock_calls
+        ]
+
+    def test_execute_phases(self):
+        self.assertEqual(
+            (True, [('script', True), ('after_success', True)]),
+            self.execute_phases([
+                ('before_script', []),
+                ('script', ['0']),
+                ('after_success', ['0']),
+                ('after_failure', ['0']),
+            ]),
+        )
+        self.assertEqual(
+            (
+                False,
+                [
+                    ('script', False),
+                    ('after_failure', False),
+                    ('after_script', True),
+                ],
+            ),
+            self.execute_phases([
+                ('script', ['1']),
+                ('after_success', ['0']),
+                ('after_failure', ['1']),
+                ('after_script', ['0']),
+            ]),
+        )
+        self.assertEqual(
+            (False, [('before_script', False), ('after_script', True)]),
+            self.execute_phases([
+                ('before_script', ['1']),
+                ('script', ['0']),
+                ('after_script', ['0']),
+            ]),
+        )
+
+    def test_execute_phases_rolls_up_statistics(self):
+        display = MockDisplay()
+        statistics = Statistics()
+        execute_phases(
+            executor=EnvironmentExecutor(),
+            environment={},
+            phases=[('install', ['0']), ('script', ['0', '0'])],
+            display=display,
+            statistics=statistics,
+        )
+        phase_statistics = [
+            kwargs['statistics']
+            for _, _, kwargs in display.stop_phase.mock_calls
+        ]
+
+        self.assertEqual(
+            sum(
+                kwargs['statistics'].wall_time
+                for _, _, kwargs in display.stop_command.mock_calls
+            ),
+            statistics.wall_time,
+        )
+        self.assertEqual(
+            phase_statistics[0].wall_time + phase_statistics[1].wall_time,
+            statistics.wall_time,
+        )
+
+    def run_variants(
+        self,
+        variants,
+        script,
+        jobs,
+        deduplicate=False,
+        fail_fast=False,
+        **phases
+    ):
+        executor = EnvironmentExecutor()
+        display = MockDisplay()
+        configuration = {
+            'executor': executor,
+            'global': {'G': 'g'},
+            'script': script,
+        }
+        configuration.update(phases)
+        runner = Runner(
+            configuration=configuration,
+            display=display,
+            jobs=jobs,
+            environment={},
+            deduplicate=deduplicate,
+            fail_fast=fail_fast,
+        )
+
+        return runner.run(variants), display, executor.environments
+
+    def test_execute_phases_uses_a_session(self):
+        executor = EnvironmentExecutor()
+        executor.session = MagicMock()
+        execute_phases(
+            executor=executor,
+            environment={'A': '1'},
+            phases=[('install', ['0']), ('script', ['0'])],
+            display=MockDisplay(),
+        )
+
+        executor.session.assert_called_once_with({'A': '1'})
+        self.assertEqual(
+            1,
+            executor.session.return_value.__enter__.call_count,
+        )
+
+    def test_run_sequential(self):
+        variants = [
+            frozenset({('A', '1')}),
+            frozenset({('A', '2')}),
+        ]
+        results, display, environments = self.run_variants(
+            variants=variants,
+            script=['0'],
+            jobs=1,
+        )
+
+        self.assertEqual(
+            [
+                {'A': '1', 'G': 'g'},
+                {'A': '2', 'G': 'g'},
+            ],
+            environments,
+        )
+        self.assertEqual(
+            [
+                (variants[0], True),
+                (variants[1], True),
+            ],
+            results,
+        )
+        self.assertEqual(
+            [
+                call(variant=variants[0]),
+                call(variant=variants[1]),
+            ],
+            display.start_variant.mock_calls,
+        )
+        self.assertEqual(
+            [
+                call(variant=variants[0], success=True, statistics=ANY),
+                call(variant=variants[1], success=True, statistics=ANY),
+            ],
+            display.stop_variant.mock_calls,
+        )
+
+    def test_run_rolls_up_statistics(self):
+        variants = [
+            frozenset({('A', '0.1')}),
+            frozenset({('A', '0')}),
+        ]
+
+        for jobs in [1, 2]:
+            _, display, _ = self.run_variants(
+                variants=variants,
+                script=['time.sleep(float(A)) or 0', '0'],
+                jobs=jobs,
+            )
+            command_statistics = [
+                kwargs['statistics']
+                for _, _, kwargs in display.stop_command.mock_calls
+            ]
+            variant_statistics = [
+                kwargs['statistics']
+                for _, _, kwargs in display.stop_variant.mock_calls
+            ]
+
+            self.assertGreaterEqual(command_statistics[0].wall_time, 0.1)
+            self.assertEqual(
+                [
+                    command_statistics[0].wall_time +
+                    command_statistics[1].wall_time,
+                    command_statistics[2].wall_time +
+                    command_statistics[3].wall_time,
+                ],
+                [statistics.wall_time for statistics in variant_statistics],
+            )
+
+    def test_run_parallel_reports_in_order(self):
+        variants = [
+            frozenset({('A', '0.2')}),
+            frozenset({('A', '0.1')}),
+            frozenset({('A', '0')}),
+        ]
+        script = [
+            'time.sleep(float(A)) or 0',
+            'int(A == "0.1")',
+        ]
+        results, display, environments = self.run_variants(
+            variants=variants,
+            script=script,
+            jobs=3,
+        )
+
+        # The second commands complete in the reverse order of the variants.
+        self.assertEqual(
+            ['0', '0.1', '0.2'],
+            [environment['A'] for environment in environments[3:]],
+        )
+        self.assertEqual(
+            [
+                (variants[0], True),
+                (variants[1], False),
+                (variants[2], True),
+            ],
+            results,
+        )
+        self.assertEqual(
+            [
+                call(variant=variants[0], success=True, statistics=ANY),
+                call(variant=variants[1], success=False, statistics=ANY),
+                call(variant=variants[2], success=True, statistics=ANY),
+            ],
+            display.stop_variant.mock_calls,
+        )
+        self.assertEqual(
+            [
+                call(index=index, command=command)
+                for variant in variants
+                for index, command in enumerate(script)
+            ],
+            display.start_command.mock_calls,
+        )
+
+    def test_run_renders_commands(self):
+        variants = [
+            frozenset({('A', '1')}),
+            frozenset({('A', '2')}),
+        ]
+        results, display, environments = self.run_variants(
+            variants=variants,
+            script=['int(A) - {{A}}'],
+            jobs=1,
+        )
+
+        self.assertEqual(
+            [
+                call(index=0, command='int(A) - 1'),
+                call(index=0, command='int(A) - 2'),
+            ],
+            display.start_command.mock_calls,
+        )
+        self.assertEqual(
+            [
+                (variants[0], True),
+                (variants[1], True),
+            ],
+            results,
+        )
+
+    def test_run_deduplicated(self):
+        variants = [
+            frozenset({('A', '1'), ('B', '1')}),
+            frozenset({('A', '1'), ('B', '2')}),
+            frozenset({('A', '2'), ('B', '1')}),
+        ]
+
+        for jobs in [1, 2]:
+            results, display, environments = self.run_variants(
+                variants=variants,
+                script=['int({{A}} == 2)'],
+                jobs=jobs,
+                deduplicate=True,
+            )
+
+            self.assertEqual(
+                [
+                    {'A': '1', 'B': '1', 'G': 'g'},
+                    {'A': '2', 'B': '1', 'G': 'g'},
+                ],
+                sorted(environments, key=lambda value: value['A']),
+            )
+            self.assertEqual(
+                [
+                    (variants[0], True),
+                    (variants[1], True),
+                    (variants[2], False),
+                ],
+                results,
+            )
+            self.assertEqual(
+                [
+                    call(variant=variants[0]),
+                    call(variant=variants[2]),
+                ],
+                display.start_variant.mock_calls,
+            )
+            display.shared_variant.assert_called_once_with(
+                variant=variants[1],
+                reference=variants[0],
+                success=True,
+            )
+
+    def test_run_with_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        executor = EnvironmentExecutor()
+        configuration = {
+            'executor': executor,
+            'global': {'G': 'g'},
+            'script': ['int(A == "2")'],
+            'cache': {
+                'inputs': [],
+                'environment': ['BASE', 'MISSING'],
+            },
+        }
+        variants = [
+            frozenset({('A', '1')}),
+            frozenset({('A', '2')}),
+        ]
+
+        def run(jobs=1, environment={'BASE': 'base'}):
+            display = MockDisplay()
+            runner = Runner(
+                configuration=configuration,
+                display=display,
+                jobs=jobs,
+                environment=environment,
+                cache=ResultCache(directory=directory),
+            )
+
+            return runner.run(variants), display
+
+        results, display = run()
+
+        self.assertEqual([(variants[0], True), (variants[1], False)], results)
+        self.assertEqual([], display.cached_variant.mock_calls)
+
+        for jobs in [1, 2]:
+            results, display = run(jobs=jobs)
+
+            self.assertEqual(
+                [(variants[0], True), (variants[1], False)],
+                results,
+            )
+            self.assertEqual(
+                [call(variant=variants[0], statistics=ANY)],
+                display.cached_variant.mock_calls,
+            )
+            self.assertEqual(
+                [call(variant=variants[1])],
+                display.start_variant.mock_calls,
+            )
+
+        # Changing a declared environment variable invalidates the cache.
+        results, display = run(environment={'BASE': 'other'})
+
+        self.assertEqual([], display.cached_variant.mock_calls)
+        self.assertEqual(2, len(display.start_variant.mock_calls))
+
+    def test_run_parallel_with_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        history = History(path=os.path.join(directory, 'history.json'))
+        history.commands.update({
+            'int(1 == 2)': 1.0,
+            'int(2 == 2)': 2.0,
+            'int(3 == 2)': 3.0,
+        })
+        executor = EnvironmentExecutor()
+        display = MockDisplay()
+        variants = [
+            frozenset({('A', '1')}),
+            frozenset({('A', '2')}),
+            frozenset({('A', '3')}),
+        ]
+        runner = Runner(
+            configuration={
+                'executor': executor,
+                'global': {},
+                'script': ['int({{A}} == 2)'],
+            },
+            display=display,
+            jobs=1,
+            environment={},
+            history=history,
+        )
+        results = runner.run_parallel(
+            plan(variants, phases=runner.get_phases(runner.variant_phases)),
+            concurrency=1,
+        )
+
+        # The longest jobs start first, but are reported in order.
+        self.assertEqual(
+            ['3', '2', '1'],
+            [environment['A'] for environment in executor.environments],
+        )
+        self.assertEqual(
+            [True, False, True],
+            [success for _, success in results],
+        )
+        self.assertEqual(
+            [call(variant=variant) for variant in variants],
+            display.start_variant.mock_calls,
+        )
+        # Only the jobs that succeeded are recorded.
+        self.assertEqual(2, len(history.jobs))
+
+    def test_estimate(self):
+        history = History(path='history.json')
+        history.commands.update({'a 1': 1.0, 'b 1': 2.0})
+        runner = Runner(
+            configuration={
+                'executor': EnvironmentExecutor(),
+                'global': {},
+                'install': ['c {{A}}'],
+                'script': ['a {{A}}', 'b {{A}}'],
+            },
+            display=MockDisplay(),
+            history=history,
+        )
+
+        self.assertEqual(3.0, runner.estimate(frozenset({('A', '1')})))
+
+    def test_run_saves_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'history.json')
+        runner = Runner(
+            configuration={
+                'executor': EnvironmentExecutor(),
+                'global': {},
+                'script': ['0'],
+            },
+            display=MockDisplay(),
+            environment={},
+            history=History(path=path),
+        )
+        runner.run([frozenset({('A', '1')})])
+        history = History(path=path)
+        history.load()
+
+        self.assertEqual(1, len(history.jobs))
+        self.assertEqual(['0'], list(history.commands))
+
+    def test_run_ignores_history_save_errors(self):
+        history = MagicMock()
+        history.save.side_effect = OSError(13, "Permission denied")
+        runner = Runner(
+            configuration={
+                'executor': EnvironmentExecutor(),
+                'global': {},
+                'script': ['0'],
+            },
+            display=MockDisplay(),
+            environment={},
+            history=history,
+        )
+
+        self.assertEqual(
+            [(frozenset({('A', '1')}), True)],
+            runner.run([frozenset({('A', '1')})]),
+        )
+        history.save.assert_called_once_with()
+
+    def test_run_closes_the_executor(self):
+        executor = EnvironmentExecutor()
+        executor.close = MagicMock()
+        runner = Runner(
+            configuration={
+                'executor': executor,
+                'global': {},
+                'script': ['0'],
+            },
+            display=MockDisplay(),
+            environment={},
+        )
+        runner.run([frozenset({('A', '1')})])
+
+        executor.close.assert_called_once_with()
+
+    def test_run_shares_setup_phases(self):
+        variants = [
+            frozenset({('A', '1'), ('B', '1')}),
+            frozenset({('A', '2'), ('B', '1')}),
+            frozenset({('A', '1'), ('B', '2')}),
+        ]
+
+        for jobs in [1, 2]:
+            results, display, environments = self.run_variants(
+                variants=variants,
+                before_install=['0'],
+                install=['int({{A}} - 1)'],
+                script=['{{B}} and 0'],
+                jobs=jobs,
+                deduplicate=True,
+            )
+
+            self.assertEqual(
+                [
+                    (variants[0], True),
+                    (variants[1], False),
+                    (variants[2], True),
+                ],
+                results,
+            )
+            self.assertEqual(
+                [
+                    call(pairs=frozenset({('A', '1')})),
+                    call(pairs=frozenset({('A', '2'), ('B', '1')})),
+                ],
+                display.start_setup.mock_calls,
+            )
+            self.assertEqual(
+                [True, False],
+                [
+                    kwargs['success']
+                    for _, _, kwargs in display.stop_setup.mock_calls
+                ],
+            )
+            self.assertEqual(
+                [
+                    call(variant=variants[0]),
+                    call(variant=variants[2]),
+                    call(variant=variants[1]),
+                ],
+                display.start_variant.mock_calls,
+            )
+            # The second setup fails, so the variant that needs it doesn't
+            # run. Shared setups run in the environment of their first
+            # variant.
+            self.assertEqual(
+                [
+                    {'G': 'g', 'A': '1', 'B': '1'},
+                    {'G': 'g', 'A': '1', 'B': '1'},
+                    {'G': 'g', 'A': '1', 'B': '1'},
+                    {'G': 'g', 'A': '1', 'B': '2'},
+                    {'G': 'g', 'A': '2', 'B': '1'},
+                    {'G': 'g', 'A': '2', 'B': '1'},
+                ],
+                sorted(environments, key=lambda env: sorted(env.items())),
+            )
+
+    def test_run_shares_setup_phases_by_default(self):
+        variants = [
+            frozenset({('A', '1'), ('B', '1')}),
+            frozenset({('A', '1'), ('B', '2')}),
+        ]
+
+        for jobs in [1, 2]:
+            results, display, environments = self.run_variants(
+                variants=variants,
+                install=['int({{A}} - 1)'],
+                script=['0'],
+                jobs=jobs,
+            )
+
+            self.assertEqual(
+                [(variant, True) for variant in variants],
+                results,
+            )
+            self.assertEqual(
+                [call(pairs=frozenset({('A', '1')}))],
+                display.start_setup.mock_calls,
+            )
+            # Without deduplication, the variant phases still run for each
+            # variant.
+            self.assertEqual(
+                [
+                    {'G': 'g', 'A': '1', 'B': '1'},
+                    {'G': 'g', 'A': '1', 'B': '1'},
+                    {'G': 'g', 'A': '1', 'B': '2'},
+                ],
+                sorted(environments, key=lambda env: sorted(env.items())),
+            )
+
+    def test_run_parallel_runs_setups_concurrently(self):
+        variants = [frozenset({('A', str(index))}) for index in range(4)]
+        display = MockDisplay()
+        calls = []
+        display.start_setup.side_effect = lambda pairs: calls.append(pairs)
+        display.start_variant.side_effect = lambda variant: calls.append(
+            variant,
+        )
+        runner = Runner(
+            configuration={
+                'executor': EnvironmentExecutor(),
+                'global': {},
+                'install': ['time.sleep(0.2) or 0 * {{A}}'],
+                'script': ['time.sleep(0.2) or int({{A}} == 3)'],
+            },
+            display=display,
+            jobs=4,
+            environment={},
+        )
+        start = time.time()
+        results = runner.run(variants)
+
+        # Each variant starts as soon as its own setup completed.
+        self.assertLess(time.time() - start, 0.7)
+        self.assertEqual(
+            [(variant, variant != variants[3]) for variant in variants],
+            results,
+        )
+        # Each setup gets reported right before its variant.
+        self.assertEqual(
+            [variant for variant in variants for _ in range(2)],
+            calls,
+        )
+
+    def test_run_fail_fast(self):
+        variants = [
+            frozenset({('A', '0.2')}),
+            frozenset({('A', 'x')}),
+            frozenset({('A', '0')}),
+            frozenset({('A', '0.1')}),
+        ]
+
+        for jobs in [1, 2]:
+            results, display, environments = self.run_variants(
+                variants=variants,
+                script=['A == "x" or time.sleep(float(A)) or 0'],
+                jobs=jobs,
+                fail_fast=True,
+            )
+
+            self.assertEqual(
+                [
+                    (variants[0], True),
+                    (variants[1], False),
+                    (variants[2], None),
+                    (variants[3], None),
+                ],
+                results,
+            )
+            self.assertEqual(
+                [call(variant=variants[2]), call(variant=variants[3])],
+                display.skipped_variant.mock_calls,
+            )
+            self.assertEqual(2, len(environments))
+
+    def test_run_fail_fast_skips_setups(self):
+        variants = [
+            frozenset({('A', '1')}),
+            frozenset({('A', '2')}),
+        ]
+        results, display, environments = self.run_variants(
+            variants=variants,
+            install=['int({{A}} == 1)'],
+            script=['0'],
+            jobs=1,
+            fail_fast=True,
+        )
+
+        self.assertEqual([(variants[0], False), (variants[1], None)], results)
+        self.assertEqual(
+            [call(pairs=frozenset({('A', '1')}))],
+            display.start_setup.mock_calls,
+        )
+        self.assertEqual(
+            [call(variant=variants[1])],
+            display.skipped_variant.mock_calls,
+        )
+
+    def test_run_parallel_propagates_exceptions(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.run_variants(
+                variants=[frozenset({('A', '1')}), frozenset({('A', '2')})],
+                script=['1 / 0'],
+                jobs=2,
+            )
+
+    def test_run_parallel_fail_fast_stops_commands_on_interrupt(self):
+        display = MockDisplay()
+        display.start_variant.side_effect = KeyboardInterrupt
+        runner = Runner(
+            configuration={
+                'executor': ShellExecutor(),
+                'global': {},
+                'script': ['sleep $A'],
+            },
+            display=display,
+            jobs=2,
+            environment=dict(os.environ),
+            fail_fast=True,
+        )
+        start = time.time()
+
+        with self.assertRaises(KeyboardInterrupt):
+            runner.run([frozenset({('A', '0')}), frozenset({('A', '30')})])
+
+        self.assertTrue(runner.cancelled)
+        self.assertLess(time.time() - start, 10)
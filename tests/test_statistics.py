@@ -0,0 +1,96 @@
+"""
+Test the execution statistics.
+"""
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from plix.statistics import (
+    Statistics,
+    format_size,
+)
+
+
+class StatisticsTests(TestCase):
+    def test_format_size(self):
+        self.assertEqual('512 B', format_size(512))
+        self.assertEqual('1.5 KiB', format_size(1536))
+        self.assertEqual('3.0 MiB', format_size(3 * 1024 * 1024))
+        self.assertEqual('2048.0 GiB', format_size(2 * 1024 ** 4))
+
+    def test_add(self):
+        statistics = Statistics()
+        statistics.add(Statistics(
+            wall_time=1.0,
+            output_size=3,
+            command_times={'a': 1.0},
+        ))
+        statistics.add(Statistics(
+            wall_time=2.0,
+            user_time=0.5,
+            system_time=0.25,
+            max_rss=2048,
+            output_size=4,
+            command_times={'a': 1.5, 'b': 0.5},
+        ))
+        statistics.add(Statistics(
+            wall_time=0.5,
+            user_time=1.0,
+            system_time=0.25,
+            max_rss=1024,
+        ))
+
+        self.assertEqual(
+            Statistics(
+                wall_time=3.5,
+                user_time=1.5,
+                system_time=0.5,
+                max_rss=2048,
+                output_size=7,
+                command_times={'a': 2.5, 'b': 0.5},
+            ),
+            statistics,
+        )
+
+    def test_equality(self):
+        self.assertEqual(Statistics(), Statistics())
+        self.assertNotEqual(Statistics(), Statistics(output_size=1))
+        self.assertNotEqual(Statistics(), None)
+
+    def test_dict_round_trip(self):
+        statistics = Statistics(wall_time=1.0, max_rss=42, output_size=3)
+
+        self.assertEqual(statistics, Statistics(**statistics.to_dict()))
+
+    def test_repr(self):
+        self.assertEqual(
+            'Statistics(wall_time=1.0, user_time=None, system_time=None, '
+            'max_rss=None, output_size=0, command_times={})',
+            repr(Statistics(wall_time=1.0)),
+        )
+
+    def test_format(self):
+        self.assertEqual(
+            '1.500s wall, 0 B output',
+            Statistics(wall_time=1.5).format(),
+        )
+        self.assertEqual(
+            '1.500s wall, 1.000s user, 0.250s sys, <= 2.0 MiB max RSS (with '
+            'plix), 12 B output',
+            Statistics(
+                wall_time=1.5,
+                user_time=1.0,
+                system_time=0.25,
+                max_rss=2 * 1024 * 1024,
+                output_size=12,
+            ).format(),
+        )
+        self.assertEqual(
+            '1.500s wall, 12 B output',
+            Statistics(
+                wall_time=1.5,
+                max_rss=2 * 1024 * 1024,
+                output_size=12,
+            ).format(memory=False),
+        )
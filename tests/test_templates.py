@@ -0,0 +1,60 @@
+"""
+Test the command templates.
+"""
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from mock import patch
+
+from plix.templates import (
+    CommandTemplate,
+    get_template,
+    render_commands,
+)
+
+
+class TemplatesTests(TestCase):
+    def test_command_template_required_keys(self):
+        template = CommandTemplate("{{a}} {{b.c}} {% if d %}x{% endif %}")
+        self.assertEqual({'a', 'b', 'd'}, template.required_keys)
+
+    def test_command_template_render(self):
+        template = CommandTemplate("echo {{a}} {{b}}")
+        self.assertEqual(
+            "echo 1 2",
+            template.render({('a', 1), ('b', 2), ('c', 3)}),
+        )
+
+    def test_command_template_render_is_memoized(self):
+        template = CommandTemplate("echo {{a}}")
+
+        with patch.object(
+            template.template,
+            'render',
+            wraps=template.template.render,
+        ) as render:
+            first = template.render({('a', 1), ('b', 2)})
+            second = template.render({('a', 1), ('b', 3)})
+            third = template.render({('a', 2), ('b', 3)})
+
+        self.assertEqual("echo 1", first)
+        self.assertIs(first, second)
+        self.assertEqual("echo 2", third)
+        self.assertEqual(2, render.call_count)
+
+    def test_get_template_is_cached(self):
+        self.assertIs(get_template("echo {{a}}"), get_template("echo {{a}}"))
+        self.assertIsNot(
+            get_template("echo {{a}}"),
+            get_template("echo {{b}}"),
+        )
+
+    def test_render_commands(self):
+        self.assertEqual(
+            ["echo 1", "echo 2", "true"],
+            render_commands(
+                commands=["echo {{a}}", "echo {{b}}", "true"],
+                variant={('a', 1), ('b', 2)},
+            ),
+        )
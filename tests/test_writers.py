@@ -0,0 +1,157 @@
+"""
+Test the queued writers.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+
+from unittest import TestCase
+from mock import MagicMock
+
+from plix.buffers import OutputBuffer
+from plix.writers import (
+    DROP,
+    SPILL,
+    QueuedWriter,
+)
+
+
+class GatedStream(object):
+    """
+    A stream that records the writes, and whose first write waits until the
+    gate opens.
+    """
+
+    def __init__(self):
+        self.writes = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.buffer = self
+
+    def write(self, data):
+        self.writes.append(data)
+        self.entered.set()
+        self.gate.wait()
+
+    def flush(self):
+        pass
+
+
+class WritersTests(TestCase):
+    def test_queued_writer_coalesces_writes(self):
+        stream = GatedStream()
+        writer = QueuedWriter(stream=stream)
+        writer.write("a")
+        stream.entered.wait()
+        writer.write("b")
+        writer.write("")
+        writer.write("c")
+        stream.gate.set()
+        writer.close()
+
+        self.assertEqual(["a", "bc"], stream.writes)
+
+    def test_queued_writer_copies_outputs_in_order(self):
+        stream = GatedStream()
+        stream.gate.set()
+        writer = QueuedWriter(stream=stream)
+        output = OutputBuffer()
+        output.write(b"DATA")
+        output.close = MagicMock()
+        writer.write("a")
+        writer.write("b")
+        writer.write_output(output)
+        writer.write("c")
+        writer.close()
+
+        self.assertEqual(["ab", b"DATA", "c"], stream.writes)
+        output.close.assert_called_once_with()
+
+    def test_queued_writer_blocks_when_full(self):
+        stream = GatedStream()
+        writer = QueuedWriter(stream=stream, queue_size=4)
+        writer.write("a")
+        stream.entered.wait()
+        writer.write("bcd")
+        thread = threading.Thread(target=writer.write, args=("e",))
+        thread.start()
+        thread.join(0.1)
+
+        self.assertTrue(thread.is_alive())
+
+        stream.gate.set()
+        thread.join()
+        writer.close()
+
+        self.assertEqual("abcde", "".join(stream.writes))
+
+    def test_queued_writer_drops_when_full(self):
+        stream = GatedStream()
+        writer = QueuedWriter(
+            stream=stream,
+            queue_size=2,
+            overflow_policy=DROP,
+            format_dropped="<{}>".format,
+        )
+        writer.write("a")
+        stream.entered.wait()
+        writer.write("b")
+        writer.write("cd")
+        writer.write("ef")
+        stream.gate.set()
+        writer.flush()
+        writer.write("g")
+        writer.close()
+
+        self.assertEqual(["a", "b<4>", "g"], stream.writes)
+
+    def test_queued_writer_spills_when_full(self):
+        stream = GatedStream()
+        writer = QueuedWriter(
+            stream=stream,
+            queue_size=2,
+            overflow_policy=SPILL,
+        )
+        writer.write("a")
+        stream.entered.wait()
+        writer.write("b")
+        writer.write("cé")
+        writer.write("d")
+        stream.gate.set()
+        writer.close()
+
+        self.assertEqual("abcéd", "".join(stream.writes))
+
+    def test_queued_writer_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            QueuedWriter(stream=MagicMock(), overflow_policy='unknown')
+
+    def test_queued_writer_closed(self):
+        writer = QueuedWriter(stream=MagicMock())
+        writer.close()
+        output = MagicMock()
+
+        with self.assertRaises(ValueError):
+            writer.write("a")
+
+        with self.assertRaises(ValueError):
+            writer.write_output(output)
+
+        output.close.assert_called_once_with()
+
+    def test_queued_writer_stream_error(self):
+        stream = MagicMock()
+        stream.write.side_effect = IOError
+        output = MagicMock()
+        writer = QueuedWriter(stream=stream)
+        writer.write("a")
+        writer.flush()
+        writer.write_output(output)
+
+        with self.assertRaises(IOError):
+            writer.close()
+
+        stream.write.assert_called_once_with("a")
+        output.close.assert_called_once_with()
+        self.assertEqual([], output.copy_to.mock_calls)